@@ -0,0 +1,186 @@
+"""
+Batch Statement Export
+
+Writes passbook statements for many accounts at once, e.g. for the month-end
+statement run, without opening a browser.
+
+Accounts come from a file (one account number per line) or from the whole
+customers table ("all"). They are split into chunks and exported in parallel
+by a process pool; each worker process keeps its own small connection pool
+that is shared by every account it handles.
+
+Progress is appended to a checkpoint file as chunks finish. Re-running with the
+same checkpoint skips accounts that were already exported, so an interrupted
+run can be resumed.
+
+Usage:
+    python SQL/BatchStatements.py all --from 2025-01-01 --to 2025-01-31 --checkpoint statements.ckpt
+    python SQL/BatchStatements.py accounts.txt --format csv --workers 8
+"""
+
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from datetime import datetime, timedelta
+from itertools import islice
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from atm.config import DB_CONFIG
+from atm.database import DatabaseManager
+from atm.passbook import generate_passbook
+
+# Per-process state, set up by init_worker
+worker_db = None
+worker_options = None
+
+
+def init_worker(options, connections):
+    """Open this worker's connection pool (runs once per worker process)."""
+    global worker_db, worker_options
+    pool_config = {'size': connections, 'timeout': 30.0, 'health_check_interval': 30.0}
+    cache_config = {'size': 0, 'ttl': 0}
+    worker_db = DatabaseManager(DB_CONFIG, pool_config, cache_config)
+    worker_options = options
+
+
+def export_chunk(accounts):
+    """
+    Export the statements of a chunk of accounts (runs in a worker process).
+
+    Returns:
+        tuple: (exported account numbers, list of (acc_no, error message))
+    """
+    exported, failed = [], []
+    for acc_no in accounts:
+        try:
+            generate_passbook(worker_db, acc_no, worker_options['output'], worker_options['format'],
+                              worker_options['start'], worker_options['end'], worker_options['page_size'])
+            exported.append(acc_no)
+        except Exception as e:
+            failed.append((acc_no, str(e)))
+    return exported, failed
+
+
+def iter_accounts(source):
+    """Yield account numbers from a file, or from the customers table for "all"."""
+    if source == 'all':
+        db_manager = DatabaseManager(DB_CONFIG)
+        try:
+            for batch in db_manager.iter_account_numbers():
+                yield from batch
+        finally:
+            db_manager.close()
+    else:
+        with open(source, encoding='utf-8') as accounts_file:
+            for line in accounts_file:
+                acc_no = line.strip()
+                if acc_no:
+                    yield acc_no
+
+
+def load_checkpoint(path):
+    """Return the set of account numbers already exported."""
+    if not path or not os.path.exists(path):
+        return set()
+    with open(path, encoding='utf-8') as checkpoint:
+        return {line.strip() for line in checkpoint if line.strip()}
+
+
+def iter_chunks(accounts, size):
+    """Group an iterable of account numbers into lists of the given size."""
+    accounts = iter(accounts)
+    while True:
+        chunk = list(islice(accounts, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export passbook statements for many accounts in parallel")
+    parser.add_argument('accounts', help='File with one account number per line, or "all"')
+    parser.add_argument('--from', dest='start', help="First day to include (YYYY-MM-DD)")
+    parser.add_argument('--to', dest='end', help="Last day to include (YYYY-MM-DD)")
+    parser.add_argument('--format', choices=['html', 'csv'], default='html')
+    parser.add_argument('--page-size', type=int, help="Split each statement into pages of this many rows")
+    parser.add_argument('--output', default=os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "Passbooks"))
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 4, help="Worker processes")
+    parser.add_argument('--connections', type=int, default=2, help="Pooled DB connections per worker")
+    parser.add_argument('--chunk-size', type=int, default=200, help="Accounts per task")
+    parser.add_argument('--checkpoint', help="File recording exported accounts, used to resume")
+    args = parser.parse_args()
+
+    options = {
+        'output': args.output,
+        'format': args.format,
+        'start': datetime.strptime(args.start, '%Y-%m-%d') if args.start else None,
+        'end': datetime.strptime(args.end, '%Y-%m-%d') + timedelta(days=1) if args.end else None,
+        'page_size': args.page_size
+    }
+    os.makedirs(args.output, exist_ok=True)
+
+    done = load_checkpoint(args.checkpoint)
+    if done:
+        print(f"Resuming: {len(done)} accounts already exported")
+    pending = (acc_no for acc_no in iter_accounts(args.accounts) if acc_no not in done)
+    chunks = iter_chunks(pending, args.chunk_size)
+    checkpoint = open(args.checkpoint, 'a', encoding='utf-8') if args.checkpoint else None
+
+    start = time.perf_counter()
+    exported = 0
+    failures = []
+    list_error = None
+
+    def next_chunk():
+        """Return the next chunk of accounts, or None once the list ends or cannot be read."""
+        nonlocal list_error
+        if list_error is not None:
+            return None
+        try:
+            return next(chunks, None)
+        except Exception as e:
+            list_error = e
+            return None
+
+    with ProcessPoolExecutor(max_workers=args.workers, initializer=init_worker,
+                             initargs=(options, args.connections)) as executor:
+        # Keep a bounded number of chunks in flight so huge account lists are never queued at once
+        in_flight = set()
+        for _ in range(args.workers * 2):
+            chunk = next_chunk()
+            if chunk is None:
+                break
+            in_flight.add(executor.submit(export_chunk, chunk))
+        while in_flight:
+            finished, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in finished:
+                chunk_exported, chunk_failed = future.result()
+                exported += len(chunk_exported)
+                failures.extend(chunk_failed)
+                if checkpoint and chunk_exported:
+                    checkpoint.write("\n".join(chunk_exported) + "\n")
+                    checkpoint.flush()
+                chunk = next_chunk()
+                if chunk is not None:
+                    in_flight.add(executor.submit(export_chunk, chunk))
+            elapsed = time.perf_counter() - start
+            print(f"{exported} statements exported ({exported / elapsed:.0f} accounts/s), {len(failures)} failed", end='\r')
+
+    if checkpoint:
+        checkpoint.close()
+    elapsed = time.perf_counter() - start
+    print()
+    print(f"Exported {exported} statements in {elapsed:.1f}s ({exported / elapsed if elapsed else 0:.0f} accounts/s)")
+    for acc_no, error in failures:
+        print(f"Failed {acc_no}: {error}")
+    if list_error is not None:
+        print(f"Error reading the account list: {list_error}")
+        print("The run is incomplete; run again with the same --checkpoint to resume")
+    if failures or list_error is not None:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,189 @@
+"""
+Bulk Customer Onboarding
+
+Loads customers from a CSV or JSONL file in large batches.
+
+Each input record has the fields acc_no, cname, bank_name, pin and an optional
+opening_balance. For every batch the loader:
+    - validates the records and drops duplicates and existing accounts
+    - hashes the PINs in parallel worker processes with the configured
+      PIN hashing scheme (PIN_HASH_SCHEME)
+    - inserts the customers (with their opening balance) and the matching
+      opening CREDIT ledger rows using multi-row executemany inserts
+    - commits the whole batch as one transaction
+
+Rejected records are counted by reason and can be written to a rejects file.
+
+Usage:
+    python SQL/BulkLoadCustomers.py customers.csv [--batch-size 5000] [--workers 4] [--rejects rejects.csv]
+"""
+
+import argparse
+import csv
+import json
+import os
+import sys
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from atm.backends import make_backend
+from atm.config import PIN_HASH_CONFIG
+from atm.credentials import make_hasher
+
+INSERT_CUSTOMERS = '''insert into customers(acc_no, cname, bank_name, pin, balance)
+values(%s, %s, %s, %s, %s);'''
+
+INSERT_OPENING_CREDITS = '''insert into transactions(acc_no, amount, stat)
+values(%s, %s, 'CREDIT');'''
+
+
+def read_records(path):
+    """Yield (line number, record dict) from a CSV (with header) or JSONL file."""
+    with open(path, encoding='utf-8', newline='') as source:
+        if path.endswith('.jsonl') or path.endswith('.json'):
+            for number, line in enumerate(source, 1):
+                if not line.strip():
+                    continue
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    record = None
+                yield number, record if isinstance(record, dict) else None
+        else:
+            for number, record in enumerate(csv.DictReader(source), 2):
+                yield number, record
+
+
+def validate(record):
+    """
+    Validate and normalise one input record.
+
+    Returns:
+        tuple: (customer tuple without the hashed PIN, None) or (None, rejection reason)
+    """
+    if record is None:
+        return None, 'malformed record'
+    acc_no = str(record.get('acc_no') or '').strip()
+    cname = str(record.get('cname') or '').strip()
+    bank_name = str(record.get('bank_name') or '').strip() or None
+    pin = str(record.get('pin') or '').strip()
+    balance = str(record.get('opening_balance') or '0').strip()
+    if not acc_no or len(acc_no) > 20:
+        return None, 'invalid acc_no'
+    if not cname or len(cname) > 255:
+        return None, 'invalid cname'
+    if not pin.isdigit() or not 3 <= len(pin) <= 12:
+        return None, 'invalid pin'
+    if not balance.isdigit():
+        return None, 'invalid opening_balance'
+    return (acc_no, cname, bank_name, pin, int(balance)), None
+
+
+def existing_accounts(cursor, acc_nos):
+    """Return which of the given account numbers already exist."""
+    placeholders = ', '.join(['%s'] * len(acc_nos))
+    cursor.execute(f"select acc_no from customers where acc_no in ({placeholders});", tuple(acc_nos))
+    return {row[0] for row in cursor.fetchall()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Bulk-load customers from CSV or JSONL")
+    parser.add_argument('source', help="CSV file with a header row, or a .jsonl file")
+    parser.add_argument('--batch-size', type=int, default=5000, help="Customers per transaction")
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 4, help="PIN hashing processes")
+    parser.add_argument('--rejects', help="Write rejected records (line, acc_no, reason) to this CSV file")
+    args = parser.parse_args()
+
+    backend = make_backend()
+    connection = backend.connect()
+    cursor = connection.cursor()
+    rejects_file = open(args.rejects, 'w', encoding='utf-8', newline='') if args.rejects else None
+    rejects_writer = csv.writer(rejects_file) if rejects_file else None
+    if rejects_writer:
+        rejects_writer.writerow(['line', 'acc_no', 'reason'])
+
+    reasons = Counter()
+    seen = set()
+    loaded = 0
+    start = time.perf_counter()
+
+    def reject(number, record, reason):
+        reasons[reason] += 1
+        if rejects_writer:
+            acc_no = record.get('acc_no', '') if isinstance(record, dict) else ''
+            rejects_writer.writerow([number, acc_no, reason])
+
+    hasher = make_hasher(PIN_HASH_CONFIG)
+    records = read_records(args.source)
+    with ProcessPoolExecutor(max_workers=args.workers) as executor:
+        while True:
+            batch = list(islice(records, args.batch_size))
+            if not batch:
+                break
+
+            valid = []
+            for number, record in batch:
+                customer, reason = validate(record)
+                if customer is None:
+                    reject(number, record, reason)
+                elif customer[0] in seen:
+                    reject(number, record, 'duplicate acc_no in input')
+                else:
+                    seen.add(customer[0])
+                    valid.append((number, record, customer))
+            if not valid:
+                continue
+
+            existing = existing_accounts(cursor, [customer[0] for _, _, customer in valid])
+            customers = []
+            for number, record, customer in valid:
+                if customer[0] in existing:
+                    reject(number, record, 'account already exists')
+                else:
+                    customers.append(customer)
+            if not customers:
+                continue
+
+            chunksize = max(1, len(customers) // (args.workers * 4))
+            hashes = executor.map(hasher.hash, [customer[3] for customer in customers], chunksize=chunksize)
+            rows = [(acc_no, cname, bank_name, pin_hash, balance)
+                    for (acc_no, cname, bank_name, _, balance), pin_hash in zip(customers, hashes)]
+            credits = [(acc_no, balance) for acc_no, _, _, _, balance in customers if balance > 0]
+
+            try:
+                cursor.executemany(INSERT_CUSTOMERS, rows)
+                if credits:
+                    cursor.executemany(INSERT_OPENING_CREDITS, credits)
+                connection.commit()
+            except backend.Error as e:
+                connection.rollback()
+                print(f"Batch ending at line {batch[-1][0]} failed: {e}")
+                for acc_no, *_ in customers:
+                    reasons['batch failed'] += 1
+                    if rejects_writer:
+                        rejects_writer.writerow(['', acc_no, f'batch failed: {e}'])
+                continue
+
+            loaded += len(rows)
+            elapsed = time.perf_counter() - start
+            print(f"{loaded} customers loaded ({loaded / elapsed:.0f} rows/s)", end='\r')
+
+    elapsed = time.perf_counter() - start
+    cursor.close()
+    connection.close()
+    if rejects_file:
+        rejects_file.close()
+
+    print()
+    print(f"Loaded {loaded} customers in {elapsed:.1f}s ({loaded / elapsed if elapsed else 0:.0f} rows/s)")
+    rejected = sum(reasons.values())
+    print(f"Rejected {rejected} records")
+    for reason, count in reasons.most_common():
+        print(f"  {reason}: {count}")
+
+
+if __name__ == "__main__":
+    main()
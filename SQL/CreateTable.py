@@ -1,26 +1,19 @@
-import mysql.connector as mycon
+import os, sys
 
-connection = mycon.connect(host="localhost",user="root",password="admin")
-cursor = connection.cursor()
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from atm.backends import make_backend
 
-create_db = '''create database if not exists atm;'''
-cursor.execute(create_db)
-connection.commit()
+# Uses the backend selected in .env: DB_BACKEND=mysql (default) or sqlite
+backend = make_backend()
+backend.create_database()
 
-use_db = '''use atm;'''
-cursor.execute(use_db)
-connection.commit()
+connection = backend.connect()
+cursor = connection.cursor()
 
-create_table = '''create table if not exists customers (
-acc_no varchar(20) primary key,
-cname varchar(255) not null,
-bank_name varchar(255),
-pin varchar(255) not null
-);'''
-cursor.execute(create_table)
+backend.create_schema(cursor)
 connection.commit()
 
 cursor.close()
 connection.close()
 
-print("Hello World")
\ No newline at end of file
+print("Hello World")
@@ -1,18 +1,19 @@
-import mysql.connector as mycon
+import os, sys
 
-connection = mycon.connect(host="localhost",user="root",password="admin", database="atm")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from atm.backends import make_backend
+
+connection = make_backend().connect()
 cursor = connection.cursor()
 
 acc = "123"
 
-delete_customer = f'''delete from customers where acc_no = '{acc}';'''
-cursor.execute(delete_customer)
+delete_customer = '''delete from customers where acc_no = %s;'''
+cursor.execute(delete_customer, (acc,))
 connection.commit()
 
-cus_acc = 'cus' + acc
-
-delete_pb = f'''drop table {cus_acc};'''
-cursor.execute(delete_pb)
+delete_pb = '''delete from transactions where acc_no = %s;'''
+cursor.execute(delete_pb, (acc,))
 connection.commit()
 
 cursor.close()
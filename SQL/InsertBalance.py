@@ -1,18 +1,22 @@
-import mysql.connector as mycon
+import os, sys
 
-connection = mycon.connect(host="localhost",user="root",password="admin",database="atm")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from atm.backends import make_backend
+
+connection = make_backend().connect()
 cursor = connection.cursor()
 
 acc_no = "12345789"
 
-cus_acc = 'cus' + acc_no
-
-amount = '10000'
+amount = 10000
 stat = 'CREDIT'
 
-insert_value = f'''insert into {cus_acc}(amount, stat)
-values('{amount}', '{stat}');'''
-cursor.execute(insert_value)
+update_balance = '''update customers set balance = balance + %s where acc_no = %s;'''
+cursor.execute(update_balance, (amount, acc_no))
+
+insert_value = '''insert into transactions(acc_no, amount, stat)
+values(%s, %s, %s);'''
+cursor.execute(insert_value, (acc_no, amount, stat))
 connection.commit()
 
 cursor.close()
@@ -1,40 +1,29 @@
-import hashlib, mysql.connector as mycon
+import os, sys
 
-def hash_string(input_string):
-    hasher = hashlib.sha256()
-    hasher.update(input_string.encode('utf-8'))
-    hashed_string = hasher.hexdigest()[:128]    
-    return hashed_string
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from atm.backends import make_backend
+from atm.config import PIN_HASH_CONFIG
+from atm.credentials import make_hasher
 
-connection = mycon.connect(host="localhost",user="root",password="admin",database="atm")
+connection = make_backend().connect()
 cursor = connection.cursor()
 
 acc_no = "12345"
 cname = "XYZ"
 bname = "State Bank Of India"
-pin = hash_string("111")
+pin = make_hasher(PIN_HASH_CONFIG).hash("111")
 
-insert_value = f'''insert into customers 
-values('{acc_no}', '{cname}', '{bname}', '{pin}');'''
-cursor.execute(insert_value)
-connection.commit()
-
-cus_acc = 'cus' + acc_no
-
-create_pb = f'''create table {cus_acc} (
-amount varchar(255),
-stat varchar(255),
-time TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-);'''
-cursor.execute(create_pb)
-connection.commit()
-
-amount = '100000'
+amount = 100000
 stat = 'CREDIT'
 
-insert_value = f'''insert into {cus_acc}(amount, stat)
-values('{amount}', '{stat}');'''
-cursor.execute(insert_value)
+# The customer row, its opening balance and the matching ledger entry commit together
+insert_value = '''insert into customers(acc_no, cname, bank_name, pin, balance)
+values(%s, %s, %s, %s, %s);'''
+cursor.execute(insert_value, (acc_no, cname, bname, pin, amount))
+
+insert_value = '''insert into transactions(acc_no, amount, stat)
+values(%s, %s, %s);'''
+cursor.execute(insert_value, (acc_no, amount, stat))
 connection.commit()
 
 cursor.close()
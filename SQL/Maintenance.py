@@ -0,0 +1,340 @@
+"""
+Ledger Maintenance
+
+Batch maintenance jobs that must not hold long table locks.
+
+Commands:
+    close       Close many accounts, in chunks. Each closable account's whole
+                history (including months moved to the ledger archive) is
+                first written to Archive/closed/<acc_no>_<closed_at>.csv.gz.
+                Then, in one short transaction, the customer rows are locked,
+                re-checked (only zero balances unless --force, and no new
+                ledger rows since archiving), recorded in closed_accounts.csv
+                and deleted. Only then are the ledger rows that were written
+                out purged in small batches, each committed on its own, and
+                the accounts dropped from the ledger archive. Re-running the
+                command with the same accounts finishes an interrupted purge
+                for accounts recorded in closed_accounts.csv.
+
+    purge-zero  Delete zero-amount ledger rows across the whole ledger. The
+                ledger is walked in ranges of its indexed id column so every
+                DELETE touches a bounded number of rows and commits quickly.
+
+    purge-keys  Delete withdrawal idempotency keys older than --days. A key
+                only needs to outlive the retries of its request; keys are
+                deleted oldest first in LIMIT batches.
+
+All commands run on the backend selected by DB_BACKEND, through the
+DatabaseManager connection pool.
+
+Usage:
+    python SQL/Maintenance.py close 123 456 [--file accounts.txt] [--chunk-size 100] [--force]
+    python SQL/Maintenance.py purge-zero [--batch-size 10000] [--pause 0.05]
+    python SQL/Maintenance.py purge-keys [--days 7] [--batch-size 10000]
+"""
+
+import argparse
+import csv
+import gzip
+import os
+import sys
+import time
+from datetime import datetime, timedelta
+from itertools import islice
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from atm.config import DB_CONFIG
+from atm.database import DatabaseManager
+
+ARCHIVE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "Archive", "closed")
+MANIFEST_COLUMNS = ['acc_no', 'cname', 'bank_name', 'balance', 'closed_at', 'archive', 'last_id']
+
+
+def chunks(items, size):
+    """Split an iterable into lists of the given size."""
+    items = iter(items)
+    while True:
+        chunk = list(islice(items, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def query(db_manager, statement, params=()):
+    """Run one read-only statement on a pooled connection and return its rows."""
+    with db_manager.pool.connection() as conn:
+        cursor = conn.cursor()
+        try:
+            cursor.execute(statement, params)
+            rows = cursor.fetchall()
+            conn.commit()
+            return rows
+        finally:
+            cursor.close()
+
+
+def archive_history(db_manager, acc_no, directory, closed_at, batch_size):
+    """
+    Write an account's whole history to <directory>/<acc_no>_<closed_at>.csv.gz.
+
+    History is read through DatabaseManager.iter_transactions, so months moved
+    to the ledger archive are included. The file is written under a temporary
+    name and renamed once complete, so a half-written archive is never mistaken
+    for a finished one. Every closure gets its own file, so a reused account
+    number never overwrites or skips an earlier archive.
+
+    Returns:
+        tuple: (file name, rows archived, highest ledger id written out or 0)
+    """
+    ((last_id,),) = query(db_manager, "select coalesce(max(id), 0) from transactions where acc_no = %s;",
+                          (acc_no,))
+    name = f"{acc_no}_{closed_at:%Y%m%dT%H%M%S}.csv.gz"
+    path = os.path.join(directory, name)
+    temp_path = path + '.tmp'
+    rows = 0
+    with gzip.open(temp_path, 'wt', encoding='utf-8', newline='') as archive:
+        writer = csv.writer(archive)
+        writer.writerow(['amount', 'stat', 'time'])
+        for batch in db_manager.iter_transactions(acc_no, chunk_size=batch_size):
+            writer.writerows(batch)
+            rows += len(batch)
+    os.replace(temp_path, path)
+    return name, rows, int(last_id)
+
+
+def purge_history(db_manager, acc_no, last_id, batch_size, pause):
+    """Delete an account's ledger rows up to last_id (those written to its archive) in bounded batches."""
+    deleted = 0
+    while True:
+        with db_manager.pool.connection() as conn:
+            cursor = conn.cursor()
+            try:
+                cursor.execute("select id from transactions where acc_no = %s and id <= %s order by id limit %s;",
+                               (acc_no, last_id, batch_size))
+                ids = [row[0] for row in cursor.fetchall()]
+                if ids:
+                    placeholders = ', '.join(['%s'] * len(ids))
+                    cursor.execute(f"delete from transactions where acc_no = %s and id in ({placeholders});",
+                                   (acc_no, *ids))
+                conn.commit()
+            finally:
+                cursor.close()
+        deleted += len(ids)
+        if len(ids) < batch_size:
+            return deleted
+        time.sleep(pause)
+
+
+def read_manifest(path):
+    """Return the latest closed_accounts.csv entry of every account (empty if there is no manifest)."""
+    if not os.path.exists(path):
+        return {}
+    with open(path, encoding='utf-8', newline='') as manifest_file:
+        reader = csv.DictReader(manifest_file)
+        if reader.fieldnames != MANIFEST_COLUMNS:
+            print(f"Error: {path} was written by an older version of this script; move it aside first")
+            sys.exit(1)
+        return {row['acc_no']: row for row in reader}
+
+
+def close_chunk(db_manager, chunk, args, manifest, manifest_file):
+    """
+    Archive and close one chunk of accounts.
+
+    Returns:
+        tuple: (closed rows as written to the manifest, number skipped, rows archived)
+    """
+    placeholders = ', '.join(['%s'] * len(chunk))
+    customers = query(db_manager, f"select acc_no, balance from customers where acc_no in ({placeholders});",
+                      tuple(chunk))
+    skipped = 0
+    archives = {}
+    closed_at = datetime.now().replace(microsecond=0)
+    for acc_no, balance in customers:
+        if not (args.force or balance == 0):
+            print(f"Skipping {acc_no}: balance {balance} is not zero (use --force)")
+            skipped += 1
+            continue
+        archives[acc_no] = archive_history(db_manager, acc_no, ARCHIVE_DIR, closed_at, args.batch_size)
+    if not archives:
+        return [], skipped, 0
+
+    # Short transaction: re-check the archived accounts under lock, record and delete them
+    closing = ', '.join(['%s'] * len(archives))
+    closed = []
+    with db_manager.pool.connection() as conn:
+        cursor = conn.cursor()
+        try:
+            cursor.execute(f"select acc_no, cname, bank_name, balance from customers "
+                           f"where acc_no in ({closing}) for update;", tuple(archives))
+            current = {row[0]: row for row in cursor.fetchall()}
+            cursor.execute(f"select acc_no, max(id) from transactions where acc_no in ({closing}) group by acc_no;",
+                           tuple(archives))
+            latest = {acc_no: int(last_id) for acc_no, last_id in cursor.fetchall()}
+            for acc_no, (name, _, last_id) in archives.items():
+                row = current.get(acc_no)
+                if row is None or not (args.force or row[3] == 0) or latest.get(acc_no, 0) > last_id:
+                    print(f"Skipping {acc_no}: changed while its history was archived (run again)")
+                    os.remove(os.path.join(ARCHIVE_DIR, name))
+                    skipped += 1
+                    continue
+                closed.append(list(row) + [closed_at.isoformat(), name, last_id])
+            manifest.writerows(closed)
+            manifest_file.flush()
+            os.fsync(manifest_file.fileno())
+            if closed:
+                placeholders = ', '.join(['%s'] * len(closed))
+                cursor.execute(f"delete from customers where acc_no in ({placeholders});",
+                               tuple(row[0] for row in closed))
+            conn.commit()
+        finally:
+            cursor.close()
+    archived = sum(archives[row[0]][1] for row in closed)
+    return closed, skipped, archived
+
+
+def close_accounts(args):
+    """Close accounts chunk by chunk: archive history, delete customer rows, then purge history."""
+    accounts = list(args.accounts)
+    if args.file:
+        with open(args.file, encoding='utf-8') as accounts_file:
+            accounts.extend(line.strip() for line in accounts_file if line.strip())
+
+    os.makedirs(ARCHIVE_DIR, exist_ok=True)
+    manifest_path = os.path.join(ARCHIVE_DIR, "closed_accounts.csv")
+    recorded = read_manifest(manifest_path)
+    new_manifest = not os.path.exists(manifest_path)
+    manifest_file = open(manifest_path, 'a', encoding='utf-8', newline='')
+    manifest = csv.writer(manifest_file)
+    if new_manifest:
+        manifest.writerow(MANIFEST_COLUMNS)
+
+    db_manager = DatabaseManager(DB_CONFIG)
+    closed = skipped = archived = purged = 0
+    removed = []
+    start = time.perf_counter()
+    try:
+        for chunk in chunks(accounts, args.chunk_size):
+            placeholders = ', '.join(['%s'] * len(chunk))
+            rows = query(db_manager, f"select acc_no from customers where acc_no in ({placeholders});",
+                         tuple(chunk))
+            known = {row[0] for row in rows}
+            existing = [acc_no for acc_no in chunk if acc_no in known]
+            closed_rows, chunk_skipped, chunk_archived = close_chunk(db_manager, existing, args, manifest,
+                                                                     manifest_file)
+            closed += len(closed_rows)
+            skipped += chunk_skipped
+            archived += chunk_archived
+            to_purge = [(row[0], row[-1]) for row in closed_rows]
+
+            # Accounts recorded as closed by an earlier, interrupted run; anything else is unknown
+            for acc_no in chunk:
+                if acc_no in known:
+                    continue
+                if acc_no in recorded:
+                    to_purge.append((acc_no, int(recorded[acc_no]['last_id'])))
+                else:
+                    print(f"Skipping {acc_no}: no such account and not in {manifest_path}")
+                    skipped += 1
+
+            for acc_no, last_id in to_purge:
+                purged += purge_history(db_manager, acc_no, last_id, args.batch_size, args.pause)
+            removed.extend(acc_no for acc_no, _ in to_purge)
+
+        if removed and db_manager.archive is not None:
+            purged += db_manager.archive.remove_accounts(removed)
+    finally:
+        db_manager.close()
+        manifest_file.close()
+    elapsed = time.perf_counter() - start
+    print(f"Closed {closed} accounts in {elapsed:.1f}s ({skipped} skipped), "
+          f"archived {archived} rows, purged {purged} ledger rows")
+
+
+def purge_zero(args):
+    """Delete zero-amount ledger rows in bounded id ranges."""
+    db_manager = DatabaseManager(DB_CONFIG)
+    deleted = 0
+    start = time.perf_counter()
+    try:
+        ((low, high),) = query(db_manager, "select min(id), max(id) from transactions;")
+        if low is not None:
+            for window_start in range(low, high + 1, args.batch_size):
+                with db_manager.pool.connection() as conn:
+                    cursor = conn.cursor()
+                    try:
+                        cursor.execute("delete from transactions where id >= %s and id < %s and amount = 0;",
+                                       (window_start, window_start + args.batch_size))
+                        conn.commit()
+                        rowcount = cursor.rowcount
+                    finally:
+                        cursor.close()
+                deleted += rowcount
+                if rowcount:
+                    time.sleep(args.pause)
+    finally:
+        db_manager.close()
+    print(f"Purged {deleted} zero-amount rows in {time.perf_counter() - start:.1f}s")
+
+
+def purge_keys(args):
+    """Delete idempotency keys older than args.days in bounded batches."""
+    cutoff = datetime.now() - timedelta(days=args.days)
+    db_manager = DatabaseManager(DB_CONFIG)
+    deleted = 0
+    start = time.perf_counter()
+    try:
+        while True:
+            # Select then delete by key: SQLite has no DELETE ... ORDER BY ... LIMIT
+            with db_manager.pool.connection() as conn:
+                cursor = conn.cursor()
+                try:
+                    cursor.execute("select idem_key from idempotency_keys where created_at < %s "
+                                   "order by created_at limit %s;", (f"{cutoff:%Y-%m-%d %H:%M:%S}", args.batch_size))
+                    keys = [row[0] for row in cursor.fetchall()]
+                    if keys:
+                        placeholders = ', '.join(['%s'] * len(keys))
+                        cursor.execute(f"delete from idempotency_keys where idem_key in ({placeholders});",
+                                       tuple(keys))
+                    conn.commit()
+                finally:
+                    cursor.close()
+            deleted += len(keys)
+            if len(keys) < args.batch_size:
+                break
+            time.sleep(args.pause)
+    finally:
+        db_manager.close()
+    print(f"Purged {deleted} idempotency keys older than {cutoff:%Y-%m-%d %H:%M} in {time.perf_counter() - start:.1f}s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Batch account closure and ledger cleanup")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    close = commands.add_parser('close', help="Archive and close accounts")
+    close.add_argument('accounts', nargs='*', help="Account numbers to close")
+    close.add_argument('--file', help="File with one account number per line")
+    close.add_argument('--chunk-size', type=int, default=100, help="Accounts closed per transaction")
+    close.add_argument('--batch-size', type=int, default=5000, help="Ledger rows deleted per statement")
+    close.add_argument('--pause', type=float, default=0.01, help="Seconds to pause between delete batches")
+    close.add_argument('--force', action='store_true', help="Also close accounts with a non-zero balance")
+    close.set_defaults(handler=close_accounts)
+
+    purge = commands.add_parser('purge-zero', help="Delete zero-amount ledger rows")
+    purge.add_argument('--batch-size', type=int, default=10000, help="Ledger id range per statement")
+    purge.add_argument('--pause', type=float, default=0.05, help="Seconds to pause after each non-empty batch")
+    purge.set_defaults(handler=purge_zero)
+
+    keys = commands.add_parser('purge-keys', help="Delete old withdrawal idempotency keys")
+    keys.add_argument('--days', type=float, default=7, help="Keep keys created within this many days")
+    keys.add_argument('--batch-size', type=int, default=10000, help="Keys deleted per statement")
+    keys.add_argument('--pause', type=float, default=0.05, help="Seconds to pause between delete batches")
+    keys.set_defaults(handler=purge_keys)
+
+    args = parser.parse_args()
+    args.handler(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,137 @@
+"""
+Ledger Migration
+
+Streams every legacy per-customer transaction table (cus<acc_no>) into the
+shared 'transactions' ledger.
+
+Each source table is read with an unbuffered cursor and written with batched
+executemany inserts. All rows of one table are committed together with a
+marker row in 'ledger_migration', so an interrupted run can simply be started
+again: finished tables are skipped and a half-copied table is rolled back.
+
+Rows whose amount is not a whole number or whose status is not DEBIT/CREDIT
+are skipped and counted.
+
+Usage:
+    python SQL/MigrateLedger.py [--batch-size 5000] [--drop-source]
+"""
+
+import argparse
+import os
+import sys
+import time
+import mysql.connector as mycon
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from atm.config import DB_CONFIG
+from atm.schema import CREATE_LEDGER_MIGRATION, TRANSACTION_TYPES, create_schema
+
+INSERT_ROWS = '''insert into transactions(acc_no, amount, stat, time)
+values(%s, %s, %s, %s);'''
+
+
+def legacy_tables(cursor):
+    """Return the names of all cus<acc_no> tables that have not been migrated yet."""
+    cursor.execute('''select t.table_name from information_schema.tables t
+left join ledger_migration m on m.table_name = t.table_name
+where t.table_schema = database() and t.table_name like 'cus%'
+and t.table_name <> 'customers' and m.table_name is null
+order by t.table_name;''')
+    return [row[0] for row in cursor.fetchall()]
+
+
+def convert(acc_no, row):
+    """Convert a legacy (amount, stat, time) row, or return None if it is invalid."""
+    amount, stat, stamp = row
+    amount = str(amount).strip() if amount is not None else ''
+    stat = str(stat).strip().upper() if stat is not None else ''
+    if not amount.isdigit() or stat not in TRANSACTION_TYPES or stamp is None:
+        return None
+    return (acc_no, int(amount), stat, stamp)
+
+
+def migrate_table(reader, writer, table_name, batch_size):
+    """
+    Copy one legacy table into the ledger inside a single transaction.
+
+    Returns:
+        tuple: (rows copied, rows skipped)
+    """
+    acc_no = table_name[len('cus'):]
+    copied = skipped = 0
+    write_cursor = writer.cursor()
+    read_cursor = reader.cursor(buffered=False)
+    try:
+        read_cursor.execute(f"select amount, stat, time from `{table_name}`;")
+        while True:
+            rows = read_cursor.fetchmany(batch_size)
+            if not rows:
+                break
+            batch = []
+            for row in rows:
+                converted = convert(acc_no, row)
+                if converted is None:
+                    skipped += 1
+                else:
+                    batch.append(converted)
+            if batch:
+                write_cursor.executemany(INSERT_ROWS, batch)
+                copied += len(batch)
+        write_cursor.execute('''insert into ledger_migration(table_name, row_count, skipped)
+values(%s, %s, %s);''', (table_name, copied, skipped))
+        writer.commit()
+    except Exception:
+        writer.rollback()
+        raise
+    finally:
+        read_cursor.close()
+        write_cursor.close()
+    return copied, skipped
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Migrate cus<acc_no> tables into the transactions ledger")
+    parser.add_argument('--batch-size', type=int, default=5000, help="Rows per executemany batch")
+    parser.add_argument('--drop-source', action='store_true', help="Drop each legacy table once migrated")
+    args = parser.parse_args()
+
+    reader = mycon.connect(**DB_CONFIG)
+    writer = mycon.connect(**DB_CONFIG)
+    cursor = writer.cursor()
+    create_schema(cursor)
+    cursor.execute(CREATE_LEDGER_MIGRATION)
+    writer.commit()
+
+    tables = legacy_tables(cursor)
+    print(f"{len(tables)} legacy tables to migrate")
+
+    start = time.perf_counter()
+    total_copied = total_skipped = 0
+    failed = []
+    for number, table_name in enumerate(tables, 1):
+        try:
+            copied, skipped = migrate_table(reader, writer, table_name, args.batch_size)
+        except Exception as e:
+            print(f"Error migrating {table_name}: {e}")
+            failed.append(table_name)
+            continue
+        total_copied += copied
+        total_skipped += skipped
+        if args.drop_source:
+            cursor.execute(f"drop table `{table_name}`;")
+        if number % 100 == 0 or number == len(tables):
+            elapsed = time.perf_counter() - start
+            print(f"{number}/{len(tables)} tables, {total_copied} rows ({total_copied / elapsed:.0f} rows/s)")
+
+    cursor.close()
+    reader.close()
+    writer.close()
+
+    print(f"Migrated {total_copied} rows, skipped {total_skipped} invalid rows, {len(failed)} tables failed")
+    if failed:
+        print("Failed tables: " + ", ".join(failed))
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+"""
+Balance Reconciliation
+
+Verifies the running balance stored in 'customers' against the sum of each
+account's ledger entries in 'transactions'.
+
+Accounts are processed in pages ordered by acc_no (keyset pagination). Each
+page is checked with a single statement, so the stored balance and the ledger
+sum come from the same snapshot. With --fix, mismatched balances are reset to
+the ledger sum, but only if the stored balance has not changed since it was
+checked. The same command backfills balances after upgrading an existing
+database.
+
+History moved to the ledger archive (atm.archive) is part of the ledger: the
+archived total of each account is added to the sum of its table rows from the
+archive cutoff on, and table rows older than the cutoff that are not archived
+yet are added separately. Do not run this during an archive run.
+
+Usage:
+    python SQL/ReconcileBalances.py [--page-size 1000] [--fix]
+"""
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from atm.archive import EARLIEST, LedgerArchive
+from atm.backends import make_backend
+from atm.config import ARCHIVE_CONFIG
+
+CHECK_PAGE = '''select c.acc_no, c.balance,
+coalesce(sum(case when t.stat = 'CREDIT' then t.amount else -t.amount end), 0) as ledger
+from (select acc_no, balance from customers where acc_no > %s order by acc_no limit %s) c
+left join transactions t on t.acc_no = c.acc_no and t.time >= %s
+group by c.acc_no, c.balance
+order by c.acc_no;'''
+
+SELECT_LATE_ROWS = '''select id, acc_no, amount, stat, time from transactions where time < %s;'''
+
+FIX_BALANCE = '''update customers set balance = %s where acc_no = %s and balance = %s;'''
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Reconcile customer balances against the transactions ledger")
+    parser.add_argument('--page-size', type=int, default=1000, help="Accounts checked per statement")
+    parser.add_argument('--fix', action='store_true', help="Reset mismatched balances to the ledger sum")
+    args = parser.parse_args()
+
+    connection = make_backend().connect()
+    cursor = connection.cursor()
+
+    # Ledger entries that are not table rows from the archive cutoff on
+    archive = LedgerArchive.from_config(ARCHIVE_CONFIG)
+    cutoff = archive.cutoff if archive is not None else None
+    older = {}
+    if cutoff is not None:
+        older = archive.account_totals()
+        cursor.execute(SELECT_LATE_ROWS, (cutoff,))
+        for _, acc_no, amount, stat, _ in archive.drop_archived(cursor.fetchall()):
+            older[acc_no] = older.get(acc_no, 0) + (amount if stat == 'CREDIT' else -amount)
+        connection.commit()
+
+    start = time.perf_counter()
+    checked = mismatched = fixed = 0
+    last_acc_no = ''
+    while True:
+        cursor.execute(CHECK_PAGE, (last_acc_no, args.page_size, cutoff or EARLIEST))
+        rows = cursor.fetchall()
+        connection.commit()
+        if not rows:
+            break
+        last_acc_no = rows[-1][0]
+        checked += len(rows)
+
+        for acc_no, balance, ledger in rows:
+            ledger = int(ledger) + older.get(acc_no, 0)
+            if balance == ledger:
+                continue
+            mismatched += 1
+            print(f"Account {acc_no}: balance {balance}, ledger {ledger}")
+            if args.fix:
+                cursor.execute(FIX_BALANCE, (ledger, acc_no, balance))
+                fixed += cursor.rowcount
+        if args.fix:
+            connection.commit()
+
+    elapsed = time.perf_counter() - start
+    cursor.close()
+    connection.close()
+
+    print(f"Checked {checked} accounts in {elapsed:.1f}s, {mismatched} mismatched, {fixed} fixed")
+    if mismatched and not args.fix:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+"""
+Ledger Reports
+
+Operational reports across all accounts (see atm.reporting):
+
+Commands:
+    daily     Debit and credit counts and totals per day
+    banks     Debit and credit counts and totals per bank
+    unusual   Withdrawals far above the account's earlier withdrawals
+    refresh   Only update the cached aggregates
+
+Every report first folds ledger rows added since the last run into the cache
+in REPORT_CACHE_DIR (skip with --no-refresh, or start over with --rebuild).
+
+Usage:
+    python SQL/Reports.py daily [--from 2025-01-01] [--to 2025-01-31] [--csv daily.csv]
+    python SQL/Reports.py banks [--from 2025-01-01]
+    python SQL/Reports.py unusual [--limit 50]
+    python SQL/Reports.py refresh [--rebuild] [--chunk-size 50000]
+"""
+
+import argparse
+import os
+import sys
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from atm.config import DB_CONFIG, REPORT_CONFIG
+from atm.database import DatabaseManager
+from atm.reporting import LedgerReport
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Daily totals, bank volumes and unusual withdrawals")
+    parser.add_argument('command', choices=['daily', 'banks', 'unusual', 'refresh'])
+    parser.add_argument('--from', dest='start', help="First day to include (YYYY-MM-DD)")
+    parser.add_argument('--to', dest='end', help="Last day to include (YYYY-MM-DD)")
+    parser.add_argument('--limit', type=int, default=50, help="Rows shown by 'unusual'")
+    parser.add_argument('--csv', help="Also write the report to this CSV file")
+    parser.add_argument('--chunk-size', type=int, default=50000, help="Ledger rows read per query")
+    parser.add_argument('--rebuild', action='store_true', help="Discard the cache and scan the whole ledger")
+    parser.add_argument('--no-refresh', action='store_true', help="Report from the cache without reading new rows")
+    args = parser.parse_args()
+
+    start = datetime.strptime(args.start, '%Y-%m-%d') if args.start else None
+    end = datetime.strptime(args.end, '%Y-%m-%d') + timedelta(days=1) if args.end else None
+
+    db_manager = DatabaseManager(DB_CONFIG)
+    try:
+        report = LedgerReport.from_config(db_manager, REPORT_CONFIG)
+        if not args.no_refresh or args.rebuild:
+            processed = report.refresh(args.chunk_size, args.rebuild)
+            print(f"Processed {processed} new ledger rows in {report.meta['refresh_seconds']:.1f}s "
+                  f"({report.meta['rows']} in total, up to id {report.meta['last_id']})\n")
+    finally:
+        db_manager.close()
+
+    if args.command == 'refresh':
+        return
+    if args.command == 'daily':
+        table = report.daily_totals(start, end)
+    elif args.command == 'banks':
+        table = report.bank_volumes(start, end)
+    else:
+        table = report.unusual_withdrawals(start, end).head(args.limit)
+
+    if table.empty:
+        print("No transactions in this period.")
+    else:
+        print(table.to_string())
+    if args.csv:
+        table.to_csv(args.csv)
+        print(f"\nReport written to {args.csv}")
+
+
+if __name__ == "__main__":
+    main()
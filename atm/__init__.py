@@ -0,0 +1,9 @@
+"""
+ATM Core Package
+
+Shared building blocks used by the ATM GUI (window.py) and the maintenance
+scripts in the SQL/ directory.
+
+Author: ATM Project Team
+Date: 2025
+"""
@@ -0,0 +1,139 @@
+"""
+Account Index
+
+This module provides a fast membership index over customer account numbers.
+It replaces the plain ``cust_list`` list that used to be scanned on every
+account check.
+
+Modes:
+    - Preloaded: only the ``acc_no`` column is streamed from the database in
+      batches into a set, giving O(1) membership checks. Misses fall back to an
+      indexed point lookup so accounts created by other processes are found
+      and added to the index incrementally.
+    - On demand: nothing is preloaded; every check is an indexed point lookup
+      against the ``customers`` primary key.
+
+Author: ATM Project Team
+Date: 2025
+"""
+
+import threading
+
+
+class AccountIndex:
+    """
+    Membership index over customer account numbers.
+
+    The index is backed by a set of account numbers when preloaded, and by
+    primary-key point lookups otherwise. It is refreshed incrementally through
+    ``add`` and ``discard`` whenever customers are created or removed.
+    """
+
+    def __init__(self, db_manager, preload=True, fallback=True, batch_size=50000):
+        """
+        Initialize the account index.
+
+        Args:
+            db_manager (DatabaseManager): Database manager used for loading and lookups
+            preload (bool): Load all account numbers up front when True
+            fallback (bool): Confirm preloaded misses with a point lookup when True
+            batch_size (int): Number of rows fetched per round trip while loading
+        """
+        self.db_manager = db_manager
+        self.preload = preload
+        self.fallback = fallback
+        self.batch_size = batch_size
+        self._accounts = set()
+        self._loaded = False
+        self._changes = None  # acc_no -> True (added) / False (discarded) while a load is running
+        self._lock = threading.Lock()
+        self._load_lock = threading.Lock()
+
+    def load(self):
+        """
+        Stream all account numbers from the database into the index.
+
+        The new set is built off to the side and swapped in at the end, so
+        lookups keep working against the previous contents while loading.
+        Accounts added or discarded while the load runs are recorded and
+        re-applied to the new set before the swap, so they are not lost to
+        a snapshot taken before (or after) the change.
+
+        Returns:
+            int: Number of account numbers loaded
+        """
+        with self._load_lock:
+            with self._lock:
+                self._changes = {}
+            accounts = set()
+            try:
+                for batch in self.db_manager.iter_account_numbers(self.batch_size):
+                    accounts.update(batch)
+            except BaseException:
+                with self._lock:
+                    self._changes = None
+                raise
+            with self._lock:
+                for acc_no, added in self._changes.items():
+                    if added:
+                        accounts.add(acc_no)
+                    else:
+                        accounts.discard(acc_no)
+                self._changes = None
+                self._accounts = accounts
+                self._loaded = True
+            return len(accounts)
+
+    def contains(self, acc_no):
+        """
+        Check whether an account number exists.
+
+        Args:
+            acc_no (str): Customer account number
+
+        Returns:
+            bool: True if the account exists
+        """
+        if not acc_no:
+            return False
+        if self.preload and self._loaded:
+            if acc_no in self._accounts:
+                return True
+            if not self.fallback:
+                return False
+        if self.db_manager.account_exists(acc_no):
+            if self.preload:
+                self.add(acc_no)
+            return True
+        return False
+
+    def add(self, acc_no):
+        """
+        Add an account number to the index.
+
+        Args:
+            acc_no (str): Customer account number
+        """
+        if self.preload:
+            with self._lock:
+                self._accounts.add(acc_no)
+                if self._changes is not None:
+                    self._changes[acc_no] = True
+
+    def discard(self, acc_no):
+        """
+        Remove an account number from the index if present.
+
+        Args:
+            acc_no (str): Customer account number
+        """
+        with self._lock:
+            self._accounts.discard(acc_no)
+            if self._changes is not None:
+                self._changes[acc_no] = False
+
+    def __contains__(self, acc_no):
+        return self.contains(acc_no)
+
+    def __len__(self):
+        return len(self._accounts)
@@ -0,0 +1,602 @@
+"""
+Ledger Archive
+
+Cold ledger history is moved out of the transactions table into one columnar
+segment per calendar month:
+
+    <ARCHIVE_DIR>/manifest.json            archived months and the cutoff
+    <ARCHIVE_DIR>/2024-01.g1/id.npy        int64 ledger ids
+    <ARCHIVE_DIR>/2024-01.g1/account.npy   int32 index into accounts.npy
+    <ARCHIVE_DIR>/2024-01.g1/amount.npy    int64 amounts
+    <ARCHIVE_DIR>/2024-01.g1/stat.npy      int8 (0 = DEBIT, 1 = CREDIT)
+    <ARCHIVE_DIR>/2024-01.g1/time.npy      int64 microseconds since the epoch
+    <ARCHIVE_DIR>/2024-01.g1/accounts.npy  sorted account numbers of the month
+
+Rows of a segment are sorted by (account, time, id), so an account's history
+in a month is one contiguous slice found by binary search. Columns are plain
+fixed-width .npy files and are read memory-mapped: a passbook touches only
+the pages of its own account, whatever the size of the month.
+
+Everything before the manifest's cutoff (always the first day of a month) is
+archived. DatabaseManager merges the archive with the hot table, so
+iter_transactions and iter_ledger return the same rows before and after
+archiving. Rows that reach the table with a time before the cutoff are
+merged in as well, and folded into the archive by the next run.
+
+Archiving a month writes a new segment generation, verifies it, publishes it
+in the manifest and only then deletes the month's rows from the table in
+small batches. A run that stops half way is finished by running it again;
+until then readers skip table rows that are already archived.
+
+Usage:
+    python -m atm.archive status
+    python -m atm.archive run [--before 2024-01-01 | --keep-months 12] [--batch-size 10000]
+
+Author: ATM Project Team
+Date: 2025
+"""
+
+import argparse
+import heapq
+import json
+import os
+import shutil
+import threading
+import time
+from datetime import datetime
+from itertools import chain
+from operator import itemgetter
+import numpy as np
+from atm.journal import fsync_directory
+from atm.metrics import METRICS
+
+STATS = ('DEBIT', 'CREDIT')
+STAT_NAMES = np.array(STATS)
+COLUMNS = {'id': np.int64, 'account': np.int32, 'amount': np.int64, 'stat': np.int8, 'time': np.int64}
+MANIFEST = 'manifest.json'
+EARLIEST = datetime(1970, 1, 1)
+
+SELECT_OLDEST = "SELECT time FROM transactions WHERE time >= %s AND time < %s ORDER BY time LIMIT 1"
+SELECT_PERIOD = "SELECT id, acc_no, amount, stat, time FROM transactions WHERE time >= %s AND time < %s"
+
+
+def month_start(moment):
+    """Return midnight on the first day of the month of a datetime."""
+    return datetime(moment.year, moment.month, 1)
+
+
+def add_months(moment, months):
+    """Return the first day of the month a number of months after (or before) a datetime."""
+    index = moment.year * 12 + moment.month - 1 + months
+    return datetime(index // 12, index % 12 + 1, 1)
+
+
+def to_epoch(times):
+    """Convert naive datetimes to int64 microseconds since the epoch."""
+    return np.array(times, dtype='datetime64[us]').astype(np.int64)
+
+
+def from_epoch(values):
+    """Convert int64 microseconds since the epoch back to datetimes."""
+    return np.asarray(values).astype('datetime64[us]').tolist()
+
+
+def encode_stats(stats):
+    """Encode DEBIT/CREDIT strings as int8 codes (index into STATS)."""
+    stats = np.asarray(stats, dtype=str)
+    codes = np.full(len(stats), -1, dtype=np.int8)
+    for code, name in enumerate(STATS):
+        codes[stats == name] = code
+    if (codes < 0).any():
+        raise ValueError(f"Unknown transaction type: {stats[codes < 0][0]}")
+    return codes
+
+
+def merge_chunks(chunks, rows, chunk_size):
+    """
+    Merge time-ordered (amount, stat, time) chunks with a short sorted list of rows.
+
+    Yields:
+        list: Chunks of at most chunk_size rows in time order
+    """
+    merged = heapq.merge(chain.from_iterable(chunks), rows, key=itemgetter(2))
+    while True:
+        chunk = [row for _, row in zip(range(chunk_size), merged)]
+        if not chunk:
+            return
+        yield chunk
+
+
+class Segment:
+    """One archived month, with its columns memory-mapped."""
+
+    def __init__(self, path):
+        self.path = path
+        self.accounts = np.load(os.path.join(path, 'accounts.npy'))
+        self.columns = {name: np.load(os.path.join(path, f'{name}.npy'), mmap_mode='r') for name in COLUMNS}
+        self._sorted_ids = None
+
+    def __len__(self):
+        return len(self.columns['id'])
+
+    @staticmethod
+    def write(path, ids, acc_nos, amounts, stats, times):
+        """
+        Write a segment to a new directory, sorted by (account, time, id).
+
+        The files are written under ``<path>.tmp`` and renamed into place once
+        they are on disk, so a segment directory is always complete.
+
+        Args:
+            path (str): Segment directory to create
+            ids, acc_nos, amounts, stats, times (numpy.ndarray): Columns; stats
+                already encoded, times in epoch microseconds
+        """
+        accounts, codes = np.unique(acc_nos, return_inverse=True)
+        order = np.lexsort((ids, times, codes))
+        columns = {'id': ids, 'account': codes, 'amount': amounts, 'stat': stats, 'time': times}
+        temp_path = path + '.tmp'
+        shutil.rmtree(temp_path, ignore_errors=True)
+        os.makedirs(temp_path)
+        arrays = {name: np.ascontiguousarray(columns[name][order], dtype=dtype) for name, dtype in COLUMNS.items()}
+        arrays['accounts'] = accounts.astype(str)
+        for name, array in arrays.items():
+            with open(os.path.join(temp_path, f'{name}.npy'), 'wb') as file:
+                np.save(file, array)
+                file.flush()
+                os.fsync(file.fileno())
+        fsync_directory(temp_path)
+        os.rename(temp_path, path)
+        fsync_directory(os.path.dirname(path))
+
+    def locate(self, acc_no, start=None, end=None):
+        """
+        Find an account's rows by binary search.
+
+        Args:
+            acc_no (str): Customer account number
+            start (int): Only rows at or after this epoch-microsecond time
+            end (int): Only rows before this epoch-microsecond time
+
+        Returns:
+            tuple: (first, last) row positions; first == last if there are none
+        """
+        code = int(np.searchsorted(self.accounts, acc_no))
+        if code == len(self.accounts) or self.accounts[code] != acc_no:
+            return 0, 0
+        codes = self.columns['account']
+        first = int(np.searchsorted(codes, code, 'left'))
+        last = int(np.searchsorted(codes, code, 'right'))
+        times = self.columns['time'][first:last]
+        if end is not None:
+            last = first + int(np.searchsorted(times, end, 'left'))
+        if start is not None:
+            first += int(np.searchsorted(times, start, 'left'))
+        return first, max(first, last)
+
+    def sorted_ids(self):
+        """All ids of the segment in ascending order (loaded on first use)."""
+        if self._sorted_ids is None:
+            self._sorted_ids = np.sort(self.columns['id'])
+        return self._sorted_ids
+
+    def decode(self, index):
+        """Return the ledger rows at the given positions as (id, acc_no, amount, stat, time) columns."""
+        return (self.columns['id'][index].tolist(),
+                self.accounts[self.columns['account'][index]].tolist(),
+                self.columns['amount'][index].tolist(),
+                STAT_NAMES[self.columns['stat'][index]].tolist(),
+                from_epoch(self.columns['time'][index]))
+
+
+class LedgerArchive:
+    """
+    Reader and writer of the columnar ledger archive.
+
+    Readers pick up a new manifest on their next call, so a long-running
+    process sees months archived by another process. Only one archive run
+    should write to a directory at a time.
+    """
+
+    def __init__(self, directory):
+        """
+        Args:
+            directory (str): Archive directory; created by the first archive run
+        """
+        self.directory = directory
+        self.manifest = {'cutoff': None, 'periods': {}}
+        self._manifest_id = None
+        self._segments = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls, config):
+        """
+        Build a LedgerArchive from an ARCHIVE_CONFIG-style dict.
+
+        Returns:
+            LedgerArchive: The archive, or None if no directory is configured
+        """
+        if not config.get('directory'):
+            return None
+        return cls(config['directory'])
+
+    def _load_manifest(self):
+        path = os.path.join(self.directory, MANIFEST)
+        try:
+            info = os.stat(path)
+            manifest_id = (info.st_ino, info.st_mtime_ns)
+        except FileNotFoundError:
+            manifest_id = None
+        with self._lock:
+            if manifest_id != self._manifest_id:
+                if manifest_id is None:
+                    self.manifest = {'cutoff': None, 'periods': {}}
+                else:
+                    with open(path, encoding='utf-8') as file:
+                        self.manifest = json.load(file)
+                live = {period['segment'] for period in self.manifest['periods'].values()}
+                self._segments = {name: segment for name, segment in self._segments.items() if name in live}
+                self._manifest_id = manifest_id
+            return self.manifest
+
+    def _save_manifest(self, manifest):
+        path = os.path.join(self.directory, MANIFEST)
+        with open(path + '.tmp', 'w', encoding='utf-8') as file:
+            json.dump(manifest, file, indent=2, sort_keys=True)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(path + '.tmp', path)
+        fsync_directory(self.directory)
+
+    def _segment(self, name):
+        with self._lock:
+            segment = self._segments.get(name)
+            if segment is None:
+                segment = self._segments[name] = Segment(os.path.join(self.directory, name))
+            return segment
+
+    @property
+    def cutoff(self):
+        """datetime: Everything before this time is archived, or None if nothing is."""
+        cutoff = self._load_manifest()['cutoff']
+        return datetime.fromisoformat(cutoff) if cutoff else None
+
+    def _periods(self, start=None, end=None):
+        """Yield (period start, segment) for the archived months overlapping [start, end)."""
+        manifest = self._load_manifest()
+        for name in sorted(manifest['periods']):
+            period = datetime.strptime(name, '%Y-%m')
+            if end is not None and period >= end:
+                break
+            if start is not None and add_months(period, 1) <= start:
+                continue
+            yield period, manifest['periods'][name]
+
+    def iter_transactions(self, acc_no, start=None, end=None, chunk_size=1000):
+        """
+        Stream an account's archived entries in chronological order.
+
+        Yields:
+            list: A chunk of (amount, stat, time) tuples
+        """
+        start_us = None if start is None else int(to_epoch([start])[0])
+        end_us = None if end is None else int(to_epoch([end])[0])
+        for _, period in self._periods(start, end):
+            segment = self._segment(period['segment'])
+            first, last = segment.locate(acc_no, start_us, end_us)
+            for offset in range(first, last, chunk_size):
+                index = slice(offset, min(offset + chunk_size, last))
+                _, _, amounts, stats, times = segment.decode(index)
+                METRICS.inc('atm_archive_rows_total', 'iter_transactions', len(amounts))
+                yield list(zip(amounts, stats, times))
+
+    def recent(self, acc_no, limit):
+        """
+        Read an account's newest archived entries.
+
+        Returns:
+            list: Up to limit (amount, stat, time) tuples, newest first
+        """
+        rows = []
+        for _, period in reversed(list(self._periods())):
+            if len(rows) >= limit:
+                break
+            segment = self._segment(period['segment'])
+            first, last = segment.locate(acc_no)
+            _, _, amounts, stats, times = segment.decode(slice(max(first, last - (limit - len(rows))), last))
+            rows.extend(reversed(list(zip(amounts, stats, times))))
+        return rows
+
+    def iter_ledger(self, after_id=0, chunk_size=50000):
+        """
+        Stream all archived entries with an id above after_id, month by month.
+
+        Yields:
+            list: A chunk of (id, acc_no, amount, stat, time) tuples, in id order within a month
+        """
+        for _, period in self._periods():
+            if period['last_id'] <= after_id:
+                continue
+            segment = self._segment(period['segment'])
+            ids = segment.columns['id']
+            selected = np.flatnonzero(ids > after_id)
+            selected = selected[np.argsort(ids[selected], kind='stable')]
+            for offset in range(0, len(selected), chunk_size):
+                rows = list(zip(*segment.decode(selected[offset:offset + chunk_size])))
+                METRICS.inc('atm_archive_rows_total', 'iter_ledger', len(rows))
+                yield rows
+
+    def account_totals(self):
+        """
+        Sum the archived entries of every account.
+
+        Returns:
+            dict: acc_no -> credits minus debits over all archived months
+        """
+        totals = {}
+        for _, period in self._periods():
+            segment = self._segment(period['segment'])
+            amounts = np.asarray(segment.columns['amount'])
+            signed = np.where(segment.columns['stat'] == STATS.index('CREDIT'), amounts, -amounts)
+            codes = np.asarray(segment.columns['account'])
+            starts = np.flatnonzero(np.r_[True, codes[1:] != codes[:-1]])
+            sums = np.add.reduceat(signed, starts)
+            for acc_no, total in zip(segment.accounts[codes[starts]].tolist(), sums.tolist()):
+                totals[acc_no] = totals.get(acc_no, 0) + total
+        return totals
+
+    def archived(self, ids, times):
+        """
+        Check which ledger rows are already in the archive.
+
+        Args:
+            ids (list): Ledger ids
+            times (list): Their times
+
+        Returns:
+            numpy.ndarray: Boolean mask, True where the row is archived
+        """
+        ids = np.asarray(ids, dtype=np.int64)
+        periods = to_epoch(times).astype('datetime64[us]').astype('datetime64[M]').astype(str)
+        mask = np.zeros(len(ids), dtype=bool)
+        manifest = self._load_manifest()
+        for name in np.unique(periods):
+            period = manifest['periods'].get(name)
+            if period is None:
+                continue
+            sorted_ids = self._segment(period['segment']).sorted_ids()
+            rows = periods == name
+            positions = np.searchsorted(sorted_ids, ids[rows]).clip(max=len(sorted_ids) - 1)
+            mask[rows] = sorted_ids[positions] == ids[rows]
+        return mask
+
+    def drop_archived(self, rows):
+        """
+        Remove table rows that are already archived (left over from an unfinished run).
+
+        Args:
+            rows (list): Tuples with the ledger id first and the time last
+
+        Returns:
+            list: The rows that are not archived
+        """
+        cutoff = self.cutoff
+        if cutoff is None:
+            return rows
+        old = [i for i, row in enumerate(rows) if row[-1] < cutoff]
+        if not old:
+            return rows
+        mask = self.archived([rows[i][0] for i in old], [rows[i][-1] for i in old])
+        dropped = {old[i] for i in np.flatnonzero(mask)}
+        return [row for i, row in enumerate(rows) if i not in dropped]
+
+    def _read_period(self, pool, start, end, chunk_size):
+        columns = [[], [], [], [], []]
+        with pool.connection() as conn:
+            cursor = conn.cursor(buffered=False)
+            try:
+                cursor.execute(SELECT_PERIOD, (start, end))
+                while True:
+                    rows = cursor.fetchmany(chunk_size)
+                    if not rows:
+                        break
+                    ids, acc_nos, amounts, stats, times = zip(*rows)
+                    columns[0].append(np.array(ids, dtype=np.int64))
+                    columns[1].append(np.array(acc_nos, dtype=str))
+                    columns[2].append(np.array(amounts, dtype=np.int64))
+                    columns[3].append(encode_stats(stats))
+                    columns[4].append(to_epoch(times))
+            finally:
+                cursor.close()
+        if not columns[0]:
+            return None
+        return [np.concatenate(column) for column in columns]
+
+    def _query_one(self, pool, query, params):
+        with pool.connection() as conn:
+            cursor = conn.cursor()
+            try:
+                cursor.execute(query, params)
+                row = cursor.fetchone()
+                conn.commit()
+                return row[0] if row else None
+            finally:
+                cursor.close()
+
+    def _delete(self, pool, ids, batch_size, pause):
+        for offset in range(0, len(ids), batch_size):
+            batch = ids[offset:offset + batch_size].tolist()
+            placeholders = ', '.join(['%s'] * len(batch))
+            with pool.connection() as conn:
+                cursor = conn.cursor()
+                try:
+                    cursor.execute(f"DELETE FROM transactions WHERE id IN ({placeholders})", tuple(batch))
+                    conn.commit()
+                finally:
+                    cursor.close()
+            if pause:
+                time.sleep(pause)
+
+    def archive(self, db_manager, before, batch_size=10000, pause=0.0):
+        """
+        Move ledger rows older than the start of before's month into the archive.
+
+        Args:
+            db_manager (DatabaseManager): Database access layer
+            before (datetime): Archive everything before the first day of this month
+            batch_size (int): Rows read per fetch and deleted per transaction
+            pause (float): Seconds to sleep between delete batches
+
+        Returns:
+            int: Number of rows moved out of the table
+        """
+        cutoff = month_start(before)
+        os.makedirs(self.directory, exist_ok=True)
+        moved = 0
+        lower = EARLIEST
+        while True:
+            oldest = self._query_one(db_manager.pool, SELECT_OLDEST, (lower, cutoff))
+            if oldest is None:
+                break
+            start = month_start(oldest)
+            end = add_months(start, 1)
+            moved += self._archive_period(db_manager.pool, start, end, batch_size, pause)
+            lower = end
+        manifest = self._load_manifest()
+        if manifest['cutoff'] is None or datetime.fromisoformat(manifest['cutoff']) < cutoff:
+            self._save_manifest(dict(manifest, cutoff=cutoff.isoformat()))
+        return moved
+
+    def _archive_period(self, pool, start, end, batch_size, pause):
+        columns = self._read_period(pool, start, end, batch_size)
+        if columns is None:
+            return 0
+        hot_ids = columns[0]
+        name = start.strftime('%Y-%m')
+        manifest = self._load_manifest()
+        period = manifest['periods'].get(name)
+        if period is not None:
+            # Merge with the archived month, skipping rows an unfinished run already archived
+            segment = self._segment(period['segment'])
+            new = ~np.isin(hot_ids, segment.columns['id'])
+            columns = [np.concatenate([old, column[new]]) for old, column in
+                       zip(self._segment_columns(segment), columns)]
+            generation = period['generation'] + 1
+        else:
+            new = np.ones(len(hot_ids), dtype=bool)
+            generation = 1
+
+        if new.any():
+            periods = dict(manifest['periods'])
+            periods[name] = self._write_generation(name, generation, columns)
+            cutoff = max(end, datetime.fromisoformat(manifest['cutoff'])) if manifest['cutoff'] else end
+            self._save_manifest(dict(manifest, periods=periods, cutoff=cutoff.isoformat()))
+            if period is not None:
+                shutil.rmtree(os.path.join(self.directory, period['segment']), ignore_errors=True)
+
+        self._delete(pool, hot_ids, batch_size, pause)
+        METRICS.inc('atm_archive_rows_total', 'archived', len(hot_ids))
+        return len(hot_ids)
+
+    def _write_generation(self, name, generation, columns):
+        """Write and verify a month's segment; returns its manifest entry (not yet published)."""
+        segment_name = f'{name}.g{generation}'
+        path = os.path.join(self.directory, segment_name)
+        shutil.rmtree(path, ignore_errors=True)
+        Segment.write(path, *columns)
+        written = Segment(path)
+        if (len(written) != len(columns[0]) or int(written.columns['amount'].sum()) != int(columns[2].sum())
+                or not np.isin(columns[0], written.columns['id']).all()):
+            raise RuntimeError(f"Archive segment {segment_name} does not match the ledger rows read")
+        return {'segment': segment_name, 'generation': generation, 'rows': len(written),
+                'last_id': int(columns[0].max()), 'bytes': self._size(path)}
+
+    def remove_accounts(self, acc_nos):
+        """
+        Drop every archived entry of the given accounts, e.g. after they are closed.
+
+        Each month holding any of the accounts is rewritten as a new generation
+        without them (or removed if nothing is left) and published in the manifest.
+
+        Args:
+            acc_nos (iterable): Account numbers
+
+        Returns:
+            int: Number of archived entries removed
+        """
+        acc_nos = np.array(sorted(set(acc_nos)), dtype=str)
+        removed = 0
+        for name in sorted(self._load_manifest()['periods']):
+            manifest = self._load_manifest()
+            period = manifest['periods'][name]
+            segment = self._segment(period['segment'])
+            codes = np.flatnonzero(np.isin(segment.accounts, acc_nos))
+            if not len(codes):
+                continue
+            keep = ~np.isin(segment.columns['account'], codes)
+            removed += int(len(keep) - keep.sum())
+            periods = dict(manifest['periods'])
+            if keep.any():
+                columns = [column[keep] for column in self._segment_columns(segment)]
+                periods[name] = self._write_generation(name, period['generation'] + 1, columns)
+            else:
+                del periods[name]
+            self._save_manifest(dict(manifest, periods=periods))
+            shutil.rmtree(os.path.join(self.directory, period['segment']), ignore_errors=True)
+        return removed
+
+    @staticmethod
+    def _segment_columns(segment):
+        columns = segment.columns
+        return (np.asarray(columns['id']), segment.accounts[columns['account']], np.asarray(columns['amount']),
+                np.asarray(columns['stat']), np.asarray(columns['time']))
+
+    @staticmethod
+    def _size(path):
+        return sum(entry.stat().st_size for entry in os.scandir(path))
+
+    def stats(self):
+        """Return the archived months, rows, size on disk and cutoff."""
+        manifest = self._load_manifest()
+        periods = manifest['periods'].values()
+        return {'cutoff': manifest['cutoff'], 'months': len(periods),
+                'rows': sum(period['rows'] for period in periods),
+                'bytes': sum(period['bytes'] for period in periods)}
+
+
+def main():
+    """Show the archive configured in .env, or archive old ledger rows into it."""
+    from atm.config import ARCHIVE_CONFIG, DB_CONFIG
+    from atm.database import DatabaseManager
+
+    parser = argparse.ArgumentParser(description="Move cold ledger history into the columnar archive")
+    parser.add_argument('command', choices=['status', 'run'])
+    parser.add_argument('--before', help="Archive months before this date (YYYY-MM-DD)")
+    parser.add_argument('--keep-months', type=int, default=ARCHIVE_CONFIG['keep_months'],
+                        help="Keep this many months, including the current one, in the table")
+    parser.add_argument('--batch-size', type=int, default=10000, help="Rows read per fetch and deleted per commit")
+    parser.add_argument('--pause', type=float, default=0.0, help="Seconds to sleep between delete batches")
+    args = parser.parse_args()
+
+    db_manager = DatabaseManager(DB_CONFIG)
+    try:
+        if db_manager.archive is None:
+            print("Error: ARCHIVE_DIR is not set")
+            return
+        if args.command == 'run':
+            if args.before:
+                before = datetime.strptime(args.before, '%Y-%m-%d')
+            else:
+                before = add_months(datetime.now(), 1 - args.keep_months)
+            start = time.perf_counter()
+            moved = db_manager.archive.archive(db_manager, before, args.batch_size, args.pause)
+            print(f"Archived {moved} ledger rows in {time.perf_counter() - start:.1f}s")
+        for key, value in db_manager.archive.stats().items():
+            print(f"{key}: {value}")
+    finally:
+        db_manager.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,274 @@
+"""
+Storage Backends
+
+The database engines the ATM can run on, selected with DB_BACKEND in .env:
+
+    - MySQLBackend: the MySQL server described by the DB_* settings
+    - SQLiteBackend: an embedded SQLite file (DB_PATH) for edge terminals and
+      test runs without a MySQL server
+
+Both hand out connections with the interface the rest of the code already
+uses (``cursor(prepared=..., buffered=...)``, ``commit``, ``rollback``,
+``is_connected``, ``close``) and accept the same ``%s``-style SQL, so
+DatabaseManager, the write pipeline and the SQL/ scripts do not need to know
+which engine they are talking to.
+
+Author: ATM Project Team
+Date: 2025
+"""
+
+import contextlib
+import functools
+import os
+import sqlite3
+from datetime import datetime
+from atm.config import BACKEND_CONFIG, DB_CONFIG
+from atm.schema import create_schema
+
+
+class MySQLBackend:
+    """MySQL server accessed through mysql.connector (imported on first use)."""
+
+    name = 'mysql'
+
+    def __init__(self, config):
+        """
+        Args:
+            config (dict): mysql.connector connection settings (host, user, password, database)
+        """
+        self.config = config
+
+    @property
+    def Error(self):
+        """Base class of the driver's database errors."""
+        import mysql.connector as mycon
+        return mycon.Error
+
+    @property
+    def retryable_errors(self):
+        """Errors that indicate a broken connection worth one retry."""
+        import mysql.connector as mycon
+        return (mycon.errors.OperationalError, mycon.errors.InterfaceError)
+
+    @property
+    def integrity_errors(self):
+        """Errors raised for duplicate keys."""
+        import mysql.connector as mycon
+        return (mycon.errors.IntegrityError,)
+
+    def connect(self):
+        """Open a new connection to the ATM database."""
+        import mysql.connector as mycon
+        return mycon.connect(**self.config)
+
+    def create_database(self):
+        """Create the ATM database itself if it does not exist."""
+        import mysql.connector as mycon
+        settings = {key: value for key, value in self.config.items() if key != 'database'}
+        connection = mycon.connect(**settings)
+        cursor = connection.cursor()
+        cursor.execute(f"create database if not exists `{self.config['database']}`;")
+        connection.commit()
+        cursor.close()
+        connection.close()
+
+    def create_schema(self, cursor):
+        """Create the ATM tables (see atm.schema)."""
+        create_schema(cursor)
+
+
+# =============================================================================
+# SQLITE
+# =============================================================================
+
+# Timestamps are stored as 'YYYY-MM-DD HH:MM:SS.fff' text and read back as datetime
+sqlite3.register_adapter(datetime, lambda value: value.isoformat(' '))
+sqlite3.register_converter('timestamp', lambda value: datetime.fromisoformat(value.decode()))
+
+
+@functools.lru_cache(maxsize=512)
+def translate(query):
+    """
+    Rewrite a ``%s``-style query for SQLite's ``?`` placeholders.
+
+    Row locks (``FOR UPDATE``) are dropped: SQLite allows one writer at a time,
+    so a write transaction already excludes every other writer.
+    """
+    query = query.replace('%s', '?')
+    if query.rstrip(' ;').upper().endswith(' FOR UPDATE'):
+        query = query.rstrip(' ;')[:-len(' FOR UPDATE')]
+    return query
+
+
+class SQLiteUnavailableError(sqlite3.OperationalError):
+    """The database file could not be opened, read or written (not a lock or SQL error)."""
+
+
+# Primary result codes of an unreachable store; busy/locked and bad SQL are
+# OperationalError too, but retrying or deferring those would hide real faults
+UNAVAILABLE_CODES = (sqlite3.SQLITE_CANTOPEN, sqlite3.SQLITE_IOERR)
+UNAVAILABLE_MESSAGES = ('unable to open database file', 'disk i/o error')
+
+
+def is_unavailable(error):
+    """Return True if an sqlite3 error means the database file cannot be reached."""
+    code = getattr(error, 'sqlite_errorcode', None)
+    if code is not None:
+        return code & 0xff in UNAVAILABLE_CODES
+    return str(error).lower().startswith(UNAVAILABLE_MESSAGES)
+
+
+@contextlib.contextmanager
+def classify_errors():
+    """Re-raise I/O and open failures as SQLiteUnavailableError."""
+    try:
+        yield
+    except sqlite3.OperationalError as e:
+        if not isinstance(e, SQLiteUnavailableError) and is_unavailable(e):
+            raise SQLiteUnavailableError(*e.args) from e
+        raise
+
+
+class SQLiteCursor:
+    """DB-API cursor that accepts the ``%s`` placeholders used throughout the code."""
+
+    def __init__(self, cursor):
+        self._cursor = cursor
+
+    def execute(self, query, params=()):
+        with classify_errors():
+            self._cursor.execute(translate(query), tuple(params or ()))
+        return self
+
+    def executemany(self, query, seq_of_params):
+        with classify_errors():
+            self._cursor.executemany(translate(query), seq_of_params)
+        return self
+
+    def fetchone(self):
+        with classify_errors():
+            return self._cursor.fetchone()
+
+    def fetchmany(self, size=1):
+        with classify_errors():
+            return self._cursor.fetchmany(size)
+
+    def fetchall(self):
+        with classify_errors():
+            return self._cursor.fetchall()
+
+    @property
+    def rowcount(self):
+        return self._cursor.rowcount
+
+    @property
+    def lastrowid(self):
+        return self._cursor.lastrowid
+
+    def close(self):
+        self._cursor.close()
+
+
+class SQLiteConnection:
+    """sqlite3 connection with the mysql.connector-style methods the code relies on."""
+
+    def __init__(self, connection):
+        self._connection = connection
+
+    def cursor(self, prepared=False, buffered=True):
+        # sqlite3 keeps a per-connection cache of compiled statements, so every
+        # cursor already reuses prepared statements and reads rows lazily
+        return SQLiteCursor(self._connection.cursor())
+
+    def commit(self):
+        with classify_errors():
+            self._connection.commit()
+
+    def rollback(self):
+        self._connection.rollback()
+
+    def is_connected(self):
+        try:
+            self._connection.execute("select 1").fetchone()
+            return True
+        except sqlite3.Error:
+            return False
+
+    def close(self):
+        self._connection.close()
+
+
+class SQLiteBackend:
+    """
+    Embedded SQLite database file.
+
+    Connections use write-ahead logging, so readers never block the writer,
+    and synchronous=NORMAL, which fsyncs at checkpoints instead of on every
+    commit. Pair it with group commit (on by default for SQLite) so ledger
+    writes from many threads share one transaction.
+    """
+
+    name = 'sqlite'
+    Error = sqlite3.Error
+    retryable_errors = (SQLiteUnavailableError,)
+    integrity_errors = (sqlite3.IntegrityError,)
+
+    def __init__(self, path, busy_timeout=5.0, synchronous='NORMAL', cache_size_kb=65536, cached_statements=256):
+        """
+        Args:
+            path (str): Database file
+            busy_timeout (float): Seconds to wait for another connection's write lock
+            synchronous (str): SQLite synchronous mode (OFF, NORMAL, FULL)
+            cache_size_kb (int): Page cache size per connection in KiB
+            cached_statements (int): Compiled statements kept per connection
+        """
+        self.path = path
+        self.busy_timeout = busy_timeout
+        self.synchronous = synchronous
+        self.cache_size_kb = cache_size_kb
+        self.cached_statements = cached_statements
+
+    def connect(self):
+        """Open a new connection to the database file."""
+        with classify_errors():
+            connection = sqlite3.connect(self.path, timeout=self.busy_timeout, check_same_thread=False,
+                                         detect_types=sqlite3.PARSE_DECLTYPES,
+                                         cached_statements=self.cached_statements)
+            connection.execute("pragma journal_mode = wal")
+            connection.execute(f"pragma synchronous = {self.synchronous}")
+            connection.execute(f"pragma cache_size = -{int(self.cache_size_kb)}")
+            connection.execute("pragma temp_store = memory")
+        return SQLiteConnection(connection)
+
+    def create_database(self):
+        """Create the directory holding the database file."""
+        directory = os.path.dirname(os.path.abspath(self.path))
+        os.makedirs(directory, exist_ok=True)
+
+    def create_schema(self, cursor):
+        """Create the ATM tables using SQLite DDL (see atm.schema)."""
+        create_schema(cursor, dialect='sqlite')
+
+
+BACKENDS = {'mysql': MySQLBackend, 'sqlite': SQLiteBackend}
+
+
+def make_backend(backend_config=None, db_config=None):
+    """
+    Build the storage backend selected in .env.
+
+    Args:
+        backend_config (dict): BACKEND_CONFIG-style settings (defaults to BACKEND_CONFIG)
+        db_config (dict): MySQL connection settings (defaults to DB_CONFIG)
+
+    Returns:
+        MySQLBackend | SQLiteBackend: The backend
+    """
+    backend_config = BACKEND_CONFIG if backend_config is None else backend_config
+    name = backend_config['backend']
+    if name == 'mysql':
+        return MySQLBackend(DB_CONFIG if db_config is None else db_config)
+    if name == 'sqlite':
+        return SQLiteBackend(backend_config['path'], backend_config['busy_timeout'],
+                             backend_config['synchronous'], backend_config['cache_size_kb'])
+    raise ValueError(f"Unknown DB_BACKEND: {name} (expected one of {', '.join(BACKENDS)})")
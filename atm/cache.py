@@ -0,0 +1,147 @@
+"""
+TTL Cache
+
+A bounded, thread-safe LRU cache whose entries also expire after a fixed
+time-to-live. Used by DatabaseManager to avoid repeated round trips for the
+same customer record within one ATM session.
+
+Author: ATM Project Team
+Date: 2025
+"""
+
+import threading
+import time
+from collections import OrderedDict
+
+
+class TTLCache:
+    """
+    Least-recently-used cache with per-entry expiry.
+
+    When full, the least recently used entry is evicted. Entries older than
+    ``ttl`` seconds are treated as missing and dropped on access.
+    """
+
+    def __init__(self, maxsize=1024, ttl=30.0):
+        """
+        Initialize the cache.
+
+        Args:
+            maxsize (int): Maximum number of entries kept
+            ttl (float): Seconds an entry stays valid after being stored
+        """
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self._epoch = 0
+        self._generations = {}  # key -> invalidation count, reset (with a new epoch) when it grows too large
+        self._stats = {
+            'hits': 0,
+            'misses': 0,
+            'evictions': 0,
+            'expirations': 0,
+            'invalidations': 0
+        }
+
+    def get(self, key, default=None):
+        """
+        Look up a key, refreshing its LRU position on a hit.
+
+        Args:
+            key: Cache key
+            default: Value returned on a miss
+
+        Returns:
+            The cached value, or default if missing or expired
+        """
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self._stats['misses'] += 1
+                return default
+            value, expires_at = entry
+            if expires_at <= time.monotonic():
+                del self._data[key]
+                self._stats['expirations'] += 1
+                self._stats['misses'] += 1
+                return default
+            self._data.move_to_end(key)
+            self._stats['hits'] += 1
+            return value
+
+    def generation(self, key):
+        """
+        Return a token to pass to ``put`` after loading the value of a key.
+
+        Any invalidation of the same key between taking the token and calling
+        ``put`` makes the put a no-op, so a value read before a write can never
+        be cached after it. Writes to other keys do not affect the token.
+
+        Args:
+            key: Cache key about to be loaded
+
+        Returns:
+            tuple: The key's current invalidation generation
+        """
+        with self._lock:
+            return self._epoch, self._generations.get(key, 0)
+
+    def put(self, key, value, generation=None):
+        """
+        Store a value, evicting the least recently used entry if full.
+
+        Args:
+            key: Cache key
+            value: Value to cache
+            generation (tuple): Token from ``generation(key)`` taken before loading the value
+        """
+        with self._lock:
+            if generation is not None and generation != (self._epoch, self._generations.get(key, 0)):
+                return
+            self._data[key] = (value, time.monotonic() + self.ttl)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self._stats['evictions'] += 1
+
+    def invalidate(self, key):
+        """
+        Drop a key from the cache.
+
+        Args:
+            key: Cache key
+        """
+        with self._lock:
+            if len(self._generations) >= 4 * self.maxsize:
+                # Bound the counters: a new epoch voids every outstanding token at once
+                self._generations.clear()
+                self._epoch += 1
+            self._generations[key] = self._generations.get(key, 0) + 1
+            if self._data.pop(key, None) is not None:
+                self._stats['invalidations'] += 1
+
+    def clear(self):
+        """Drop every entry."""
+        with self._lock:
+            self._epoch += 1
+            self._generations.clear()
+            self._data.clear()
+
+    def stats(self):
+        """
+        Return a snapshot of cache statistics.
+
+        Returns:
+            dict: Size and hit/miss/eviction/expiration/invalidation counters
+        """
+        with self._lock:
+            stats = dict(self._stats)
+            stats['size'] = len(self._data)
+            stats['maxsize'] = self.maxsize
+        lookups = stats['hits'] + stats['misses']
+        stats['hit_ratio'] = stats['hits'] / lookups if lookups else 0.0
+        return stats
+
+    def __len__(self):
+        return len(self._data)
@@ -0,0 +1,164 @@
+"""
+ATM Thin Client
+
+RemoteEngine talks to an ATM server (atm/server.py) and offers the same
+methods as ATMEngine, so the GUI can run as a thin client without any
+database connection of its own.
+
+Author: ATM Project Team
+Date: 2025
+"""
+
+import itertools
+import json
+import socket
+import threading
+import uuid
+from atm import engine as engine_errors
+from atm.records import CustomerRecord
+
+
+class RemoteSession:
+    """Client-side view of a session held by the server."""
+
+    __slots__ = ('session_id', 'acc_no', 'customer', 'pin_change_allowed')
+
+    def __init__(self, session_id, customer):
+        self.session_id = session_id
+        self.acc_no = customer.acc_no
+        self.customer = customer
+        self.pin_change_allowed = False
+
+
+class RemoteEngine:
+    """
+    ATMEngine-compatible proxy that forwards every call to an ATM server.
+
+    One TCP connection is shared by all threads of the terminal; requests are
+    serialized on it and the connection is re-opened once if it drops.
+    """
+
+    def __init__(self, host, port, timeout=15.0):
+        """
+        Initialize the client. The connection is opened on first use.
+
+        Args:
+            host (str): Server address
+            port (int): Server port
+            timeout (float): Socket timeout in seconds
+        """
+        self.host = host
+        self.port = port
+        self.timeout = timeout
+        self._sock = None
+        self._file = None
+        self._lock = threading.Lock()
+        self._ids = itertools.count(1)
+
+    @classmethod
+    def from_address(cls, address, timeout=15.0):
+        """
+        Build a client from a "host:port" string.
+
+        Args:
+            address (str): Server address as host:port
+            timeout (float): Socket timeout in seconds
+
+        Returns:
+            RemoteEngine: The client
+        """
+        host, _, port = address.rpartition(':')
+        return cls(host or '127.0.0.1', int(port), timeout)
+
+    def _connect(self):
+        self._sock = socket.create_connection((self.host, self.port), timeout=self.timeout)
+        self._file = self._sock.makefile('rb')
+
+    def _disconnect(self):
+        for closable in (self._file, self._sock):
+            try:
+                if closable:
+                    closable.close()
+            except OSError:
+                pass
+        self._sock = self._file = None
+
+    def call(self, op, **params):
+        """
+        Send one request and wait for its response.
+
+        Args:
+            op (str): Operation name
+            **params: Request fields
+
+        Returns:
+            dict: The operation result
+
+        Raises:
+            EngineError: The server reported a failure (mapped to the matching subclass)
+        """
+        request = dict(params, op=op, id=next(self._ids))
+        payload = json.dumps(request).encode('utf-8') + b'\n'
+        with self._lock:
+            # Only requests that cannot have been applied yet are retried
+            for attempt in range(2):
+                try:
+                    if self._sock is None:
+                        self._connect()
+                    self._sock.sendall(payload)
+                    break
+                except OSError:
+                    self._disconnect()
+                    if attempt:
+                        raise engine_errors.TransactionFailedError("Cannot reach the bank. Please try again later.")
+            try:
+                line = self._file.readline()
+            except OSError:
+                line = b''
+            if not line:
+                self._disconnect()
+                raise engine_errors.TransactionFailedError("Lost connection to the bank. Please check your balance.")
+        response = json.loads(line)
+        if response.get('ok'):
+            return response.get('result', {})
+        error_class = getattr(engine_errors, response.get('error', ''), None)
+        if not (isinstance(error_class, type) and issubclass(error_class, engine_errors.EngineError)):
+            error_class = engine_errors.EngineError
+        raise error_class(response.get('message', "Transaction Failed. Please try again."))
+
+    def open_session(self, acc_no):
+        result = self.call('open_session', acc_no=acc_no)
+        customer = CustomerRecord(result['acc_no'], result['cname'], result['bank_name'], None, None)
+        return RemoteSession(result['session_id'], customer)
+
+    def close_session(self, session_id):
+        try:
+            self.call('close_session', session_id=session_id)
+        except engine_errors.EngineError:
+            pass
+
+    def withdraw(self, session, amount, pin, idempotency_key=None):
+        # Callers that may resend a withdrawal pass their own key so the resend is not debited again
+        return self.call('withdraw', session_id=session.session_id, amount=str(amount), pin=pin,
+                         idempotency_key=idempotency_key or uuid.uuid4().hex)['balance']
+
+    def request_otp(self, session):
+        self.call('request_otp', session_id=session.session_id)
+        session.pin_change_allowed = False
+
+    def verify_otp(self, session, otp):
+        self.call('verify_otp', session_id=session.session_id, otp=str(otp))
+        session.pin_change_allowed = True
+
+    def change_pin(self, session, new_pin):
+        self.call('change_pin', session_id=session.session_id, pin=new_pin)
+        session.pin_change_allowed = False
+
+    def mini_statement(self, session, limit=10):
+        rows = self.call('passbook', session_id=session.session_id, limit=limit)['transactions']
+        return [(row['amount'], row['stat'], row['time']) for row in rows]
+
+    def close(self):
+        """Close the connection to the server."""
+        with self._lock:
+            self._disconnect()
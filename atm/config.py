@@ -0,0 +1,146 @@
+"""
+ATM Configuration
+
+Central place for settings read from the environment (.env file). Every other
+module imports its configuration from here instead of calling os.getenv itself.
+
+Author: ATM Project Team
+Date: 2025
+"""
+
+import os
+from dotenv import load_dotenv
+
+# Load environment variables from .env file
+load_dotenv()
+
+# =============================================================================
+# DATABASE CONFIGURATION
+# =============================================================================
+
+# Database Configuration from environment variables
+DB_CONFIG = {
+    'host': os.getenv('DB_HOST', 'localhost'),
+    'user': os.getenv('DB_USER', 'root'),
+    'password': os.getenv('DB_PASSWORD', 'admin'),
+    'database': os.getenv('DB_NAME', 'atm')
+}
+
+# Storage Backend Configuration: 'mysql' uses DB_CONFIG above, 'sqlite' an
+# embedded database file (edge terminals and test runs without a MySQL server)
+BACKEND_CONFIG = {
+    'backend': os.getenv('DB_BACKEND', 'mysql'),
+    'path': os.getenv('DB_PATH', 'atm.db'),                                      # SQLite database file
+    'busy_timeout': float(os.getenv('DB_SQLITE_BUSY_TIMEOUT', '5')),             # Seconds to wait for the write lock
+    'synchronous': os.getenv('DB_SQLITE_SYNCHRONOUS', 'NORMAL'),                 # OFF / NORMAL / FULL
+    'cache_size_kb': int(os.getenv('DB_SQLITE_CACHE_KB', '65536'))               # Page cache per connection
+}
+
+# Connection Pool Configuration
+POOL_CONFIG = {
+    'size': int(os.getenv('DB_POOL_SIZE', '5')),                                      # Maximum open connections
+    'timeout': float(os.getenv('DB_POOL_TIMEOUT', '10')),                             # Seconds to wait for a free connection
+    'health_check_interval': float(os.getenv('DB_POOL_HEALTH_CHECK_INTERVAL', '30'))  # Ping connections idle longer than this
+}
+
+# Customer Record Cache Configuration (size 0 disables the cache)
+CACHE_CONFIG = {
+    'size': int(os.getenv('CUSTOMER_CACHE_SIZE', '10000')),  # Maximum cached customer records
+    'ttl': float(os.getenv('CUSTOMER_CACHE_TTL', '30'))       # Seconds a cached record stays valid
+}
+
+# Group Commit Configuration: batch ledger writes into one COMMIT per window
+# (on by default for SQLite, which allows only one writer at a time)
+WRITE_CONFIG = {
+    'enabled': (os.getenv('DB_GROUP_COMMIT') or ('1' if BACKEND_CONFIG['backend'] == 'sqlite' else '0')) == '1',
+    'max_batch': int(os.getenv('DB_GROUP_COMMIT_MAX_ROWS', '100')),             # Requests per commit
+    'max_delay': float(os.getenv('DB_GROUP_COMMIT_DELAY_MS', '5')) / 1000.0     # Longest wait for a batch to fill
+}
+
+# =============================================================================
+# APPLICATION CONFIGURATION
+# =============================================================================
+
+# PIN Hashing Configuration: scheme for new PINs (scrypt/pbkdf2/sha256) and its cost.
+# Legacy SHA-256 hashes still verify and are rehashed with this scheme at login.
+PIN_HASH_CONFIG = {
+    'scheme': os.getenv('PIN_HASH_SCHEME', 'scrypt'),
+    'scrypt_n': int(os.getenv('PIN_HASH_SCRYPT_N', '16384')),                   # Cost; memory is 128 * n * r bytes
+    'scrypt_r': int(os.getenv('PIN_HASH_SCRYPT_R', '8')),
+    'scrypt_p': int(os.getenv('PIN_HASH_SCRYPT_P', '1')),
+    'pbkdf2_iterations': int(os.getenv('PIN_HASH_PBKDF2_ITERATIONS', '600000')),
+    'workers': int(os.getenv('PIN_HASH_WORKERS', '2')),                         # Hashing processes (0 = in-thread)
+    'cache_size': int(os.getenv('PIN_VERIFY_CACHE_SIZE', '10000')),             # Remembered verifications (0 = off)
+    'cache_ttl': float(os.getenv('PIN_VERIFY_CACHE_TTL', '300'))                # Seconds a verification is remembered
+}
+
+# OTP Configuration: PIN-change codes with expiry, attempt limits and a per-account
+# token bucket (OTP_RATE_BURST codes at once, refilled at OTP_RATE_PER_HOUR)
+OTP_CONFIG = {
+    'ttl': float(os.getenv('OTP_TTL', '300')),                          # Seconds a code stays valid
+    'max_attempts': int(os.getenv('OTP_MAX_ATTEMPTS', '3')),            # Wrong codes before it is discarded
+    'digits': int(os.getenv('OTP_DIGITS', '6')),
+    'burst': int(os.getenv('OTP_RATE_BURST', '3')),                     # 0 disables rate limiting
+    'rate_per_hour': float(os.getenv('OTP_RATE_PER_HOUR', '6')),
+    'max_pending': int(os.getenv('OTP_MAX_PENDING', '100000')),         # Codes and rate buckets kept in memory
+    'store': os.getenv('OTP_STORE', 'memory'),                          # memory / database (shared by servers)
+    'delivery': os.getenv('OTP_DELIVERY', 'console'),                   # console / file / queue
+    'delivery_path': os.getenv('OTP_DELIVERY_PATH', 'otp_outbox.log'),  # Outbox of the file channel
+    'secret': os.getenv('OTP_SECRET', '')                               # HMAC key for stored codes (random if empty)
+}
+
+# Offline Journal Configuration: while the database is unreachable, accept withdrawals
+# up to JOURNAL_OFFLINE_LIMIT per account, journal them locally and replay them later
+JOURNAL_CONFIG = {
+    'enabled': os.getenv('JOURNAL_ENABLED', '0') == '1',
+    'directory': os.getenv('JOURNAL_DIR', 'journal'),
+    'segment_bytes': int(os.getenv('JOURNAL_SEGMENT_BYTES', str(4 * 1024 * 1024))),  # Seal segments at this size
+    'offline_limit': int(os.getenv('JOURNAL_OFFLINE_LIMIT', '10000')),                # Per-account offline total
+    'replay_interval': float(os.getenv('JOURNAL_REPLAY_INTERVAL', '5'))               # Seconds between replays
+}
+
+# Reporting Configuration: cache of ledger aggregates for SQL/Reports.py and the
+# thresholds of unusual-withdrawal detection
+REPORT_CONFIG = {
+    'cache_dir': os.getenv('REPORT_CACHE_DIR', 'Reports'),             # Empty = no cache, scan the ledger every run
+    'z_threshold': float(os.getenv('REPORT_Z_THRESHOLD', '4')),        # Std devs above the account's mean
+    'min_history': int(os.getenv('REPORT_MIN_HISTORY', '10')),         # Earlier withdrawals before scoring
+    'min_amount': int(os.getenv('REPORT_MIN_AMOUNT', '0')),            # Never flag smaller withdrawals
+    'settle_seconds': float(os.getenv('REPORT_SETTLE_SECONDS', '60'))  # Leave younger rows for the next refresh
+}
+
+# Ledger Archive Configuration: months of history moved out of the transactions table
+# into columnar files (python -m atm.archive run); readers merge them back transparently
+ARCHIVE_CONFIG = {
+    'directory': os.getenv('ARCHIVE_DIR', 'Archive/ledger'),   # Empty = no archive
+    'keep_months': int(os.getenv('ARCHIVE_KEEP_MONTHS', '12'))  # Months left in the table, current one included
+}
+
+# Account Index Configuration: preload all account numbers, or look them up on demand
+ACCOUNT_INDEX_PRELOAD = os.getenv('ACCOUNT_INDEX_PRELOAD', '1') == '1'
+
+# Background Worker Configuration: threads running DB operations off the Tk thread
+WORKER_CONFIG = {
+    'threads': int(os.getenv('DB_WORKER_THREADS', '4')),     # Worker threads
+    'timeout': float(os.getenv('DB_OPERATION_TIMEOUT', '15'))  # Seconds before a DB operation times out
+}
+
+# Metrics Configuration: counters/latency histograms, exposed over HTTP
+# (METRICS_PORT, 0 = off) and/or dumped to a JSON file every few seconds
+METRICS_CONFIG = {
+    'enabled': os.getenv('METRICS_ENABLED', '1') == '1',
+    'host': os.getenv('METRICS_HOST', '127.0.0.1'),
+    'port': int(os.getenv('METRICS_PORT', '0')),                       # /metrics, /metrics.json, /profile?seconds=N
+    'dump_path': os.getenv('METRICS_DUMP_PATH', ''),                   # Periodic JSON snapshot file (empty = off)
+    'dump_interval': float(os.getenv('METRICS_DUMP_INTERVAL', '60'))   # Seconds between JSON dumps
+}
+
+# Network Service Configuration: address the ATM server listens on, and the
+# server a thin-client terminal connects to (empty ATM_SERVER = use the database directly)
+SERVER_CONFIG = {
+    'host': os.getenv('ATM_SERVER_HOST', '127.0.0.1'),
+    'port': int(os.getenv('ATM_SERVER_PORT', '8765')),
+    'workers': int(os.getenv('ATM_SERVER_WORKERS', os.getenv('DB_POOL_SIZE', '5'))),  # Threads running engine calls
+    'remote': os.getenv('ATM_SERVER', ''),                                              # host:port for thin clients
+    'timeout': float(os.getenv('ATM_SERVER_TIMEOUT', '15'))                             # Client socket timeout in seconds
+}
@@ -0,0 +1,347 @@
+"""
+Credentials
+
+PIN hashing shared by the ATM engine and the SQL/ scripts.
+
+PINs are stored in an encoded form that names the hashing scheme and its
+parameters, e.g. ``$scrypt$n=16384,r=8,p=1$<salt>$<hash>``, so the cost can be
+raised later without breaking existing hashes. Bare 64-character hex strings
+are legacy unsalted SHA-256 hashes; they still verify, but are reported as
+needing a rehash so the engine can upgrade them at the customer's next login.
+
+Salted KDFs are slow by design. PinHasher can run them in a bounded process
+pool so engine threads are not held up by the CPU work, and it caches
+successful verifications (keyed by an HMAC, never the PIN itself) so repeated
+checks within one session cost a dictionary lookup.
+
+Author: ATM Project Team
+Date: 2025
+"""
+
+import base64
+import hashlib
+import hmac
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from atm.cache import TTLCache
+
+
+def hash_string(input_string):
+    """
+    Hash a password string using SHA-256 algorithm.
+
+    Args:
+        input_string (str): The input string to be hashed
+
+    Returns:
+        str: The first 128 characters of the hexadecimal hash digest
+
+    Note:
+        This is the legacy unsalted scheme. New PINs are hashed with
+        PinHasher.hash_pin; this function is kept to verify old hashes.
+    """
+    hasher = hashlib.sha256()
+    hasher.update(input_string.encode('utf-8'))
+    hashed_string = hasher.hexdigest()[:128]
+    return hashed_string
+
+
+def _b64encode(data):
+    return base64.b64encode(data).decode('ascii').rstrip('=')
+
+
+def _b64decode(text):
+    return base64.b64decode(text + '=' * (-len(text) % 4))
+
+
+# =============================================================================
+# HASHING SCHEMES
+# =============================================================================
+
+class Sha256Hasher:
+    """Legacy unsalted SHA-256 (bare hex digest, no scheme prefix)."""
+
+    scheme = 'sha256'
+
+    def hash(self, pin):
+        return hash_string(pin)
+
+    def verify(self, pin, encoded):
+        return hmac.compare_digest(hash_string(pin), encoded)
+
+    def identifies(self, encoded):
+        return len(encoded) == 64 and not encoded.startswith('$')
+
+    def params(self):
+        return {}
+
+
+class ScryptHasher:
+    """Salted, memory-hard scrypt."""
+
+    scheme = 'scrypt'
+
+    def __init__(self, n=16384, r=8, p=1, salt_size=16, key_size=32):
+        """
+        Args:
+            n (int): CPU/memory cost (power of two); memory used is about 128 * n * r bytes
+            r (int): Block size
+            p (int): Parallelisation factor
+            salt_size (int): Bytes of random salt per hash
+            key_size (int): Bytes of derived key stored
+        """
+        self.n = n
+        self.r = r
+        self.p = p
+        self.salt_size = salt_size
+        self.key_size = key_size
+
+    def _derive(self, pin, salt, n, r, p, key_size):
+        return hashlib.scrypt(pin.encode('utf-8'), salt=salt, n=n, r=r, p=p,
+                              maxmem=256 * n * r * p + 1024 * 1024, dklen=key_size)
+
+    def hash(self, pin):
+        salt = os.urandom(self.salt_size)
+        key = self._derive(pin, salt, self.n, self.r, self.p, self.key_size)
+        return f"$scrypt$n={self.n},r={self.r},p={self.p}${_b64encode(salt)}${_b64encode(key)}"
+
+    def verify(self, pin, encoded):
+        params, salt, key = _split(encoded)
+        key = _b64decode(key)
+        derived = self._derive(pin, _b64decode(salt), int(params['n']), int(params['r']),
+                               int(params['p']), len(key))
+        return hmac.compare_digest(derived, key)
+
+    def identifies(self, encoded):
+        return encoded.startswith('$scrypt$')
+
+    def params(self):
+        return {'n': str(self.n), 'r': str(self.r), 'p': str(self.p)}
+
+
+class Pbkdf2Hasher:
+    """Salted PBKDF2-HMAC-SHA256."""
+
+    scheme = 'pbkdf2-sha256'
+
+    def __init__(self, iterations=600000, salt_size=16, key_size=32):
+        """
+        Args:
+            iterations (int): PBKDF2 iteration count
+            salt_size (int): Bytes of random salt per hash
+            key_size (int): Bytes of derived key stored
+        """
+        self.iterations = iterations
+        self.salt_size = salt_size
+        self.key_size = key_size
+
+    def hash(self, pin):
+        salt = os.urandom(self.salt_size)
+        key = hashlib.pbkdf2_hmac('sha256', pin.encode('utf-8'), salt, self.iterations, self.key_size)
+        return f"$pbkdf2-sha256$i={self.iterations}${_b64encode(salt)}${_b64encode(key)}"
+
+    def verify(self, pin, encoded):
+        params, salt, key = _split(encoded)
+        key = _b64decode(key)
+        derived = hashlib.pbkdf2_hmac('sha256', pin.encode('utf-8'), _b64decode(salt),
+                                      int(params['i']), len(key))
+        return hmac.compare_digest(derived, key)
+
+    def identifies(self, encoded):
+        return encoded.startswith('$pbkdf2-sha256$')
+
+    def params(self):
+        return {'i': str(self.iterations)}
+
+
+def _split(encoded):
+    """
+    Split ``$scheme$k=v,...$salt$hash`` into (params dict, salt, hash).
+
+    Raises:
+        ValueError: If the hash is truncated or otherwise malformed
+    """
+    fields = encoded.split('$')
+    if len(fields) != 5 or fields[0] or not fields[3] or not fields[4]:
+        raise ValueError(f"Malformed PIN hash: expected 5 '$'-separated fields, got {len(fields)}")
+    items = [item.split('=', 1) for item in fields[2].split(',')]
+    if any(len(item) != 2 for item in items):
+        raise ValueError("Malformed PIN hash parameters")
+    return dict(items), fields[3], fields[4]
+
+
+HASHERS = {
+    'sha256': Sha256Hasher,
+    'scrypt': ScryptHasher,
+    'pbkdf2': Pbkdf2Hasher
+}
+
+
+def make_hasher(config):
+    """
+    Build the hasher described by a PIN_HASH_CONFIG-style dict.
+
+    Args:
+        config (dict): 'scheme' plus the scheme's parameters
+
+    Returns:
+        The hasher instance
+    """
+    scheme = config.get('scheme', 'scrypt')
+    if scheme == 'scrypt':
+        return ScryptHasher(config.get('scrypt_n', 16384), config.get('scrypt_r', 8), config.get('scrypt_p', 1))
+    if scheme == 'pbkdf2':
+        return Pbkdf2Hasher(config.get('pbkdf2_iterations', 600000))
+    if scheme == 'sha256':
+        return Sha256Hasher()
+    raise ValueError(f"Unknown PIN hash scheme: {scheme}")
+
+
+def _verify(hasher, pin, encoded):
+    """Process-pool entry point: verify one PIN with a picklable hasher."""
+    return hasher.verify(pin, encoded)
+
+
+def _hash(hasher, pin):
+    """Process-pool entry point: hash one PIN with a picklable hasher."""
+    return hasher.hash(pin)
+
+
+# =============================================================================
+# PIN HASHER
+# =============================================================================
+
+class PinHasher:
+    """
+    Hashes and verifies PINs with the configured scheme.
+
+    Stored hashes made with any known scheme verify; ``verify`` also reports
+    whether the stored hash should be replaced because it uses another scheme
+    or weaker parameters than the current hasher.
+    """
+
+    def __init__(self, hasher=None, workers=0, cache_size=10000, cache_ttl=300.0):
+        """
+        Initialize the PIN hasher.
+
+        Args:
+            hasher: Hasher used for new PINs (defaults to ScryptHasher())
+            workers (int): Processes used for hashing; 0 hashes in the calling thread
+            cache_size (int): Successful verifications remembered (0 disables the cache)
+            cache_ttl (float): Seconds a remembered verification stays valid
+        """
+        self.hasher = hasher or ScryptHasher()
+        self.workers = workers
+        self._hashers = [self.hasher] + [cls() for scheme, cls in HASHERS.items()
+                                         if cls.scheme != self.hasher.scheme]
+        self._executor = None
+        self._executor_lock = threading.Lock()
+        # Bound the jobs queued on the pool so a burst of logins cannot pile up unbounded work
+        self._slots = threading.BoundedSemaphore(max(1, workers) * 2)
+        self._cache = TTLCache(cache_size, cache_ttl) if cache_size > 0 else None
+        self._cache_key = os.urandom(32)
+
+    @classmethod
+    def from_config(cls, config):
+        """
+        Build a PinHasher from a PIN_HASH_CONFIG-style dict.
+
+        Args:
+            config (dict): Scheme, parameters, 'workers', 'cache_size' and 'cache_ttl'
+
+        Returns:
+            PinHasher: The configured hasher
+        """
+        return cls(make_hasher(config), config.get('workers', 0),
+                   config.get('cache_size', 10000), config.get('cache_ttl', 300.0))
+
+    def _run(self, function, *args):
+        """Run a hashing function in the process pool, or inline without one."""
+        if not self.workers:
+            return function(*args)
+        with self._executor_lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(max_workers=self.workers)
+        with self._slots:
+            return self._executor.submit(function, *args).result()
+
+    def _identify(self, encoded):
+        for hasher in self._hashers:
+            if hasher.identifies(encoded):
+                return hasher
+        return None
+
+    def hash_pin(self, pin):
+        """
+        Hash a PIN with the current scheme.
+
+        Args:
+            pin (str): PIN to hash
+
+        Returns:
+            str: Encoded hash for the customers table
+        """
+        return self._run(_hash, self.hasher, pin)
+
+    def needs_rehash(self, encoded):
+        """
+        Check whether a stored hash uses another scheme or other parameters.
+
+        Args:
+            encoded (str): Stored hash
+
+        Returns:
+            bool: True if the hash should be replaced with ``hash_pin``
+        """
+        hasher = self._identify(encoded)
+        if hasher is not self.hasher:
+            return True
+        return hasher.scheme != 'sha256' and _split(encoded)[0] != hasher.params()
+
+    def verify(self, pin, encoded):
+        """
+        Check a PIN against a stored hash.
+
+        Args:
+            pin (str): PIN as entered
+            encoded (str): Stored hash
+
+        Returns:
+            tuple: (matches, needs_rehash)
+        """
+        hasher = self._identify(encoded or '')
+        if hasher is None:
+            return False, False
+        key = None
+        if self._cache is not None:
+            key = hmac.new(self._cache_key, f"{encoded}\0{pin}".encode('utf-8'), hashlib.sha256).digest()
+            if self._cache.get(key):
+                return True, self.needs_rehash(encoded)
+        try:
+            matches = self._run(_verify, hasher, pin, encoded)
+        except (ValueError, KeyError) as e:
+            # A damaged stored hash must not take the caller down; it simply never matches
+            print(f"Warning: unreadable {hasher.scheme} PIN hash treated as a mismatch: {e!r}")
+            return False, False
+        if not matches:
+            return False, False
+        if key is not None:
+            self._cache.put(key, True)
+        return True, self.needs_rehash(encoded)
+
+    def cache_stats(self):
+        """
+        Return verification cache statistics.
+
+        Returns:
+            dict: TTLCache statistics, or an empty dict if the cache is disabled
+        """
+        return self._cache.stats() if self._cache is not None else {}
+
+    def close(self):
+        """Shut down the hashing processes."""
+        with self._executor_lock:
+            if self._executor is not None:
+                self._executor.shutdown()
+                self._executor = None
@@ -0,0 +1,698 @@
+"""
+Database Access
+
+This module contains the DatabaseManager used by the ATM GUI and the SQL/
+maintenance scripts. All queries run on connections checked out from a
+bounded ConnectionPool, so several terminals or threads sharing one process
+can run queries concurrently without sharing a cursor. Connections come from
+the storage backend selected in .env (MySQL or embedded SQLite, see
+atm.backends).
+
+Author: ATM Project Team
+Date: 2025
+"""
+
+import threading
+import weakref
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from operator import itemgetter
+from atm.archive import LedgerArchive, merge_chunks
+from atm.backends import make_backend
+from atm.cache import TTLCache
+from atm.config import ARCHIVE_CONFIG, POOL_CONFIG, CACHE_CONFIG, WRITE_CONFIG, WORKER_CONFIG
+from atm.metrics import METRICS, timed
+from atm.ledger import (INSERT_TRANSACTION, SELECT_BALANCE, UPDATE_PIN, DatabaseUnavailableError,
+                        IdempotencyConflictError, InsufficientFundsError, UnknownAccountError, apply_balance_change,
+                        apply_idempotent_change)
+from atm.pool import ConnectionPool
+from atm.records import CustomerRecord
+from atm.write_pipeline import GroupCommitWriter
+
+# Point queries run as server-side prepared statements
+SELECT_CUSTOMER = f"SELECT {CustomerRecord.COLUMNS} FROM customers WHERE acc_no = %s"
+SELECT_ACCOUNT_EXISTS = "SELECT 1 FROM customers WHERE acc_no = %s LIMIT 1"
+SELECT_RECENT_TRANSACTIONS = "SELECT amount, stat, time FROM transactions WHERE acc_no = %s ORDER BY time DESC, id DESC LIMIT %s"
+SELECT_ACCOUNT_PAGE = "SELECT acc_no FROM customers WHERE acc_no > %s ORDER BY acc_no LIMIT %s"
+SELECT_LEDGER_PAGE = "SELECT id, acc_no, amount, stat, time FROM transactions WHERE id > %s ORDER BY id LIMIT %s"
+
+
+def report_error(operation, message, error):
+    """Print a database error and count it in the atm_errors_total metric."""
+    METRICS.inc('atm_errors_total', operation)
+    print(f"{message}: {error}")
+
+
+class DatabaseManager:
+    """
+    Manages database connections and operations for the ATM system.
+
+    This class encapsulates all database-related functionality including
+    connection pooling, customer data retrieval, and transaction logging.
+    """
+
+    def __init__(self, config, pool_config=None, cache_config=None, write_config=None, backend=None,
+                 archive_config=None):
+        """
+        Initialize the database manager with provided configuration.
+
+        Args:
+            config (dict): Database configuration containing host, user, password, database
+            pool_config (dict): Pool settings (size, timeout, health_check_interval)
+            cache_config (dict): Customer cache settings (size, ttl); size 0 disables caching
+            write_config (dict): Group commit settings (enabled, max_batch, max_delay)
+            backend (MySQLBackend | SQLiteBackend): Storage backend; defaults to the one
+                selected by DB_BACKEND, with ``config`` as the MySQL settings
+            archive_config (dict): Ledger archive settings (directory); an empty
+                directory disables the archive
+        """
+        self.config = config
+        self.backend = backend or make_backend(db_config=config)
+        self.pool_config = dict(POOL_CONFIG if pool_config is None else pool_config)
+        cache_config = CACHE_CONFIG if cache_config is None else cache_config
+        self.customer_cache = None
+        if cache_config['size'] > 0:
+            self.customer_cache = TTLCache(cache_config['size'], cache_config['ttl'])
+        self.write_config = dict(WRITE_CONFIG if write_config is None else write_config)
+        self.archive = LedgerArchive.from_config(ARCHIVE_CONFIG if archive_config is None else archive_config)
+        self.pool = None
+        self.writer = None
+        self.write_timeout = None
+        self._prepared = weakref.WeakKeyDictionary()
+        self._prepared_lock = threading.Lock()
+        self.connect()
+
+    def connect(self):
+        """
+        Create the connection pool.
+
+        Connections are opened lazily on first checkout, then reused. A pooled
+        connection idle for longer than the health check interval is pinged
+        before being handed out and transparently replaced if it is dead.
+        """
+        self.pool = ConnectionPool(
+            self._new_connection,
+            size=self.pool_config['size'],
+            timeout=self.pool_config['timeout'],
+            health_check=lambda conn: conn.is_connected(),
+            health_check_interval=self.pool_config['health_check_interval']
+        )
+        if self.write_config['enabled']:
+            self.writer = GroupCommitWriter(self.pool, self.write_config['max_batch'], self.write_config['max_delay'],
+                                            self.backend.integrity_errors)
+            # Longest a caller waits for its batch: the batch window, a connection checkout and the commit itself
+            self.write_timeout = (self.write_config['max_delay'] + self.pool_config['timeout']
+                                  + WORKER_CONFIG['timeout'])
+        METRICS.add_collector('atm_db_pool', self.pool_stats)
+        METRICS.add_collector('atm_customer_cache', self.cache_stats)
+        METRICS.add_collector('atm_group_commit', self.write_stats)
+
+    def _new_connection(self):
+        """Open a new backend connection for the pool."""
+        try:
+            return self.backend.connect()
+        except Exception as e:
+            report_error('connect', "Database connection error", e)
+            raise
+
+    def _prepared_cursor(self, conn, query):
+        """
+        Return a prepared-statement cursor for a query on a given connection.
+
+        The statement is prepared once per pooled connection and reused for
+        every later execution, so repeated point lookups skip parsing entirely.
+        Cursors are dropped together with their connection.
+
+        Args:
+            conn (Connection): Pooled connection
+            query (str): Parameterized SQL statement
+
+        Returns:
+            Cursor: A prepared cursor bound to the statement
+        """
+        with self._prepared_lock:
+            cursors = self._prepared.get(conn)
+            if cursors is None:
+                cursors = self._prepared[conn] = {}
+        cursor = cursors.get(query)
+        if cursor is None:
+            cursor = conn.cursor(prepared=True)
+            cursors[query] = cursor
+        return cursor
+
+    def _fetch_one(self, query, params):
+        """
+        Execute a prepared point query and return its single row.
+
+        Args:
+            query (str): Parameterized SQL statement
+            params (tuple): Statement parameters
+
+        Returns:
+            tuple: The first row, or None if nothing matched
+        """
+        def operation(conn):
+            cursor = self._prepared_cursor(conn, query)
+            cursor.execute(query, params)
+            rows = cursor.fetchall()
+            return rows[0] if rows else None
+
+        return self._run(operation)
+
+    def _run(self, operation, retry=True):
+        """
+        Run an operation on a pooled connection, reconnecting once on failure.
+
+        Writes pass ``retry=False``: a connection lost during COMMIT leaves the
+        outcome unknown, and replaying the write could apply it twice.
+
+        Args:
+            operation (callable): Callable taking a connection and returning a result
+            retry (bool): Retry once on a fresh connection if the connection broke
+
+        Returns:
+            The result of the operation
+        """
+        METRICS.inc('atm_db_queries_total')
+        try:
+            with self.pool.connection() as conn:
+                return operation(conn)
+        except self.backend.retryable_errors:
+            if not retry:
+                raise
+            self.pool.discard_idle()
+            with self.pool.connection() as conn:
+                return operation(conn)
+
+    def get_customer_list(self):
+        """
+        Retrieve list of all customer account numbers.
+
+        Returns:
+            list: List of customer account numbers
+        """
+        customers = []
+        for batch in self.iter_account_numbers():
+            customers.extend(batch)
+        return customers
+
+    def iter_account_numbers(self, batch_size=50000):
+        """
+        Stream customer account numbers in batches, in account number order.
+
+        Only the acc_no column is selected. Pages are read by keyset pagination
+        on the primary key, each with its own short query, so no cursor is held
+        open while the caller works through a batch and the full customer table
+        is never materialised at once.
+
+        Args:
+            batch_size (int): Number of account numbers per batch
+
+        Yields:
+            list: A batch of customer account numbers
+
+        Raises:
+            Exception: The driver error if a page cannot be read, so a failure
+                never looks like the end of the list
+        """
+        def operation(conn, last_acc_no):
+            cursor = conn.cursor()
+            try:
+                cursor.execute(SELECT_ACCOUNT_PAGE, (last_acc_no, batch_size))
+                return cursor.fetchall()
+            finally:
+                cursor.close()
+
+        last_acc_no = ''
+        while True:
+            rows = self._run(lambda conn: operation(conn, last_acc_no))
+            if not rows:
+                return
+            METRICS.inc('atm_db_rows_total', 'iter_account_numbers', len(rows))
+            yield [row[0] for row in rows]
+            if len(rows) < batch_size:
+                return
+            last_acc_no = rows[-1][0]
+
+    def get_bank_names(self):
+        """
+        Map every account number to its bank.
+
+        Returns:
+            dict: acc_no -> bank_name
+        """
+        def operation(conn):
+            cursor = conn.cursor()
+            try:
+                cursor.execute("SELECT acc_no, bank_name FROM customers;")
+                rows = cursor.fetchall()
+                METRICS.inc('atm_db_rows_total', 'get_bank_names', len(rows))
+                return dict(rows)
+            finally:
+                cursor.close()
+
+        try:
+            return self._run(operation)
+        except Exception as e:
+            report_error('get_bank_names', "Error loading bank names", e)
+            return {}
+
+    def iter_ledger(self, after_id=0, chunk_size=50000):
+        """
+        Stream the whole ledger in id order, for reports across all accounts.
+
+        Pages are read by id range (keyset pagination on the indexed id), each
+        with its own short query, so no connection or snapshot is held between
+        chunks and a scan can resume from the last id it saw. Archived entries
+        come first, month by month, followed by the table's.
+
+        Args:
+            after_id (int): Only entries with a larger id
+            chunk_size (int): Rows per page
+
+        Yields:
+            list: A chunk of (id, acc_no, amount, stat, time) tuples
+        """
+        def operation(conn, last_id):
+            cursor = conn.cursor()
+            try:
+                cursor.execute(SELECT_LEDGER_PAGE, (last_id, chunk_size))
+                return cursor.fetchall()
+            finally:
+                cursor.close()
+
+        if self.archive is not None:
+            yield from self.archive.iter_ledger(after_id, chunk_size)
+        last_id = after_id
+        while True:
+            rows = self._run(lambda conn: operation(conn, last_id))
+            if not rows:
+                return
+            METRICS.inc('atm_db_rows_total', 'iter_ledger', len(rows))
+            page = rows if self.archive is None else self.archive.drop_archived(rows)
+            if page:
+                yield page
+            if len(rows) < chunk_size:
+                return
+            last_id = rows[-1][0]
+
+    @timed('atm_db_operation_seconds')
+    def account_exists(self, acc_no):
+        """
+        Check whether an account number exists using a primary-key lookup.
+
+        Args:
+            acc_no (str): Customer account number
+
+        Returns:
+            bool: True if the account exists
+        """
+        try:
+            return self._fetch_one(SELECT_ACCOUNT_EXISTS, (acc_no,)) is not None
+        except Exception as e:
+            report_error('account_exists', "Error checking account", e)
+            return False
+
+    @timed('atm_db_operation_seconds')
+    def get_customer_details(self, acc_no, refresh=False):
+        """
+        Retrieve customer details by account number.
+
+        Records are served from the customer cache when present. Unknown
+        accounts are never cached. The cache belongs to this process, so a
+        write made by another process is only seen once the entry expires;
+        pass ``refresh=True`` to read the row regardless (e.g. after a PIN
+        mismatch).
+
+        Args:
+            acc_no (str): Customer account number
+            refresh (bool): Skip the cached record and reload it from the database
+
+        Returns:
+            CustomerRecord: The customer record, or None if the account does not exist
+        """
+        cache = self.customer_cache
+        if cache is not None:
+            if not refresh:
+                record = cache.get(acc_no)
+                if record is not None:
+                    return record
+            generation = cache.generation(acc_no)
+        try:
+            row = self._fetch_one(SELECT_CUSTOMER, (acc_no,))
+        except Exception as e:
+            report_error('get_customer_details', "Error getting customer details", e)
+            return None
+        if not row:
+            return None
+        record = CustomerRecord.from_row(row)
+        if cache is not None:
+            cache.put(acc_no, record, generation)
+        return record
+
+    def invalidate_customer(self, acc_no):
+        """
+        Drop a customer record from the cache.
+
+        Every write to a customer row calls this both before and after the
+        write, so a record read concurrently with the write cannot stay cached.
+
+        Args:
+            acc_no (str): Customer account number
+        """
+        if self.customer_cache is not None:
+            self.customer_cache.invalidate(acc_no)
+
+    def cache_stats(self):
+        """
+        Return customer cache statistics.
+
+        Returns:
+            dict: Hit/miss/eviction counters, or an empty dict if caching is disabled
+        """
+        return self.customer_cache.stats() if self.customer_cache is not None else {}
+
+    @timed('atm_db_operation_seconds')
+    def record_transaction(self, acc_no, amount, transaction_type, idempotency_key=None):
+        """
+        Record a transaction in the ledger and apply it to the running balance.
+
+        The balance update and the ledger insert commit together. Debits are a
+        single conditional UPDATE, which locks the customer row for the rest of
+        the transaction, so the sufficient-funds check is O(1) and concurrent
+        debits on the same account are serialized without lost updates. With
+        group commit enabled the write joins the next batch and this call
+        returns once the batch is durable.
+
+        With an idempotency key, the transaction is applied at most once: a
+        retry with the same key returns the balance of the original request.
+
+        Args:
+            acc_no (str): Customer account number
+            amount (int): Transaction amount
+            transaction_type (str): Type of transaction (DEBIT/CREDIT)
+            idempotency_key (str): Client key identifying this request across retries
+
+        Returns:
+            int: The new balance, or None if the transaction failed for another reason
+
+        Raises:
+            InsufficientFundsError: If a debit exceeds the balance
+            UnknownAccountError: If the account does not exist
+            IdempotencyConflictError: If the key was used for a different transaction
+            DatabaseUnavailableError: If the database could not be reached or the group commit
+                did not answer within write_timeout
+        """
+        amount = int(amount)
+
+        def operation(conn):
+            cursor = conn.cursor()
+            try:
+                if idempotency_key is not None:
+                    balance, replayed = apply_idempotent_change(cursor, idempotency_key, acc_no, amount,
+                                                                transaction_type, self.backend.integrity_errors)
+                    if replayed:
+                        METRICS.inc('atm_idempotent_replays_total')
+                        conn.rollback()
+                        return balance
+                else:
+                    balance = apply_balance_change(cursor, acc_no, amount, transaction_type)
+                cursor.execute(INSERT_TRANSACTION, (acc_no, amount, transaction_type))
+                with METRICS.timer('atm_db_commit_seconds', 'record_transaction'):
+                    conn.commit()
+                return balance
+            finally:
+                cursor.close()
+
+        self.invalidate_customer(acc_no)
+        try:
+            if self.writer is not None:
+                future = self.writer.submit_transaction(acc_no, amount, transaction_type, idempotency_key)
+                return future.result(self.write_timeout)
+            # A keyed write can be retried safely: a replay returns the first result
+            return self._run(operation, retry=idempotency_key is not None)
+        except (InsufficientFundsError, UnknownAccountError, IdempotencyConflictError):
+            raise
+        except self.backend.retryable_errors as e:
+            report_error('record_transaction', "Database unavailable while recording transaction", e)
+            raise DatabaseUnavailableError(str(e)) from e
+        except FutureTimeoutError as e:
+            # The batch may still commit later; a keyed retry or journal replay will not apply it twice
+            error = DatabaseUnavailableError(f"no group commit within {self.write_timeout:g}s")
+            report_error('record_transaction', "Database unavailable while recording transaction", error)
+            raise error from e
+        except Exception as e:
+            report_error('record_transaction', "Error recording transaction", e)
+            return None
+        finally:
+            self.invalidate_customer(acc_no)
+
+    @timed('atm_db_operation_seconds')
+    def replay_transactions(self, entries, chunk_size=500):
+        """
+        Apply keyed transactions in bulk, e.g. the entries of the offline journal.
+
+        Each chunk is applied in one database transaction. Keys already applied
+        are reported as replayed and left alone, so the same entries can be
+        replayed any number of times. Stops at the first chunk that fails.
+
+        Args:
+            entries (list): (idempotency_key, acc_no, amount, transaction_type) tuples
+            chunk_size (int): Entries per database transaction
+
+        Returns:
+            list: (idempotency_key, 'applied' | 'replayed' | 'rejected') for every entry handled
+        """
+        def operation(conn, chunk):
+            cursor = conn.cursor()
+            outcomes = []
+            ledger_rows = []
+            try:
+                for key, acc_no, amount, transaction_type in chunk:
+                    try:
+                        _, replayed = apply_idempotent_change(cursor, key, acc_no, int(amount), transaction_type,
+                                                              self.backend.integrity_errors)
+                    except (InsufficientFundsError, UnknownAccountError, IdempotencyConflictError):
+                        outcomes.append((key, 'rejected'))
+                        continue
+                    if replayed:
+                        outcomes.append((key, 'replayed'))
+                        continue
+                    ledger_rows.append((acc_no, int(amount), transaction_type))
+                    outcomes.append((key, 'applied'))
+                if ledger_rows:
+                    cursor.executemany(INSERT_TRANSACTION, ledger_rows)
+                with METRICS.timer('atm_db_commit_seconds', 'replay_transactions'):
+                    conn.commit()
+                return outcomes
+            finally:
+                cursor.close()
+
+        results = []
+        for start in range(0, len(entries), chunk_size):
+            chunk = entries[start:start + chunk_size]
+            try:
+                results.extend(self._run(lambda conn: operation(conn, chunk)))
+            except Exception as e:
+                report_error('replay_transactions', "Error replaying transactions", e)
+                break
+            for _, acc_no, _, _ in chunk:
+                self.invalidate_customer(acc_no)
+        return results
+
+    @timed('atm_db_operation_seconds')
+    def get_balance(self, acc_no):
+        """
+        Read the current balance of an account.
+
+        Args:
+            acc_no (str): Customer account number
+
+        Returns:
+            int: The balance, or None if the account does not exist
+        """
+        try:
+            row = self._fetch_one(SELECT_BALANCE, (acc_no,))
+            return row[0] if row else None
+        except Exception as e:
+            report_error('get_balance', "Error getting balance", e)
+            return None
+
+    def iter_transactions(self, acc_no, start=None, end=None, chunk_size=1000):
+        """
+        Stream an account's ledger entries in chronological order.
+
+        Rows are read through an unbuffered (server-side) cursor and yielded
+        chunk by chunk, so memory use does not grow with the history length.
+        The pooled connection is held until the generator is exhausted or closed.
+        Entries before the archive cutoff are read from the ledger archive.
+
+        Args:
+            acc_no (str): Customer account number
+            start (datetime): Only entries at or after this time
+            end (datetime): Only entries before this time
+            chunk_size (int): Rows fetched per round trip
+
+        Yields:
+            list: A chunk of (amount, stat, time) tuples
+        """
+        cutoff = self.archive.cutoff if self.archive is not None else None
+        if cutoff is None or (start is not None and start >= cutoff):
+            yield from self._iter_table_transactions(acc_no, start, end, chunk_size)
+            return
+
+        archive_end = cutoff if end is None else min(end, cutoff)
+        archived = self.archive.iter_transactions(acc_no, start, archive_end, chunk_size)
+        late = self._late_transactions(acc_no, start, archive_end)
+        yield from merge_chunks(archived, late, chunk_size) if late else archived
+        if end is None or end > cutoff:
+            yield from self._iter_table_transactions(acc_no, cutoff if start is None else max(start, cutoff), end,
+                                                     chunk_size)
+
+    def _iter_table_transactions(self, acc_no, start, end, chunk_size):
+        """Stream an account's entries from the transactions table only (see iter_transactions)."""
+        query = "SELECT amount, stat, time FROM transactions WHERE acc_no = %s"
+        params = [acc_no]
+        if start is not None:
+            query += " AND time >= %s"
+            params.append(start)
+        if end is not None:
+            query += " AND time < %s"
+            params.append(end)
+        query += " ORDER BY time, id"
+
+        with self.pool.connection() as conn:
+            cursor = conn.cursor(buffered=False)
+            try:
+                METRICS.inc('atm_db_queries_total')
+                cursor.execute(query, tuple(params))
+                while True:
+                    rows = cursor.fetchmany(chunk_size)
+                    if not rows:
+                        break
+                    METRICS.inc('atm_db_rows_total', 'iter_transactions', len(rows))
+                    yield rows
+            finally:
+                # Drain unread rows so the connection can be reused
+                try:
+                    cursor.fetchall()
+                except Exception:
+                    pass
+                cursor.close()
+
+    def _late_transactions(self, acc_no, start, end):
+        """Read table rows older than the archive cutoff that are not archived yet (usually none)."""
+        query = "SELECT id, amount, stat, time FROM transactions WHERE acc_no = %s AND time < %s"
+        params = [acc_no, end]
+        if start is not None:
+            query += " AND time >= %s"
+            params.append(start)
+        def operation(conn):
+            cursor = conn.cursor()
+            try:
+                cursor.execute(query + " ORDER BY time, id", tuple(params))
+                return cursor.fetchall()
+            finally:
+                cursor.close()
+
+        rows = self._run(operation)
+        return [row[1:] for row in self.archive.drop_archived(rows)]
+
+    @timed('atm_db_operation_seconds')
+    def get_recent_transactions(self, acc_no, limit=10):
+        """
+        Read the most recent ledger entries of an account, newest first.
+
+        Args:
+            acc_no (str): Customer account number
+            limit (int): Maximum number of entries
+
+        Returns:
+            list: (amount, stat, time) tuples
+        """
+        def operation(conn):
+            cursor = conn.cursor()
+            try:
+                cursor.execute(SELECT_RECENT_TRANSACTIONS, (acc_no, int(limit)))
+                rows = cursor.fetchall()
+                METRICS.inc('atm_db_rows_total', 'get_recent_transactions', len(rows))
+                return rows
+            finally:
+                cursor.close()
+
+        try:
+            rows = self._run(operation)
+            cutoff = self.archive.cutoff if self.archive is not None else None
+            if cutoff is not None and (len(rows) < limit or rows[-1][2] < cutoff):
+                # Fill up with archived entries and table rows not archived yet
+                rows = [row for row in rows if row[2] >= cutoff]
+                older = self.archive.recent(acc_no, limit - len(rows)) + self._late_transactions(acc_no, None, cutoff)
+                older.sort(key=itemgetter(2), reverse=True)
+                rows += older[:limit - len(rows)]
+            return rows
+        except Exception as e:
+            report_error('get_recent_transactions', "Error getting transactions", e)
+            return []
+
+    @timed('atm_db_operation_seconds')
+    def update_customer_pin(self, acc_no, new_pin):
+        """
+        Update customer PIN in the database.
+
+        Args:
+            acc_no (str): Customer account number
+            new_pin (str): New hashed PIN
+
+        Returns:
+            bool: True if the PIN was updated
+        """
+        def operation(conn):
+            cursor = conn.cursor()
+            try:
+                cursor.execute(UPDATE_PIN, (new_pin, acc_no))
+                with METRICS.timer('atm_db_commit_seconds', 'update_customer_pin'):
+                    conn.commit()
+            finally:
+                cursor.close()
+
+        self.invalidate_customer(acc_no)
+        try:
+            if self.writer is not None:
+                return self.writer.submit_pin_update(acc_no, new_pin).result(self.write_timeout)
+            self._run(operation, retry=False)
+            return True
+        except FutureTimeoutError:
+            report_error('update_customer_pin', "Error updating PIN",
+                         f"no group commit within {self.write_timeout:g}s")
+            return False
+        except Exception as e:
+            report_error('update_customer_pin', "Error updating PIN", e)
+            return False
+        finally:
+            self.invalidate_customer(acc_no)
+
+    def pool_stats(self):
+        """
+        Return connection pool statistics.
+
+        Returns:
+            dict: In-use/idle counts, checkout wait times, timeouts and reconnects
+        """
+        return self.pool.stats()
+
+    def write_stats(self):
+        """
+        Return group commit statistics.
+
+        Returns:
+            dict: Batch size and commit latency metrics, or an empty dict if disabled
+        """
+        return self.writer.stats() if self.writer is not None else {}
+
+    def close(self):
+        """Flush pending group commits and close database connections."""
+        for name in ('atm_db_pool', 'atm_customer_cache', 'atm_group_commit'):
+            METRICS.remove_collector(name)
+        if self.writer:
+            self.writer.close()
+        if self.pool:
+            self.pool.close()
@@ -0,0 +1,416 @@
+"""
+ATM Transaction Engine
+
+Headless implementation of the ATM business logic: account validation, PIN
+verification, withdrawals, OTP verification and PIN changes. The GUI in
+window.py is a thin wrapper around this engine, and benchmarks or servers can
+drive it directly.
+
+All per-customer state lives in Session objects, so one engine (and one
+process) can serve many concurrent sessions. Engine methods are thread-safe;
+a single session should only be driven by one caller at a time.
+
+Failures are raised as EngineError subclasses whose message is meant to be
+shown to the customer.
+
+Author: ATM Project Team
+Date: 2025
+"""
+
+import threading
+import time
+import uuid
+from atm.credentials import PinHasher
+from atm.ledger import DatabaseUnavailableError, IdempotencyConflictError, InsufficientFundsError, UnknownAccountError
+from atm.metrics import METRICS, timed
+from atm.otp import (OTPDeliveryError, OTPExhaustedError, OTPMismatchError, OTPMissingError, OTPRateLimitedError,
+                     OTPService)
+
+# =============================================================================
+# ERRORS
+# =============================================================================
+
+class EngineError(Exception):
+    """Base class for errors reported to the customer."""
+
+
+class InvalidAccountError(EngineError):
+    """The account number does not exist."""
+
+    def __init__(self, message="Invalid Account Number."):
+        super().__init__(message)
+
+
+class InvalidAmountError(EngineError):
+    """The withdrawal amount is not a positive whole number."""
+
+    def __init__(self, message="Invalid Amount. Please enter a positive number."):
+        super().__init__(message)
+
+
+class InvalidPinError(EngineError):
+    """The PIN does not match."""
+
+    def __init__(self, message="Invalid PIN."):
+        super().__init__(message)
+
+
+class InvalidOTPError(EngineError):
+    """The OTP does not match, or no OTP was requested."""
+
+    def __init__(self, message="Invalid OTP. Please try again."):
+        super().__init__(message)
+
+
+class TooManyOTPRequestsError(EngineError):
+    """The account has requested too many OTPs recently."""
+
+    def __init__(self, message="Too many OTP requests. Please try again later."):
+        super().__init__(message)
+
+
+class InsufficientBalanceError(EngineError):
+    """The withdrawal exceeds the account balance."""
+
+    def __init__(self, message="Insufficient Balance."):
+        super().__init__(message)
+
+
+class TransactionFailedError(EngineError):
+    """The database could not record the operation."""
+
+    def __init__(self, message="Transaction Failed. Please try again."):
+        super().__init__(message)
+
+
+class SessionNotFoundError(EngineError):
+    """The session id is unknown or the session has expired."""
+
+    def __init__(self, message="Session expired. Please start again."):
+        super().__init__(message)
+
+# =============================================================================
+# SESSION STATE
+# =============================================================================
+
+class Session:
+    """State of one customer interaction with the ATM."""
+
+    __slots__ = ('session_id', 'acc_no', 'customer', 'otp_pending', 'pin_change_allowed', 'last_active')
+
+    def __init__(self, customer):
+        """
+        Initialize a session for a validated customer.
+
+        Args:
+            customer (CustomerRecord): The customer the session belongs to
+        """
+        self.session_id = uuid.uuid4().hex
+        self.acc_no = customer.acc_no
+        self.customer = customer
+        self.otp_pending = False        # An OTP was issued and not yet verified
+        self.pin_change_allowed = False  # Set once the OTP has been verified
+        self.last_active = time.monotonic()
+
+# =============================================================================
+# ENGINE
+# =============================================================================
+
+def parse_amount(amount):
+    """
+    Validate a withdrawal amount.
+
+    Args:
+        amount (str | int): Amount as entered
+
+    Returns:
+        int: The amount as a positive integer
+
+    Raises:
+        InvalidAmountError: If the amount is not a positive whole number
+    """
+    amount = str(amount).strip()
+    if not amount.isdigit() or int(amount) <= 0:
+        raise InvalidAmountError()
+    return int(amount)
+
+
+class ATMEngine:
+    """
+    Session-based ATM transaction engine.
+    """
+
+    def __init__(self, db_manager, account_index=None, otp_service=None, session_ttl=300.0,
+                 pin_hasher=None, journal=None):
+        """
+        Initialize the engine.
+
+        Args:
+            db_manager (DatabaseManager): Database access layer
+            account_index (AccountIndex): Optional index used to reject unknown accounts cheaply
+            otp_service (OTPService): Issues and checks PIN-change OTPs (defaults to in-memory, console delivery)
+            session_ttl (float): Seconds of inactivity after which a session expires
+            pin_hasher (PinHasher): PIN hashing and verification (defaults to in-thread scrypt)
+            journal (Journal): Offline journal; if set, debits are accepted while the database is down
+        """
+        self.db_manager = db_manager
+        self.account_index = account_index
+        self.otp_service = otp_service or OTPService()
+        self.session_ttl = session_ttl
+        self.pin_hasher = pin_hasher or PinHasher()
+        self.journal = journal
+        self._sessions = {}
+        self._lock = threading.Lock()
+        self._next_sweep = time.monotonic() + session_ttl
+
+    # -------------------------------------------------------------------------
+    # Session management
+    # -------------------------------------------------------------------------
+
+    @timed('atm_engine_operation_seconds', errors='atm_engine_errors_total')
+    def open_session(self, acc_no):
+        """
+        Validate an account number and start a session for it.
+
+        Args:
+            acc_no (str): Customer account number
+
+        Returns:
+            Session: The new session
+
+        Raises:
+            InvalidAccountError: If the account does not exist
+        """
+        acc_no = str(acc_no).strip()
+        if not acc_no or (self.account_index is not None and acc_no not in self.account_index):
+            raise InvalidAccountError()
+        customer = self.db_manager.get_customer_details(acc_no)
+        if customer is None:
+            if self.account_index is not None:
+                self.account_index.discard(acc_no)
+            raise InvalidAccountError()
+        session = Session(customer)
+        with self._lock:
+            self._sessions[session.session_id] = session
+        if session.last_active >= self._next_sweep:
+            self._next_sweep = session.last_active + self.session_ttl / 10
+            self.expire_sessions()
+        return session
+
+    def get_session(self, session_id):
+        """
+        Look up an active session by id.
+
+        Args:
+            session_id (str): Session id
+
+        Returns:
+            Session: The session
+
+        Raises:
+            SessionNotFoundError: If the session is unknown or expired
+        """
+        with self._lock:
+            session = self._sessions.get(session_id)
+        if session is None or time.monotonic() - session.last_active > self.session_ttl:
+            self.close_session(session_id)
+            raise SessionNotFoundError()
+        session.last_active = time.monotonic()
+        return session
+
+    def close_session(self, session_id):
+        """
+        End a session.
+
+        Args:
+            session_id (str): Session id
+        """
+        with self._lock:
+            session = self._sessions.pop(session_id, None)
+        if session is not None and session.otp_pending:
+            self.otp_service.discard(session_id)
+
+    def expire_sessions(self):
+        """
+        Drop sessions idle for longer than the session TTL, with any OTP they left pending.
+
+        Returns:
+            int: Number of sessions dropped
+        """
+        cutoff = time.monotonic() - self.session_ttl
+        with self._lock:
+            expired = [(sid, s) for sid, s in self._sessions.items() if s.last_active < cutoff]
+            for sid, _ in expired:
+                del self._sessions[sid]
+        for sid, session in expired:
+            if session.otp_pending:
+                self.otp_service.discard(sid)
+        return len(expired)
+
+    @property
+    def active_sessions(self):
+        """Number of open sessions."""
+        return len(self._sessions)
+
+    # -------------------------------------------------------------------------
+    # Transactions
+    # -------------------------------------------------------------------------
+
+    @timed('atm_engine_operation_seconds', errors='atm_engine_errors_total')
+    def verify_pin(self, session, pin):
+        """
+        Check a PIN against the customer's stored hash.
+
+        Args:
+            session (Session): Active session
+            pin (str): PIN as entered
+
+        Raises:
+            InvalidPinError: If the PIN is empty or does not match
+        """
+        if not pin:
+            raise InvalidPinError("Please enter a PIN.")
+        # The record cached by open_session; PIN changes made here invalidate it
+        customer = self.db_manager.get_customer_details(session.acc_no)
+        if customer is None and self.journal is not None:
+            # Database unreachable: stand-in mode checks against the record read when the session opened
+            customer = session.customer
+        if customer is None:
+            raise InvalidPinError()
+        matches, needs_rehash = self.pin_hasher.verify(pin, customer.pin)
+        if not matches:
+            # The PIN may have been changed by another process: check the stored hash once
+            fresh = self.db_manager.get_customer_details(session.acc_no, refresh=True)
+            if fresh is None or fresh.pin == customer.pin:
+                raise InvalidPinError()
+            customer = fresh
+            matches, needs_rehash = self.pin_hasher.verify(pin, customer.pin)
+            if not matches:
+                raise InvalidPinError()
+        if needs_rehash:
+            # Upgrade legacy or weaker hashes now that the plain PIN is known
+            self.db_manager.update_customer_pin(session.acc_no, self.pin_hasher.hash_pin(pin))
+        session.customer = customer
+
+    @timed('atm_engine_operation_seconds', errors='atm_engine_errors_total')
+    def withdraw(self, session, amount, pin, idempotency_key=None):
+        """
+        Verify the PIN and debit the account.
+
+        Args:
+            session (Session): Active session
+            amount (str | int): Amount to withdraw
+            pin (str): PIN as entered
+            idempotency_key (str): Terminal-generated key; retrying with the same key never debits twice
+
+        Returns:
+            int: The new balance, or None if the debit was accepted offline and will be
+                applied when the database is reachable again
+
+        Raises:
+            InvalidAmountError, InvalidPinError, InsufficientBalanceError, TransactionFailedError
+        """
+        amount = parse_amount(amount)
+        self.verify_pin(session, pin)
+        if self.journal is not None and idempotency_key is None:
+            idempotency_key = uuid.uuid4().hex  # Journal replay relies on the key
+        try:
+            balance = self.db_manager.record_transaction(session.acc_no, amount, "DEBIT", idempotency_key)
+        except InsufficientFundsError:
+            raise InsufficientBalanceError()
+        except (UnknownAccountError, IdempotencyConflictError):
+            raise TransactionFailedError()
+        except DatabaseUnavailableError:
+            # Stand-in: within the offline limit and the last known balance, journal the debit for later
+            if self.journal is None or not self.journal.append(idempotency_key, session.acc_no, amount, "DEBIT",
+                                                               session.customer.balance):
+                raise TransactionFailedError()
+            METRICS.inc('atm_withdrawals_total', 'offline')
+            return None
+        if balance is None:
+            raise TransactionFailedError()
+        session.customer.balance = balance  # Last known balance for a later offline debit
+        METRICS.inc('atm_withdrawals_total', 'online')
+        return balance
+
+    @timed('atm_engine_operation_seconds', errors='atm_engine_errors_total')
+    def request_otp(self, session):
+        """
+        Issue a new OTP for a PIN change and deliver it to the customer.
+
+        Args:
+            session (Session): Active session
+
+        Raises:
+            TooManyOTPRequestsError: If the account has requested too many OTPs recently
+            TransactionFailedError: If the OTP could not be sent
+        """
+        session.pin_change_allowed = False
+        try:
+            self.otp_service.issue(session.session_id, session.acc_no)
+        except OTPRateLimitedError:
+            raise TooManyOTPRequestsError()
+        except OTPDeliveryError:
+            raise TransactionFailedError("Could not send the OTP. Please try again.")
+        session.otp_pending = True
+
+    @timed('atm_engine_operation_seconds', errors='atm_engine_errors_total')
+    def verify_otp(self, session, otp):
+        """
+        Check the OTP issued for this session and allow a PIN change.
+
+        Args:
+            session (Session): Active session
+            otp (str): OTP as entered
+
+        Raises:
+            InvalidOTPError: If no OTP is pending, it expired, or it does not match
+        """
+        try:
+            self.otp_service.verify(session.session_id, otp)
+        except OTPMissingError:
+            session.otp_pending = False
+            raise InvalidOTPError("OTP expired. Please request a new OTP.")
+        except OTPMismatchError as e:
+            raise InvalidOTPError(f"Invalid OTP. {e.attempts_left} attempt(s) left.")
+        except OTPExhaustedError:
+            session.otp_pending = False
+            raise InvalidOTPError("Too many invalid OTPs. Please request a new OTP.")
+        session.otp_pending = False
+        session.pin_change_allowed = True
+
+    @timed('atm_engine_operation_seconds', errors='atm_engine_errors_total')
+    def change_pin(self, session, new_pin):
+        """
+        Set a new PIN after the OTP has been verified.
+
+        Args:
+            session (Session): Active session
+            new_pin (str): New PIN as entered
+
+        Raises:
+            InvalidOTPError: If the OTP has not been verified in this session
+            InvalidPinError: If the new PIN is empty
+            TransactionFailedError: If the PIN could not be stored
+        """
+        if not session.pin_change_allowed:
+            raise InvalidOTPError("Verify the OTP before setting a new PIN.")
+        if not new_pin:
+            raise InvalidPinError("Please enter a PIN.")
+        if not self.db_manager.update_customer_pin(session.acc_no, self.pin_hasher.hash_pin(new_pin)):
+            raise TransactionFailedError()
+        session.pin_change_allowed = False
+
+    @timed('atm_engine_operation_seconds', errors='atm_engine_errors_total')
+    def mini_statement(self, session, limit=10):
+        """
+        Return the most recent transactions of the session's account.
+
+        Args:
+            session (Session): Active session
+            limit (int): Maximum number of entries
+
+        Returns:
+            list: (amount, stat, time) tuples, newest first
+        """
+        return self.db_manager.get_recent_transactions(session.acc_no, limit)
@@ -0,0 +1,426 @@
+"""
+Offline Journal
+
+When the database cannot be reached, a withdrawal can still be accepted up
+to a small per-account limit (stand-in processing). The debit is appended to
+a local journal and made durable before the customer is told it went
+through, then replayed to the database once it is reachable again.
+
+Layout:
+    <JOURNAL_DIR>/segment-00000001.log   one record per line: "<crc32> <json>"
+    <JOURNAL_DIR>/rejected.jsonl         entries the bank refused on replay
+
+Appends are made durable with group fsync: a thread that finds an fsync in
+progress waits for it and then usually finds its record already covered, so
+concurrent terminals share one fsync. Segments are append-only and sealed
+once they reach JOURNAL_SEGMENT_BYTES. A replay that resolves entries
+compacts only the segments it touched: their entries still unresolved are
+copied forward into the active segment and the segments are deleted, along
+with any sealed segment that holds nothing unresolved. A replay that
+resolves nothing (the database is still down) leaves the files alone.
+
+Every entry carries the withdrawal's idempotency key, so a replay is safe
+even if the original attempt did commit before the connection dropped, or if
+the process stops half way through a replay and replays again on restart.
+Keys must outlive the outage: replay before Maintenance.py purge-keys
+removes them.
+
+Usage:
+    python -m atm.journal status
+    python -m atm.journal replay
+
+Author: ATM Project Team
+Date: 2025
+"""
+
+import argparse
+import json
+import os
+import re
+import threading
+import time
+import zlib
+from datetime import datetime
+from atm.metrics import METRICS
+
+SEGMENT_PATTERN = re.compile(r'^segment-(\d{8})\.log$')
+
+
+class JournalCorruptError(Exception):
+    """Raised when a journal segment holds a damaged record that is not a torn final append."""
+
+
+def encode_record(record):
+    """Serialize a record as one checksummed journal line."""
+    payload = json.dumps(record, separators=(',', ':'))
+    return f"{zlib.crc32(payload.encode('utf-8')):08x} {payload}\n"
+
+
+def decode_record(line):
+    """
+    Parse one journal line.
+
+    Returns:
+        dict: The record, or None for a torn or corrupted line
+    """
+    if not line.endswith('\n') or len(line) < 10 or line[8] != ' ':
+        return None
+    payload = line[9:-1]
+    if f"{zlib.crc32(payload.encode('utf-8')):08x}" != line[:8]:
+        return None
+    return json.loads(payload)
+
+
+def fsync_directory(directory):
+    """Make file creations and deletions in a directory durable (no-op where unsupported)."""
+    if not hasattr(os, 'O_DIRECTORY'):
+        return
+    fd = os.open(directory, os.O_RDONLY | os.O_DIRECTORY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+class Journal:
+    """
+    Append-only, segmented journal of offline withdrawals.
+
+    Unresolved entries are also kept in memory (keyed by idempotency key) so
+    the per-account offline totals and the replay need no file reads.
+    """
+
+    def __init__(self, directory, segment_bytes=4 * 1024 * 1024, offline_limit=10000):
+        """
+        Open the journal, recovering the entries left by an earlier run.
+
+        Args:
+            directory (str): Directory holding the segment files
+            segment_bytes (int): Size after which the active segment is sealed
+            offline_limit (int): Largest total an account may withdraw while offline
+        """
+        self.directory = directory
+        self.segment_bytes = segment_bytes
+        self.offline_limit = offline_limit
+        self._lock = threading.Lock()
+        self._sync_lock = threading.Lock()
+        self._replay_lock = threading.Lock()
+        self._pending = {}   # idempotency key -> record
+        self._totals = {}    # acc_no -> pending amount
+        self._locations = {}  # idempotency key -> segment holding its latest copy
+        self._live = {}      # segment number -> pending entries it holds
+        self._written = 0
+        self._synced = 0
+        self._stats = {'appended': 0, 'fsyncs': 0, 'replayed': 0, 'rejected': 0, 'refused': 0}
+        os.makedirs(directory, exist_ok=True)
+        self._segments = self._recover()
+        self._file = None
+        self._open_segment((self._segments[-1] if self._segments else 0) + 1)
+
+    @classmethod
+    def from_config(cls, config):
+        """
+        Build a Journal from a JOURNAL_CONFIG-style dict.
+
+        Args:
+            config (dict): 'directory', 'segment_bytes' and 'offline_limit'
+
+        Returns:
+            Journal: The opened journal
+        """
+        return cls(config['directory'], config.get('segment_bytes', 4 * 1024 * 1024),
+                   config.get('offline_limit', 10000))
+
+    def _path(self, number):
+        return os.path.join(self.directory, f"segment-{number:08d}.log")
+
+    def _recover(self):
+        """
+        Load unresolved entries from existing segments and cut off torn tails.
+
+        Raises:
+            JournalCorruptError: If a damaged record is followed by more data
+        """
+        numbers = sorted(int(match.group(1)) for match in map(SEGMENT_PATTERN.match, os.listdir(self.directory))
+                         if match)
+        for number in numbers:
+            path = self._path(number)
+            valid = 0
+            with open(path, 'rb') as segment:
+                for line in segment:
+                    try:
+                        record = decode_record(line.decode('utf-8'))
+                    except UnicodeDecodeError:
+                        record = None
+                    if record is None:
+                        if line.endswith(b'\n'):
+                            # Acknowledged entries may follow; never drop them silently
+                            raise JournalCorruptError(f"Damaged record in {path} at byte {valid}; "
+                                                      f"repair or move the segment before starting")
+                        break
+                    self._track(record, number)
+                    valid += len(line)
+            if valid < os.path.getsize(path):
+                # A crash mid-append leaves an unterminated last line; it was never acknowledged
+                with open(path, 'r+b') as segment:
+                    segment.truncate(valid)
+                    os.fsync(segment.fileno())
+        if not self._pending:
+            # Everything was replayed before the last shutdown
+            for number in numbers:
+                os.remove(self._path(number))
+            return []
+        return numbers
+
+    def _track(self, record, number):
+        if record['key'] in self._pending:
+            self._move(record['key'], number)  # A copy carried forward by an interrupted compaction
+            return
+        self._pending[record['key']] = record
+        self._totals[record['acc_no']] = self._totals.get(record['acc_no'], 0) + record['amount']
+        self._locations[record['key']] = number
+        self._live[number] = self._live.get(number, 0) + 1
+
+    def _move(self, key, number):
+        self._live[self._locations[key]] -= 1
+        self._locations[key] = number
+        self._live[number] = self._live.get(number, 0) + 1
+
+    def _untrack(self, key):
+        record = self._pending.pop(key, None)
+        if record is None:
+            return
+        self._live[self._locations.pop(key)] -= 1
+        remaining = self._totals[record['acc_no']] - record['amount']
+        if remaining:
+            self._totals[record['acc_no']] = remaining
+        else:
+            del self._totals[record['acc_no']]
+
+    def _open_segment(self, number):
+        self._file = open(self._path(number), 'a', encoding='utf-8', newline='')
+        self._segments.append(number)
+        fsync_directory(self.directory)
+
+    def _rotate(self):
+        """Seal the active segment and start the next one (caller holds both locks)."""
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._file.close()
+        self._synced = self._written
+        self._open_segment(self._segments[-1] + 1)
+
+    def _sync(self, ticket):
+        """Wait until the record with the given ticket is on disk, fsyncing if nobody else has."""
+        with self._sync_lock:
+            if self._synced >= ticket:
+                return
+            with self._lock:
+                target = self._written
+                fd = self._file.fileno()
+            with METRICS.timer('atm_journal_fsync_seconds'):
+                os.fsync(fd)
+            self._synced = target
+            self._stats['fsyncs'] += 1
+
+    def append(self, key, acc_no, amount, transaction_type='DEBIT', available=None):
+        """
+        Durably record an offline transaction, within the account's offline limit.
+
+        Appending a key that is already pending is a no-op that succeeds.
+
+        Args:
+            key (str): Idempotency key of the transaction
+            acc_no (str): Customer account number
+            amount (int): Transaction amount
+            transaction_type (str): Type of transaction (DEBIT/CREDIT)
+            available (int): Last known balance; pending offline debits may not exceed it either
+
+        Returns:
+            bool: True once the entry is on disk, False if it would exceed the offline limit
+        """
+        record = {'key': key, 'acc_no': acc_no, 'amount': int(amount), 'type': transaction_type,
+                  'time': datetime.now().isoformat(timespec='seconds')}
+        line = encode_record(record)
+        with self._lock:
+            if key in self._pending:
+                ticket = self._written
+            else:
+                limit = self.offline_limit if available is None else min(self.offline_limit, available)
+                if self._totals.get(acc_no, 0) + record['amount'] > limit:
+                    self._stats['refused'] += 1
+                    return False
+                self._file.write(line)
+                self._file.flush()
+                self._written += 1
+                ticket = self._written
+                self._track(record, self._segments[-1])
+                self._stats['appended'] += 1
+            rotate = self._file.tell() >= self.segment_bytes
+        if rotate:
+            with self._sync_lock, self._lock:
+                if self._file.tell() >= self.segment_bytes:
+                    self._rotate()
+        self._sync(ticket)
+        return True
+
+    def pending_total(self, acc_no):
+        """
+        Return the amount an account has withdrawn offline and not yet replayed.
+
+        Args:
+            acc_no (str): Customer account number
+
+        Returns:
+            int: Pending amount
+        """
+        with self._lock:
+            return self._totals.get(acc_no, 0)
+
+    def replay(self, db_manager, chunk_size=500):
+        """
+        Apply the pending entries to the database and compact the journal.
+
+        Entries the database refuses (e.g. the balance no longer covers an
+        offline debit) are written to rejected.jsonl for reconciliation.
+
+        Args:
+            db_manager (DatabaseManager): Database to replay into
+            chunk_size (int): Entries per database transaction
+
+        Returns:
+            int: Number of entries resolved
+        """
+        with self._replay_lock:
+            with self._lock:
+                records = list(self._pending.values())
+            if not records:
+                return 0
+            entries = [(r['key'], r['acc_no'], r['amount'], r['type']) for r in records]
+            outcomes = dict(db_manager.replay_transactions(entries, chunk_size))
+            if not outcomes:
+                return 0  # Still unreachable: nothing to compact
+
+            rejected = [record for record in records if outcomes.get(record['key']) == 'rejected']
+            if rejected:
+                with open(os.path.join(self.directory, 'rejected.jsonl'), 'a', encoding='utf-8') as rejects:
+                    for record in rejected:
+                        rejects.write(json.dumps(dict(record, rejected=datetime.now().isoformat(timespec='seconds')))
+                                      + '\n')
+                    rejects.flush()
+                    os.fsync(rejects.fileno())
+                print(f"Journal: {len(rejected)} offline transactions were rejected, see rejected.jsonl")
+
+            with self._sync_lock, self._lock:
+                touched = {self._locations[key] for key in outcomes if key in self._locations}
+                for key in outcomes:
+                    self._untrack(key)
+                if self._segments[-1] in touched:
+                    self._rotate()
+                # Compaction: carry the unresolved entries of touched segments forward, then drop
+                # those segments and any sealed segment left with nothing unresolved
+                active = self._segments[-1]
+                for key, record in self._pending.items():
+                    if self._locations[key] in touched:
+                        self._file.write(encode_record(record))
+                        self._written += 1
+                        self._move(key, active)
+                self._file.flush()
+                os.fsync(self._file.fileno())
+                self._synced = self._written
+                for number in self._segments[:-1]:
+                    if not self._live.get(number):
+                        os.remove(self._path(number))
+                        self._segments.remove(number)
+                        self._live.pop(number, None)
+                fsync_directory(self.directory)
+                self._stats['replayed'] += len(outcomes) - len(rejected)
+                self._stats['rejected'] += len(rejected)
+            METRICS.inc('atm_journal_replayed_total', amount=len(outcomes) - len(rejected))
+            METRICS.inc('atm_journal_rejected_total', amount=len(rejected))
+            return len(outcomes)
+
+    def stats(self):
+        """
+        Return journal statistics.
+
+        Returns:
+            dict: Pending entries and amount, segment count, and append/fsync/replay counters
+        """
+        with self._lock:
+            return dict(self._stats, pending=len(self._pending), pending_amount=sum(self._totals.values()),
+                        segments=len(self._segments))
+
+    def __len__(self):
+        return len(self._pending)
+
+    def close(self):
+        """Flush and close the active segment."""
+        with self._sync_lock, self._lock:
+            if self._file is not None and not self._file.closed:
+                self._file.flush()
+                os.fsync(self._file.fileno())
+                self._file.close()
+
+
+class JournalReplayer(threading.Thread):
+    """Background thread that replays the journal whenever entries are pending."""
+
+    def __init__(self, journal, db_manager, interval=5.0):
+        """
+        Args:
+            journal (Journal): Journal to drain
+            db_manager (DatabaseManager): Database to replay into
+            interval (float): Seconds between replay attempts
+        """
+        super().__init__(name='journal-replayer', daemon=True)
+        self.journal = journal
+        self.db_manager = db_manager
+        self.interval = interval
+        self._stopped = threading.Event()
+        METRICS.add_collector('atm_journal', journal.stats)
+
+    def run(self):
+        while not self._stopped.wait(self.interval):
+            if len(self.journal):
+                try:
+                    self.journal.replay(self.db_manager)
+                except Exception as e:
+                    print(f"Error replaying journal: {e}")
+
+    def close(self):
+        """Stop the thread after one last replay attempt."""
+        self._stopped.set()
+        if self.is_alive():
+            self.join()
+        if len(self.journal):
+            self.journal.replay(self.db_manager)
+        METRICS.remove_collector('atm_journal')
+
+
+def main():
+    """Show or replay the journal configured in .env."""
+    from atm.config import DB_CONFIG, JOURNAL_CONFIG
+    from atm.database import DatabaseManager
+
+    parser = argparse.ArgumentParser(description="Inspect or replay the offline withdrawal journal")
+    parser.add_argument('command', choices=['status', 'replay'])
+    parser.add_argument('--dir', default=JOURNAL_CONFIG['directory'], help="Journal directory")
+    args = parser.parse_args()
+
+    journal = Journal(args.dir, JOURNAL_CONFIG['segment_bytes'], JOURNAL_CONFIG['offline_limit'])
+    try:
+        if args.command == 'replay':
+            db_manager = DatabaseManager(DB_CONFIG)
+            start = time.perf_counter()
+            resolved = journal.replay(db_manager)
+            db_manager.close()
+            print(f"Resolved {resolved} entries in {time.perf_counter() - start:.1f}s")
+        for key, value in journal.stats().items():
+            print(f"{key}: {value}")
+    finally:
+        journal.close()
+
+
+if __name__ == "__main__":
+    main()
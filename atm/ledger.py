@@ -0,0 +1,127 @@
+"""
+Ledger Writes
+
+SQL statements and helpers for applying a transaction to an account: the
+running balance update and the ledger insert. Shared by DatabaseManager and
+the group-commit write pipeline so both paths apply exactly the same rules.
+
+A transaction may carry a client idempotency key. The key is claimed in the
+idempotency_keys table inside the same database transaction as the debit, so
+a retried request (after a timeout or a dropped connection) returns the
+original result instead of debiting twice.
+
+Author: ATM Project Team
+Date: 2025
+"""
+
+INSERT_TRANSACTION = "INSERT INTO transactions(acc_no, amount, stat) VALUES(%s, %s, %s)"
+CREDIT_BALANCE = "UPDATE customers SET balance = balance + %s WHERE acc_no = %s"
+DEBIT_BALANCE = "UPDATE customers SET balance = balance - %s WHERE acc_no = %s AND balance >= %s"
+SELECT_BALANCE = "SELECT balance FROM customers WHERE acc_no = %s"
+UPDATE_PIN = "UPDATE customers SET pin = %s WHERE acc_no = %s"
+INSERT_IDEMPOTENCY_KEY = "INSERT INTO idempotency_keys(idem_key, acc_no, amount, stat) VALUES(%s, %s, %s, %s)"
+# A locking read returns the latest committed row even inside an older snapshot
+SELECT_IDEMPOTENCY_KEY = "SELECT acc_no, amount, stat, balance FROM idempotency_keys WHERE idem_key = %s FOR UPDATE"
+RECORD_IDEMPOTENCY_RESULT = "UPDATE idempotency_keys SET balance = %s WHERE idem_key = %s"
+RELEASE_IDEMPOTENCY_KEY = "DELETE FROM idempotency_keys WHERE idem_key = %s"
+
+
+class InsufficientFundsError(Exception):
+    """Raised when a debit exceeds the account balance."""
+
+    def __init__(self, acc_no, balance, amount):
+        super().__init__(f"Insufficient funds in account {acc_no}: balance {balance}, requested {amount}")
+        self.acc_no = acc_no
+        self.balance = balance
+        self.amount = amount
+
+
+class UnknownAccountError(LookupError):
+    """Raised when a transaction targets an account that does not exist."""
+
+
+class IdempotencyConflictError(ValueError):
+    """Raised when an idempotency key is reused for a different transaction."""
+
+
+class DatabaseUnavailableError(ConnectionError):
+    """Raised when a transaction could not reach the database; its outcome is unknown."""
+
+
+def apply_balance_change(cursor, acc_no, amount, transaction_type):
+    """
+    Apply a transaction to the running balance inside the caller's transaction.
+
+    Debits are a single conditional UPDATE, so the sufficient-funds check is
+    O(1) and cannot race with another debit on the same account. The ledger
+    row is not written here; callers insert it (singly or in bulk) before
+    committing.
+
+    Args:
+        cursor (Cursor): Cursor on the connection holding the transaction
+        acc_no (str): Customer account number
+        amount (int): Transaction amount
+        transaction_type (str): Type of transaction (DEBIT/CREDIT)
+
+    Returns:
+        int: The new balance
+
+    Raises:
+        InsufficientFundsError: If a debit exceeds the balance
+        UnknownAccountError: If the account does not exist
+    """
+    if transaction_type == 'DEBIT':
+        cursor.execute(DEBIT_BALANCE, (amount, acc_no, amount))
+    else:
+        cursor.execute(CREDIT_BALANCE, (amount, acc_no))
+    updated = cursor.rowcount
+    cursor.execute(SELECT_BALANCE, (acc_no,))
+    row = cursor.fetchone()
+    if row is None:
+        raise UnknownAccountError(f"Unknown account {acc_no}")
+    if not updated:
+        raise InsufficientFundsError(acc_no, row[0], amount)
+    return row[0]
+
+
+def apply_idempotent_change(cursor, key, acc_no, amount, transaction_type, integrity_errors):
+    """
+    Apply a transaction at most once per idempotency key.
+
+    The key row is inserted first. Its primary key makes a concurrent request
+    with the same key wait for this transaction and then fail with a duplicate
+    key error, after which the stored result is returned instead of applying
+    the change again. A rejected change releases the key, so the client can
+    retry it later.
+
+    Args:
+        cursor (Cursor): Cursor on the connection holding the transaction
+        key (str): Client idempotency key
+        acc_no (str): Customer account number
+        amount (int): Transaction amount
+        transaction_type (str): Type of transaction (DEBIT/CREDIT)
+        integrity_errors (tuple): The driver's duplicate-key exception classes
+
+    Returns:
+        tuple: (new balance, True if this is a replay and nothing was applied)
+
+    Raises:
+        InsufficientFundsError: If a debit exceeds the balance
+        UnknownAccountError: If the account does not exist
+        IdempotencyConflictError: If the key was used for a different transaction
+    """
+    try:
+        cursor.execute(INSERT_IDEMPOTENCY_KEY, (key, acc_no, amount, transaction_type))
+    except integrity_errors:
+        cursor.execute(SELECT_IDEMPOTENCY_KEY, (key,))
+        row = cursor.fetchone()
+        if row is None or tuple(row[:3]) != (acc_no, amount, transaction_type) or row[3] is None:
+            raise IdempotencyConflictError(f"Idempotency key {key} was used for a different transaction")
+        return row[3], True
+    try:
+        balance = apply_balance_change(cursor, acc_no, amount, transaction_type)
+    except (InsufficientFundsError, UnknownAccountError):
+        cursor.execute(RELEASE_IDEMPOTENCY_KEY, (key,))
+        raise
+    cursor.execute(RECORD_IDEMPOTENCY_RESULT, (balance, key))
+    return balance, False
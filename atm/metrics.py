@@ -0,0 +1,464 @@
+"""
+Metrics
+
+Low-overhead counters and latency histograms for the hot paths (database
+operations, commits, engine operations, GUI background tasks), plus ways to
+get them out of a running process:
+
+    - MetricsServer: HTTP endpoint serving Prometheus text (/metrics), a JSON
+      snapshot (/metrics.json) and an on-demand profile (/profile?seconds=5)
+    - JsonDumper: writes a JSON snapshot to a file every few seconds
+    - SamplingProfiler: samples every thread's stack from a background thread,
+      so it can be switched on and off at runtime without restarting
+
+Recording a value is a dictionary update under a lock; nothing is formatted
+until a snapshot is taken. Components with their own statistics (pool, cache,
+group commit) register collectors that are read at snapshot time.
+
+Author: ATM Project Team
+Date: 2025
+"""
+
+import bisect
+import json
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from functools import wraps
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+# Upper bounds (seconds) of the latency histogram buckets
+BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class Histogram:
+    """Cumulative-bucket latency histogram with count, sum and max."""
+
+    __slots__ = ('counts', 'count', 'sum', 'max')
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(BUCKETS, value)] += 1
+        self.count += 1
+        self.sum += value
+        if value > self.max:
+            self.max = value
+
+    def quantile(self, q):
+        """Estimate a quantile as the upper bound of the bucket holding it."""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for bound, count in zip(BUCKETS + (self.max,), self.counts):
+            seen += count
+            if seen >= rank:
+                return min(bound, self.max)
+        return self.max
+
+
+class MetricsRegistry:
+    """
+    Process-wide store of counters and latency histograms.
+
+    Metrics are identified by a name and an optional label value, e.g.
+    ``('atm_db_operation_seconds', 'get_customer_details')``.
+    """
+
+    def __init__(self, enabled=True):
+        """
+        Args:
+            enabled (bool): When False, recording calls return immediately
+        """
+        self.enabled = enabled
+        self._counters = {}
+        self._histograms = {}
+        self._collectors = {}
+        self._lock = threading.Lock()
+
+    def inc(self, name, label=None, amount=1):
+        """Add ``amount`` to a counter."""
+        if not self.enabled:
+            return
+        key = (name, label)
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + amount
+
+    def observe(self, name, seconds, label=None):
+        """Record one latency sample in a histogram."""
+        if not self.enabled:
+            return
+        key = (name, label)
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = Histogram()
+            histogram.observe(seconds)
+
+    @contextmanager
+    def timer(self, name, label=None):
+        """Context manager recording the duration of its block."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, label)
+
+    def add_collector(self, name, collector):
+        """
+        Register a callable returning a flat dict of numbers, read at snapshot time.
+
+        Registering under an existing name replaces the previous collector.
+
+        Args:
+            name (str): Metric name prefix, e.g. 'atm_db_pool'
+            collector (callable): Returns {field: number}
+        """
+        with self._lock:
+            self._collectors[name] = collector
+
+    def remove_collector(self, name):
+        """Unregister a collector."""
+        with self._lock:
+            self._collectors.pop(name, None)
+
+    def snapshot(self):
+        """
+        Return every metric as plain data.
+
+        Returns:
+            dict: 'counters', 'timers' (count/sum/max/p50/p95/p99 in seconds) and 'gauges'
+        """
+        with self._lock:
+            counters = dict(self._counters)
+            histograms = {key: (h.count, h.sum, h.max, h.quantile(0.5), h.quantile(0.95), h.quantile(0.99), list(h.counts))
+                          for key, h in self._histograms.items()}
+            collectors = dict(self._collectors)
+        snapshot = {'counters': {}, 'timers': {}, 'gauges': {}}
+        for (name, label), value in counters.items():
+            snapshot['counters'].setdefault(name, {})[label or ''] = value
+        for (name, label), (count, total, peak, p50, p95, p99, buckets) in histograms.items():
+            snapshot['timers'].setdefault(name, {})[label or ''] = {
+                'count': count, 'sum': total, 'max': peak, 'p50': p50, 'p95': p95, 'p99': p99, 'buckets': buckets
+            }
+        for name, collector in collectors.items():
+            try:
+                values = collector()
+            except Exception as e:
+                print(f"Error collecting {name} metrics: {e}")
+                continue
+            snapshot['gauges'][name] = {key: value for key, value in values.items()
+                                        if isinstance(value, (int, float))}
+        return snapshot
+
+    def render_prometheus(self):
+        """
+        Render every metric in the Prometheus text exposition format.
+
+        Returns:
+            str: The exposition text
+        """
+        snapshot = self.snapshot()
+        lines = []
+        for name, values in sorted(snapshot['counters'].items()):
+            lines.append(f"# TYPE {name} counter")
+            for label, value in sorted(values.items()):
+                lines.append(f"{name}{_labels(label)} {value}")
+        for name, values in sorted(snapshot['timers'].items()):
+            lines.append(f"# TYPE {name} histogram")
+            for label, timer in sorted(values.items()):
+                cumulative = 0
+                for bound, count in zip(BUCKETS, timer['buckets']):
+                    cumulative += count
+                    lines.append(f"{name}_bucket{_labels(label, le=bound)} {cumulative}")
+                lines.append(f"{name}_bucket{_labels(label, le='+Inf')} {timer['count']}")
+                lines.append(f"{name}_sum{_labels(label)} {timer['sum']}")
+                lines.append(f"{name}_count{_labels(label)} {timer['count']}")
+        for name, values in sorted(snapshot['gauges'].items()):
+            for field, value in sorted(values.items()):
+                lines.append(f"# TYPE {name}_{field} gauge")
+                lines.append(f"{name}_{field} {value}")
+        return "\n".join(lines) + "\n"
+
+    def reset(self):
+        """Drop all counters and histograms (collectors are kept)."""
+        with self._lock:
+            self._counters.clear()
+            self._histograms.clear()
+
+
+def _labels(label, le=None):
+    """Format the label set of one sample."""
+    parts = []
+    if label:
+        parts.append(f'operation="{label}"')
+    if le is not None:
+        parts.append(f'le="{le}"')
+    return '{' + ','.join(parts) + '}' if parts else ''
+
+
+# Registry shared by every module of the process
+METRICS = MetricsRegistry()
+
+
+def timed(name, label=None, errors='atm_errors_total'):
+    """
+    Decorator recording a call's latency and failures.
+
+    Latency goes to the ``name`` histogram and exceptions to the ``errors``
+    counter, both labelled with ``label`` (the function name by default).
+
+    Args:
+        name (str): Histogram name
+        label (str): Label value; defaults to the function name
+        errors (str): Counter incremented when the call raises
+    """
+    def decorator(function):
+        operation = label or function.__name__
+
+        @wraps(function)
+        def wrapper(*args, **kwargs):
+            if not METRICS.enabled:
+                return function(*args, **kwargs)
+            start = time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+            except Exception:
+                METRICS.inc(errors, operation)
+                raise
+            finally:
+                METRICS.observe(name, time.perf_counter() - start, operation)
+        return wrapper
+    return decorator
+
+
+# =============================================================================
+# SAMPLING PROFILER
+# =============================================================================
+
+class SamplingProfiler:
+    """
+    Statistical profiler that samples the stacks of all threads.
+
+    A background thread reads ``sys._current_frames()`` every ``interval``
+    seconds and counts the functions it finds, so profiling costs nothing
+    while it is off and little while it is on.
+    """
+
+    def __init__(self, interval=0.005):
+        """
+        Args:
+            interval (float): Seconds between samples
+        """
+        self.interval = interval
+        self.samples = 0
+        self._self_counts = Counter()
+        self._total_counts = Counter()
+        self._thread = None
+        self._stop = threading.Event()
+
+    @property
+    def running(self):
+        return self._thread is not None
+
+    def start(self):
+        """Start sampling (no-op if already running)."""
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._sample, name='atm-profiler', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Stop sampling and keep the collected samples."""
+        if self._thread is None:
+            return
+        self._stop.set()
+        self._thread.join()
+        self._thread = None
+
+    def _sample(self):
+        own = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own:
+                    continue
+                self.samples += 1
+                self._self_counts[_describe(frame)] += 1
+                seen = set()
+                while frame is not None:
+                    where = _describe(frame)
+                    if where not in seen:
+                        seen.add(where)
+                        self._total_counts[where] += 1
+                    frame = frame.f_back
+
+    def report(self, limit=25):
+        """
+        Format the functions seen most often.
+
+        Args:
+            limit (int): Number of functions listed
+
+        Returns:
+            str: Table of self and cumulative sample percentages
+        """
+        if not self.samples:
+            return "No samples collected.\n"
+        lines = [f"{self.samples} samples every {self.interval * 1000:.1f}ms",
+                 f"{'self %':>7} {'total %':>7}  function"]
+        for where, count in self._self_counts.most_common(limit):
+            lines.append(f"{count * 100 / self.samples:>6.1f}% {self._total_counts[where] * 100 / self.samples:>6.1f}%  {where}")
+        return "\n".join(lines) + "\n"
+
+
+def _describe(frame):
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+def profile(seconds, interval=0.005, limit=25):
+    """
+    Sample all threads for a while and return the report.
+
+    Args:
+        seconds (float): How long to sample
+        interval (float): Seconds between samples
+        limit (int): Number of functions listed
+
+    Returns:
+        str: The profiler report
+    """
+    profiler = SamplingProfiler(interval)
+    profiler.start()
+    time.sleep(seconds)
+    profiler.stop()
+    return profiler.report(limit)
+
+
+# =============================================================================
+# EXPORTERS
+# =============================================================================
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    registry = METRICS
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        if url.path == '/metrics':
+            body, content_type = self.registry.render_prometheus(), 'text/plain; version=0.0.4'
+        elif url.path == '/metrics.json':
+            body, content_type = json.dumps(self.registry.snapshot()), 'application/json'
+        elif url.path == '/profile':
+            seconds = min(float(parse_qs(url.query).get('seconds', ['5'])[0]), 60.0)
+            body, content_type = profile(seconds), 'text/plain'
+        else:
+            self.send_error(404)
+            return
+        data = body.encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class MetricsServer:
+    """HTTP endpoint exposing the registry on a background thread."""
+
+    def __init__(self, host='127.0.0.1', port=9108, registry=METRICS):
+        """
+        Args:
+            host (str): Address to bind
+            port (int): Port to bind (0 picks a free port)
+            registry (MetricsRegistry): Registry to expose
+        """
+        handler = type('MetricsHandler', (_MetricsHandler,), {'registry': registry})
+        self._server = ThreadingHTTPServer((host, port), handler)
+        self._server.daemon_threads = True
+        self.address = self._server.server_address
+        self._thread = threading.Thread(target=self._server.serve_forever, name='atm-metrics', daemon=True)
+        self._thread.start()
+
+    def close(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+
+class JsonDumper:
+    """Writes a JSON snapshot of the registry to a file at a fixed interval."""
+
+    def __init__(self, path, interval=60.0, registry=METRICS):
+        """
+        Args:
+            path (str): Output file, replaced atomically on every dump
+            interval (float): Seconds between dumps
+            registry (MetricsRegistry): Registry to dump
+        """
+        self.path = path
+        self.interval = interval
+        self.registry = registry
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='atm-metrics-dump', daemon=True)
+        self._thread.start()
+
+    def dump(self):
+        """Write one snapshot now."""
+        snapshot = self.registry.snapshot()
+        snapshot['timestamp'] = time.time()
+        temp_path = self.path + '.tmp'
+        with open(temp_path, 'w', encoding='utf-8') as output:
+            json.dump(snapshot, output)
+        os.replace(temp_path, self.path)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.dump()
+            except Exception as e:
+                print(f"Error writing metrics: {e}")
+
+    def close(self):
+        """Stop dumping after writing a final snapshot."""
+        self._stop.set()
+        self._thread.join()
+        try:
+            self.dump()
+        except Exception as e:
+            print(f"Error writing metrics: {e}")
+
+
+def start_exporters(config):
+    """
+    Start the exporters enabled in a METRICS_CONFIG-style dict.
+
+    Args:
+        config (dict): 'enabled', 'host', 'port', 'dump_path', 'dump_interval'
+
+    Returns:
+        list: Started exporters (each has a ``close`` method)
+    """
+    METRICS.enabled = config['enabled']
+    exporters = []
+    if not config['enabled']:
+        return exporters
+    if config['port']:
+        try:
+            exporters.append(MetricsServer(config['host'], config['port']))
+        except OSError as e:
+            print(f"Error starting metrics endpoint: {e}")
+    if config['dump_path']:
+        exporters.append(JsonDumper(config['dump_path'], config['dump_interval']))
+    return exporters
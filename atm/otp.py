@@ -0,0 +1,513 @@
+"""
+One-Time Passwords
+
+OTPs authorize a PIN change. OTPService issues one code per session, delivers
+it to the customer and checks what the customer types back:
+
+    - Codes expire after a fixed TTL and are discarded after a few wrong
+      attempts; a successful check consumes the code.
+    - Each account may request a limited number of codes (token bucket: a
+      burst, then a steady refill rate), so a terminal cannot flood a
+      customer's phone or walk through the code space with fresh codes.
+    - Codes are stored as an HMAC digest, never in plain text.
+
+Stores:
+    - MemoryOTPStore: bounded, insertion-ordered dict in this process. Every
+      code has the same TTL, so the oldest entry is always the next to
+      expire and expiry is a pop from the front; lookups are O(1).
+    - DatabaseOTPStore: the otp_codes table, for several server processes
+      sharing one database (they must also share OTP_SECRET).
+
+Delivery channels are callables taking (acc_no, otp). The console, file and
+queue channels below stand in for an SMS or email gateway.
+
+Author: ATM Project Team
+Date: 2025
+"""
+
+import hashlib
+import hmac
+import os
+import queue
+import secrets
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+from atm.metrics import METRICS
+
+# Outcomes of checking a code against the store
+VERIFIED = 'verified'
+MISMATCH = 'mismatch'
+EXHAUSTED = 'exhausted'
+MISSING = 'missing'
+
+# =============================================================================
+# ERRORS
+# =============================================================================
+
+class OTPError(Exception):
+    """Base class for OTP failures."""
+
+
+class OTPRateLimitedError(OTPError):
+    """The account has requested too many OTPs recently."""
+
+
+class OTPMissingError(OTPError):
+    """No OTP was issued for the session, or it has expired."""
+
+
+class OTPMismatchError(OTPError):
+    """The code does not match; the OTP can still be retried."""
+
+    def __init__(self, attempts_left):
+        super().__init__(f"OTP does not match, {attempts_left} attempts left")
+        self.attempts_left = attempts_left
+
+
+class OTPExhaustedError(OTPError):
+    """Too many wrong codes; the OTP has been discarded."""
+
+
+class OTPDeliveryError(OTPError):
+    """The delivery channel could not accept the OTP."""
+
+# =============================================================================
+# STORES
+# =============================================================================
+
+class OTPEntry:
+    """One issued code."""
+
+    __slots__ = ('acc_no', 'digest', 'expires_at', 'attempts')
+
+    def __init__(self, acc_no, digest, expires_at):
+        self.acc_no = acc_no
+        self.digest = digest
+        self.expires_at = expires_at
+        self.attempts = 0
+
+
+class MemoryOTPStore:
+    """
+    In-process OTP store with expiry and a size bound.
+
+    Entries are kept in the order they were issued. Because every entry lives
+    for the same TTL, expired entries are always at the front and are dropped
+    there on each write; when the store is full the oldest pending code is
+    evicted.
+    """
+
+    def __init__(self, maxsize=100000):
+        """
+        Args:
+            maxsize (int): Maximum pending codes
+        """
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {'expirations': 0, 'evictions': 0}
+
+    def _purge(self, now):
+        while self._entries:
+            key, entry = next(iter(self._entries.items()))
+            if entry.expires_at > now:
+                break
+            del self._entries[key]
+            self._stats['expirations'] += 1
+
+    def put(self, key, acc_no, digest, expires_at):
+        """Store a code, replacing any earlier code for the same key."""
+        with self._lock:
+            self._purge(time.time())
+            self._entries.pop(key, None)
+            self._entries[key] = OTPEntry(acc_no, digest, expires_at)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self._stats['evictions'] += 1
+
+    def check(self, key, digest, max_attempts):
+        """
+        Compare a digest with the stored one, counting the attempt.
+
+        Returns:
+            tuple: (VERIFIED | MISMATCH | EXHAUSTED | MISSING, attempts left)
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return MISSING, 0
+            if entry.expires_at <= time.time():
+                del self._entries[key]
+                self._stats['expirations'] += 1
+                return MISSING, 0
+            if hmac.compare_digest(entry.digest, digest):
+                del self._entries[key]
+                return VERIFIED, 0
+            entry.attempts += 1
+            if entry.attempts >= max_attempts:
+                del self._entries[key]
+                return EXHAUSTED, 0
+            return MISMATCH, max_attempts - entry.attempts
+
+    def delete(self, key):
+        """Drop the code stored for a key, if any."""
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def purge(self):
+        """Drop expired codes."""
+        with self._lock:
+            self._purge(time.time())
+
+    def stats(self):
+        with self._lock:
+            return dict(self._stats, size=len(self._entries), maxsize=self.maxsize)
+
+
+REPLACE_OTP = "REPLACE INTO otp_codes(otp_key, acc_no, digest, attempts, expires_at) VALUES(%s, %s, %s, 0, %s)"
+SELECT_OTP = "SELECT digest, attempts, expires_at FROM otp_codes WHERE otp_key = %s FOR UPDATE"
+UPDATE_OTP_ATTEMPTS = "UPDATE otp_codes SET attempts = %s WHERE otp_key = %s"
+DELETE_OTP = "DELETE FROM otp_codes WHERE otp_key = %s"
+PURGE_OTPS = "DELETE FROM otp_codes WHERE expires_at <= %s"
+
+
+class DatabaseOTPStore:
+    """
+    OTP store in the otp_codes table, shared by every process on the database.
+
+    Each check runs in one transaction holding the code's row lock, so
+    concurrent attempts against the same code are counted exactly.
+    """
+
+    def __init__(self, pool, purge_interval=60.0):
+        """
+        Args:
+            pool (ConnectionPool): Pool of the DatabaseManager
+            purge_interval (float): Seconds between deletions of expired codes
+        """
+        self.pool = pool
+        self.purge_interval = purge_interval
+        self._next_purge = 0.0
+
+    def _execute(self, operation):
+        with self.pool.connection() as conn:
+            cursor = conn.cursor()
+            try:
+                result = operation(cursor)
+                conn.commit()
+                return result
+            finally:
+                cursor.close()
+
+    def put(self, key, acc_no, digest, expires_at):
+        """Store a code, replacing any earlier code for the same key."""
+        now = time.time()
+        if now >= self._next_purge:
+            self._next_purge = now + self.purge_interval
+            self.purge()
+        self._execute(lambda cursor: cursor.execute(REPLACE_OTP, (key, acc_no, digest, expires_at)))
+
+    def check(self, key, digest, max_attempts):
+        """
+        Compare a digest with the stored one, counting the attempt.
+
+        Returns:
+            tuple: (VERIFIED | MISMATCH | EXHAUSTED | MISSING, attempts left)
+        """
+        def operation(cursor):
+            cursor.execute(SELECT_OTP, (key,))
+            row = cursor.fetchone()
+            if row is None:
+                return MISSING, 0
+            stored, attempts, expires_at = row
+            if expires_at <= time.time():
+                cursor.execute(DELETE_OTP, (key,))
+                return MISSING, 0
+            if hmac.compare_digest(stored, digest):
+                cursor.execute(DELETE_OTP, (key,))
+                return VERIFIED, 0
+            attempts += 1
+            if attempts >= max_attempts:
+                cursor.execute(DELETE_OTP, (key,))
+                return EXHAUSTED, 0
+            cursor.execute(UPDATE_OTP_ATTEMPTS, (attempts, key))
+            return MISMATCH, max_attempts - attempts
+
+        return self._execute(operation)
+
+    def delete(self, key):
+        """Drop the code stored for a key, if any."""
+        self._execute(lambda cursor: cursor.execute(DELETE_OTP, (key,)))
+
+    def purge(self):
+        """Drop expired codes."""
+        self._execute(lambda cursor: cursor.execute(PURGE_OTPS, (time.time(),)))
+
+    def stats(self):
+        return {}
+
+# =============================================================================
+# RATE LIMITING
+# =============================================================================
+
+class TokenBucketLimiter:
+    """
+    Per-key token buckets.
+
+    Each key may take ``burst`` tokens at once and regains ``rate`` tokens per
+    second. Buckets are kept in LRU order and bounded by ``maxsize``; the
+    bucket evicted is the one idle longest, which has usually refilled anyway.
+    """
+
+    def __init__(self, rate, burst, maxsize=100000):
+        """
+        Args:
+            rate (float): Tokens regained per second
+            burst (int): Bucket capacity; 0 disables limiting
+            maxsize (int): Maximum buckets tracked
+        """
+        self.rate = rate
+        self.burst = burst
+        self.maxsize = maxsize
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+
+    def allow(self, key):
+        """
+        Take one token from a key's bucket.
+
+        Args:
+            key: Bucket key (account number)
+
+        Returns:
+            bool: True if a token was available
+        """
+        if self.burst <= 0:
+            return True
+        now = time.monotonic()
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                bucket = self._buckets[key] = [float(self.burst), now]
+                while len(self._buckets) > self.maxsize:
+                    self._buckets.popitem(last=False)
+            else:
+                self._buckets.move_to_end(key)
+                bucket[0] = min(float(self.burst), bucket[0] + (now - bucket[1]) * self.rate)
+                bucket[1] = now
+            if bucket[0] < 1.0:
+                return False
+            bucket[0] -= 1.0
+            return True
+
+    def __len__(self):
+        return len(self._buckets)
+
+# =============================================================================
+# DELIVERY CHANNELS
+# =============================================================================
+
+class ConsoleDelivery:
+    """Print the OTP to stdout (development terminals)."""
+
+    def __call__(self, acc_no, otp):
+        print(f"Your OTP is: {otp}")
+
+
+class FileDelivery:
+    """Append each OTP to an outbox file picked up by an SMS/email relay."""
+
+    def __init__(self, path):
+        """
+        Args:
+            path (str): Outbox file; one tab-separated line per OTP
+        """
+        self.path = path
+        self._lock = threading.Lock()
+
+    def __call__(self, acc_no, otp):
+        line = f"{datetime.now().isoformat(timespec='seconds')}\t{acc_no}\t{otp}\n"
+        try:
+            with self._lock:
+                with open(self.path, 'a', encoding='utf-8') as outbox:
+                    outbox.write(line)
+        except OSError as e:
+            raise OTPDeliveryError(f"Could not write to OTP outbox {self.path}: {e}") from e
+
+
+class QueueDelivery:
+    """Hand OTPs to a bounded in-process queue drained by a sender thread (or a test)."""
+
+    def __init__(self, maxsize=10000):
+        """
+        Args:
+            maxsize (int): Maximum undelivered OTPs before new ones are refused
+        """
+        self.queue = queue.Queue(maxsize)
+
+    def __call__(self, acc_no, otp):
+        try:
+            self.queue.put_nowait((acc_no, otp))
+        except queue.Full:
+            raise OTPDeliveryError("OTP delivery queue is full")
+
+    def get(self, timeout=None):
+        """
+        Take the next undelivered OTP.
+
+        Returns:
+            tuple: (acc_no, otp)
+        """
+        return self.queue.get(timeout=timeout)
+
+
+def make_delivery(config):
+    """
+    Build the delivery channel named in an OTP_CONFIG-style dict.
+
+    Args:
+        config (dict): 'delivery' (console, file or queue) and 'delivery_path'
+
+    Returns:
+        callable: The channel
+    """
+    channel = config.get('delivery', 'console')
+    if channel == 'console':
+        return ConsoleDelivery()
+    if channel == 'file':
+        return FileDelivery(config.get('delivery_path', 'otp_outbox.log'))
+    if channel == 'queue':
+        return QueueDelivery()
+    raise ValueError(f"Unknown OTP delivery channel: {channel}")
+
+# =============================================================================
+# SERVICE
+# =============================================================================
+
+class OTPService:
+    """
+    Issues and verifies one-time passwords for PIN changes.
+    """
+
+    def __init__(self, store=None, limiter=None, delivery=None, ttl=300.0, max_attempts=3, digits=6, secret=None):
+        """
+        Initialize the service.
+
+        Args:
+            store (MemoryOTPStore | DatabaseOTPStore): Where pending codes live (defaults to memory)
+            limiter (TokenBucketLimiter): Per-account issue limit (defaults to 3 at once, then 6 an hour)
+            delivery (callable): Called with (acc_no, otp) to send the code (defaults to the console)
+            ttl (float): Seconds a code stays valid
+            max_attempts (int): Wrong codes allowed before the code is discarded
+            digits (int): Code length
+            secret (bytes): HMAC key for stored digests (random per process if omitted)
+        """
+        self.store = store or MemoryOTPStore()
+        self.limiter = limiter or TokenBucketLimiter(6 / 3600.0, 3)
+        self.delivery = delivery or ConsoleDelivery()
+        self.ttl = ttl
+        self.max_attempts = max_attempts
+        self.digits = digits
+        self._secret = secret or os.urandom(32)
+        METRICS.add_collector('atm_otp', self.stats)
+
+    @classmethod
+    def from_config(cls, config, db_manager=None):
+        """
+        Build an OTPService from an OTP_CONFIG-style dict.
+
+        Args:
+            config (dict): Store, limits, delivery channel and secret settings
+            db_manager (DatabaseManager): Required for the 'database' store
+
+        Returns:
+            OTPService: The configured service
+        """
+        if config.get('store', 'memory') == 'database':
+            store = DatabaseOTPStore(db_manager.pool)
+        else:
+            store = MemoryOTPStore(config.get('max_pending', 100000))
+        limiter = TokenBucketLimiter(config.get('rate_per_hour', 6) / 3600.0, config.get('burst', 3),
+                                     config.get('max_pending', 100000))
+        secret = config.get('secret') or None
+        return cls(store, limiter, make_delivery(config), config.get('ttl', 300.0), config.get('max_attempts', 3),
+                   config.get('digits', 6), secret.encode('utf-8') if secret else None)
+
+    def _digest(self, key, otp):
+        return hmac.new(self._secret, f"{key}\0{otp}".encode('utf-8'), hashlib.sha256).hexdigest()
+
+    def issue(self, key, acc_no):
+        """
+        Create a code for a session and deliver it to the account holder.
+
+        A new code replaces any earlier one for the same key.
+
+        Args:
+            key (str): Session the code belongs to
+            acc_no (str): Account whose holder receives the code
+
+        Raises:
+            OTPRateLimitedError: If the account has requested too many codes
+            OTPDeliveryError: If the code could not be handed to the channel
+        """
+        if not self.limiter.allow(acc_no):
+            METRICS.inc('atm_otp_total', 'rate_limited')
+            raise OTPRateLimitedError(f"Too many OTP requests for account {acc_no}")
+        otp = f"{secrets.randbelow(10 ** self.digits):0{self.digits}d}"
+        self.store.put(key, acc_no, self._digest(key, otp), time.time() + self.ttl)
+        try:
+            self.delivery(acc_no, otp)
+        except Exception as e:
+            # The customer never received this code, so it must not stay redeemable
+            self.store.delete(key)
+            METRICS.inc('atm_otp_total', 'delivery_failed')
+            if isinstance(e, OTPDeliveryError):
+                raise
+            raise OTPDeliveryError(f"OTP delivery failed: {e}") from e
+        METRICS.inc('atm_otp_total', 'issued')
+
+    def verify(self, key, otp):
+        """
+        Check a code entered for a session, consuming it on success.
+
+        Args:
+            key (str): Session the code belongs to
+            otp (str): Code as entered
+
+        Raises:
+            OTPMissingError: If no code is pending for the session or it expired
+            OTPMismatchError: If the code is wrong but may be retried
+            OTPExhaustedError: If the code was wrong too many times and is now discarded
+        """
+        status, attempts_left = self.store.check(key, self._digest(key, str(otp).strip()), self.max_attempts)
+        METRICS.inc('atm_otp_total', status)
+        if status == MISSING:
+            raise OTPMissingError(f"No pending OTP for {key}")
+        if status == MISMATCH:
+            raise OTPMismatchError(attempts_left)
+        if status == EXHAUSTED:
+            raise OTPExhaustedError(f"Too many wrong OTPs for {key}")
+
+    def discard(self, key):
+        """
+        Drop any pending code for a session.
+
+        Args:
+            key (str): Session the code belongs to
+        """
+        self.store.delete(key)
+
+    def stats(self):
+        """
+        Return store and rate limiter statistics.
+
+        Returns:
+            dict: Pending codes, expirations, evictions and tracked buckets
+        """
+        return dict(self.store.stats(), buckets=len(self.limiter))
+
+    def close(self):
+        """Unregister the service's metrics."""
+        METRICS.remove_collector('atm_otp')
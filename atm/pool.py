@@ -0,0 +1,214 @@
+"""
+Connection Pool
+
+A bounded, thread-safe database connection pool. Connections are created lazily
+up to the configured size, handed out with ``acquire``/``release`` (or the
+``connection`` context manager), health-checked when they have been idle for a
+while, and replaced transparently when they turn out to be broken.
+
+Author: ATM Project Team
+Date: 2025
+"""
+
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+
+class PoolTimeoutError(Exception):
+    """Raised when no connection becomes available within the pool timeout."""
+
+
+class ConnectionPool:
+    """
+    Bounded pool of database connections.
+
+    The pool never holds more than ``size`` connections. Callers that find the
+    pool exhausted wait up to ``timeout`` seconds for a connection to be returned.
+    """
+
+    def __init__(self, factory, size=5, timeout=10.0, health_check=None, health_check_interval=30.0):
+        """
+        Initialize the pool. No connection is opened until the first checkout.
+
+        Args:
+            factory (callable): Zero-argument callable returning a new DB-API connection
+            size (int): Maximum number of open connections
+            timeout (float): Seconds to wait for a free connection before giving up
+            health_check (callable): Callable taking a connection and returning True if usable
+            health_check_interval (float): Only check connections idle for longer than this
+        """
+        self._factory = factory
+        self.size = size
+        self.timeout = timeout
+        self._health_check = health_check
+        self._health_check_interval = health_check_interval
+        self._idle = deque()
+        self._created = 0
+        self._in_use = 0
+        self._closed = False
+        self._cond = threading.Condition()
+        self._stats = {
+            'checkouts': 0,
+            'waits': 0,
+            'total_wait': 0.0,
+            'max_wait': 0.0,
+            'timeouts': 0,
+            'reconnects': 0,
+            'discarded': 0
+        }
+
+    def acquire(self):
+        """
+        Check out a connection, waiting if the pool is exhausted.
+
+        Returns:
+            Connection: A healthy DB-API connection
+
+        Raises:
+            PoolTimeoutError: If no connection is available within the timeout
+        """
+        start = time.perf_counter()
+        deadline = start + self.timeout
+        conn = None
+        last_used = 0.0
+        with self._cond:
+            waited = False
+            while True:
+                if self._closed:
+                    raise PoolTimeoutError("Connection pool is closed")
+                if self._idle:
+                    conn, last_used = self._idle.pop()
+                    break
+                if self._created < self.size:
+                    self._created += 1
+                    break
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    self._stats['timeouts'] += 1
+                    raise PoolTimeoutError(f"No database connection available after {self.timeout}s")
+                waited = True
+                self._cond.wait(remaining)
+            self._in_use += 1
+            wait = time.perf_counter() - start
+            self._stats['checkouts'] += 1
+            self._stats['total_wait'] += wait
+            self._stats['max_wait'] = max(self._stats['max_wait'], wait)
+            if waited:
+                self._stats['waits'] += 1
+
+        try:
+            if conn is None:
+                conn = self._factory()
+            elif not self._is_healthy(conn, last_used):
+                self._close_quietly(conn)
+                conn = self._factory()
+                with self._cond:
+                    self._stats['reconnects'] += 1
+        except Exception:
+            with self._cond:
+                self._created -= 1
+                self._in_use -= 1
+                self._cond.notify()
+            raise
+        return conn
+
+    def release(self, conn, discard=False):
+        """
+        Return a connection to the pool.
+
+        Args:
+            conn (Connection): Connection previously obtained from ``acquire``
+            discard (bool): Close the connection instead of reusing it
+        """
+        with self._cond:
+            self._in_use -= 1
+            if discard or self._closed:
+                self._created -= 1
+                self._stats['discarded'] += 1
+            else:
+                self._idle.append((conn, time.monotonic()))
+            self._cond.notify()
+        if discard or self._closed:
+            self._close_quietly(conn)
+
+    @contextmanager
+    def connection(self):
+        """
+        Context manager that checks out a connection and always returns it.
+
+        If the body raises, the open transaction is rolled back. Connections
+        that cannot even be rolled back are discarded rather than reused.
+
+        Yields:
+            Connection: A pooled DB-API connection
+        """
+        conn = self.acquire()
+        try:
+            yield conn
+        except BaseException:
+            discard = False
+            try:
+                conn.rollback()
+            except Exception:
+                discard = True
+            self.release(conn, discard=discard)
+            raise
+        else:
+            self.release(conn)
+
+    def discard_idle(self):
+        """Close every idle connection, e.g. after the server has restarted."""
+        with self._cond:
+            idle = list(self._idle)
+            self._idle.clear()
+            self._created -= len(idle)
+            self._stats['discarded'] += len(idle)
+            self._cond.notify_all()
+        for conn, _ in idle:
+            self._close_quietly(conn)
+
+    def stats(self):
+        """
+        Return a snapshot of pool statistics.
+
+        Returns:
+            dict: Size, open/idle/in-use counts and checkout wait statistics
+        """
+        with self._cond:
+            stats = dict(self._stats)
+            stats.update({
+                'size': self.size,
+                'open': self._created,
+                'idle': len(self._idle),
+                'in_use': self._in_use
+            })
+        checkouts = stats['checkouts']
+        stats['avg_wait'] = stats['total_wait'] / checkouts if checkouts else 0.0
+        return stats
+
+    def close(self):
+        """Close all idle connections and refuse further checkouts."""
+        with self._cond:
+            self._closed = True
+        self.discard_idle()
+
+    def _is_healthy(self, conn, last_used):
+        """Run the health check on connections idle for longer than the interval."""
+        if self._health_check is None:
+            return True
+        if time.monotonic() - last_used < self._health_check_interval:
+            return True
+        try:
+            return bool(self._health_check(conn))
+        except Exception:
+            return False
+
+    @staticmethod
+    def _close_quietly(conn):
+        """Close a connection, ignoring errors from already-broken connections."""
+        try:
+            conn.close()
+        except Exception:
+            pass
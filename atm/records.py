@@ -0,0 +1,52 @@
+"""
+Row Records
+
+Lightweight record types returned by DatabaseManager. They use ``__slots__``
+so a looked-up row costs one small object instead of a pandas DataFrame.
+
+Author: ATM Project Team
+Date: 2025
+"""
+
+
+class CustomerRecord:
+    """A single row of the ``customers`` table."""
+
+    __slots__ = ('acc_no', 'cname', 'bank_name', 'pin', 'balance')
+
+    # Column list matching the slot order, used to build SELECT statements
+    COLUMNS = 'acc_no, cname, bank_name, pin, balance'
+
+    def __init__(self, acc_no, cname, bank_name, pin, balance=0):
+        """
+        Initialize a customer record.
+
+        Args:
+            acc_no (str): Customer account number
+            cname (str): Account holder name
+            bank_name (str): Bank name
+            pin (str): Hashed PIN
+            balance (int): Current account balance
+        """
+        self.acc_no = acc_no
+        self.cname = cname
+        self.bank_name = bank_name
+        self.pin = pin
+        self.balance = balance
+
+    @classmethod
+    def from_row(cls, row):
+        """
+        Build a record from a database row selected with ``COLUMNS``.
+
+        Args:
+            row (tuple): Row values in ``COLUMNS`` order
+
+        Returns:
+            CustomerRecord: The customer record
+        """
+        return cls(*row)
+
+    def __repr__(self):
+        # The PIN hash is deliberately left out so records are safe to log
+        return f"CustomerRecord(acc_no={self.acc_no!r}, cname={self.cname!r}, bank_name={self.bank_name!r}, balance={self.balance!r})"
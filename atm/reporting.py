@@ -0,0 +1,381 @@
+"""
+Ledger Reporting
+
+Operational reports across all accounts, computed with pandas:
+
+    - daily totals: number and sum of debits and credits per day
+    - bank volumes: the same per bank (bank_name of the customer)
+    - unusual withdrawals: debits far above the account's own history
+
+The ledger is read in id-ordered chunks (DatabaseManager.iter_ledger). Each
+chunk is turned into typed columns once (int64 amounts, datetime64 times) and
+reduced with groupby to a small summary of (day, bank, stat) -> count, total
+plus running per-account withdrawal statistics. Only those aggregates are
+kept, so memory does not grow with the ledger.
+
+Results are cached on disk (Parquet when pyarrow is installed, otherwise
+pickle) together with the id of the last ledger row processed. A refresh
+reads only newer rows and adds them to the cached aggregates. Rows younger
+than ``settle_seconds`` are left for the next refresh, so a transaction that
+committed after a row with a higher id is not skipped.
+
+A withdrawal is unusual when its account already has ``min_history`` earlier
+withdrawals and the amount exceeds their mean by more than ``z_threshold``
+standard deviations. Each row is judged only against the rows before it, so
+the result is the same whether the ledger is processed in one pass or many
+incremental refreshes.
+
+Author: ATM Project Team
+Date: 2025
+"""
+
+import importlib.util
+import json
+import os
+import time
+from datetime import datetime, timedelta
+import numpy as np
+import pandas as pd
+
+UNKNOWN_BANK = "Unknown"
+SUMMARY_KEYS = ['day', 'bank_name', 'stat']
+
+
+def ledger_frame(rows, banks):
+    """
+    Convert one ledger chunk into a typed DataFrame.
+
+    Args:
+        rows (list): (id, acc_no, amount, stat, time) tuples
+        banks (dict): acc_no -> bank_name
+
+    Returns:
+        DataFrame: id, acc_no, amount (int64), stat, time (datetime64), day, bank_name
+    """
+    ids, accounts, amounts, stats, times = zip(*rows)
+    frame = pd.DataFrame({
+        'id': np.asarray(ids, dtype=np.int64),
+        'acc_no': np.asarray(accounts, dtype=object),
+        'amount': pd.to_numeric(pd.Series(amounts), errors='coerce').fillna(0).astype(np.int64).to_numpy(),
+        'stat': pd.Categorical(stats, categories=['DEBIT', 'CREDIT']),
+        'time': pd.to_datetime(pd.Series(times))
+    })
+    frame['day'] = frame['time'].dt.normalize()
+    frame['bank_name'] = frame['acc_no'].map(banks).fillna(UNKNOWN_BANK)
+    return frame
+
+
+def summarize(frame):
+    """
+    Reduce a ledger frame to (day, bank_name, stat) -> count, total.
+
+    Returns:
+        DataFrame: One row per group
+    """
+    return (frame.groupby(SUMMARY_KEYS, observed=True)['amount']
+            .agg(count='count', total='sum')
+            .reset_index())
+
+
+def flag_withdrawals(debits, history, z_threshold, min_history, min_amount):
+    """
+    Find unusual withdrawals in a chunk and fold the chunk into the history.
+
+    For every debit the count, sum and sum of squares of the account's earlier
+    debits are the cached history plus the running totals within the chunk
+    (cumulative groupby sums), so the whole chunk is scored without a loop.
+
+    Args:
+        debits (DataFrame): Debit rows of one chunk, in id order
+        history (DataFrame): Per-account n, sum, sumsq of earlier debits (index acc_no)
+        z_threshold (float): Standard deviations above the mean that count as unusual
+        min_history (int): Earlier debits an account needs before it is scored
+        min_amount (int): Smaller withdrawals are never flagged
+
+    Returns:
+        tuple: (flagged rows, updated history)
+    """
+    amounts = debits['amount'].astype(np.float64)
+    squares = amounts ** 2
+    grouped = amounts.groupby(debits['acc_no'])
+    grouped_squares = squares.groupby(debits['acc_no'])
+    base = history.reindex(debits['acc_no'].to_numpy()).fillna(0.0)
+    prior_n = base['n'].to_numpy() + grouped.cumcount().to_numpy()
+    prior_sum = base['sum'].to_numpy() + (grouped.cumsum() - amounts).to_numpy()
+    prior_sumsq = base['sumsq'].to_numpy() + (grouped_squares.cumsum() - squares).to_numpy()
+    with np.errstate(divide='ignore', invalid='ignore'):
+        mean = prior_sum / prior_n
+        std = np.sqrt(np.maximum(prior_sumsq / prior_n - mean ** 2, 0.0))
+        zscore = (amounts.to_numpy() - mean) / std
+    unusual = ((prior_n >= min_history) & (amounts.to_numpy() >= min_amount) & (std > 0)
+               & (zscore > z_threshold))
+    flagged = debits.loc[unusual, ['id', 'acc_no', 'bank_name', 'amount', 'time']].copy()
+    flagged['mean'] = mean[unusual]
+    flagged['zscore'] = zscore[unusual]
+
+    chunk = pd.DataFrame({'n': grouped.count().astype(np.float64), 'sum': grouped.sum(),
+                          'sumsq': grouped_squares.sum()})
+    history = history.add(chunk, fill_value=0.0)
+    history.index.name = 'acc_no'
+    return flagged, history
+
+
+def cache_format():
+    """Return 'parquet' if a Parquet engine is installed, else 'pickle'."""
+    if importlib.util.find_spec('pyarrow') or importlib.util.find_spec('fastparquet'):
+        return 'parquet'
+    return 'pickle'
+
+
+class ReportCache:
+    """
+    Cached report aggregates: one file per table plus meta.json.
+
+    Every save writes a new generation of table files and then replaces
+    meta.json, which names the current generation and the ledger watermark,
+    so an interrupted save leaves the previous cache intact.
+    """
+
+    TABLES = ('summary', 'history', 'anomalies')
+
+    def __init__(self, directory, fmt=None):
+        """
+        Args:
+            directory (str): Cache directory
+            fmt (str): 'parquet' or 'pickle' (defaults to parquet when available)
+        """
+        self.directory = directory
+        self.fmt = fmt or cache_format()
+
+    def _path(self, table, generation, fmt):
+        extension = 'parquet' if fmt == 'parquet' else 'pkl'
+        return os.path.join(self.directory, f"{table}-{generation}.{extension}")
+
+    def load(self):
+        """
+        Read the cached aggregates.
+
+        Returns:
+            tuple: (meta dict, {table: DataFrame}), or (None, None) if there is no cache
+        """
+        try:
+            with open(os.path.join(self.directory, 'meta.json'), encoding='utf-8') as meta_file:
+                meta = json.load(meta_file)
+        except FileNotFoundError:
+            return None, None
+        tables = {}
+        for table in self.TABLES:
+            path = self._path(table, meta['generation'], meta['format'])
+            tables[table] = pd.read_parquet(path) if meta['format'] == 'parquet' else pd.read_pickle(path)
+        return meta, tables
+
+    def save(self, meta, tables):
+        """
+        Write a new generation of the cache and make it current.
+
+        Args:
+            meta (dict): Watermark and refresh details
+            tables (dict): {table: DataFrame}
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        previous = None
+        try:
+            with open(os.path.join(self.directory, 'meta.json'), encoding='utf-8') as meta_file:
+                previous = json.load(meta_file)
+        except FileNotFoundError:
+            pass
+        generation = (previous['generation'] + 1) if previous else 1
+        for table in self.TABLES:
+            path = self._path(table, generation, self.fmt)
+            if self.fmt == 'parquet':
+                tables[table].to_parquet(path)
+            else:
+                tables[table].to_pickle(path)
+        meta = dict(meta, generation=generation, format=self.fmt)
+        tmp_path = os.path.join(self.directory, 'meta.json.tmp')
+        with open(tmp_path, 'w', encoding='utf-8') as meta_file:
+            json.dump(meta, meta_file, indent=2)
+        os.replace(tmp_path, os.path.join(self.directory, 'meta.json'))
+        if previous:
+            for table in self.TABLES:
+                try:
+                    os.remove(self._path(table, previous['generation'], previous['format']))
+                except FileNotFoundError:
+                    pass
+
+
+def empty_tables():
+    """Return the aggregate tables of an empty ledger."""
+    return {
+        'summary': pd.DataFrame({'day': pd.Series(dtype='datetime64[ns]'), 'bank_name': pd.Series(dtype=object),
+                                 'stat': pd.Series(dtype=object), 'count': pd.Series(dtype=np.int64),
+                                 'total': pd.Series(dtype=np.int64)}),
+        'history': pd.DataFrame({'n': pd.Series(dtype=np.float64), 'sum': pd.Series(dtype=np.float64),
+                                 'sumsq': pd.Series(dtype=np.float64)}, index=pd.Index([], name='acc_no')),
+        'anomalies': pd.DataFrame({'id': pd.Series(dtype=np.int64), 'acc_no': pd.Series(dtype=object),
+                                   'bank_name': pd.Series(dtype=object), 'amount': pd.Series(dtype=np.int64),
+                                   'time': pd.Series(dtype='datetime64[ns]'), 'mean': pd.Series(dtype=np.float64),
+                                   'zscore': pd.Series(dtype=np.float64)})
+    }
+
+
+class LedgerReport:
+    """
+    Incrementally maintained ledger aggregates and the reports built from them.
+    """
+
+    def __init__(self, db_manager, cache_dir=None, z_threshold=4.0, min_history=10, min_amount=0,
+                 settle_seconds=60.0):
+        """
+        Initialize the report.
+
+        Args:
+            db_manager (DatabaseManager): Database access layer
+            cache_dir (str): Directory of the on-disk cache (None keeps results in memory only)
+            z_threshold (float): Standard deviations above an account's mean that count as unusual
+            min_history (int): Earlier withdrawals an account needs before it is scored
+            min_amount (int): Withdrawals below this amount are never flagged
+            settle_seconds (float): Ledger rows younger than this wait for the next refresh
+        """
+        self.db_manager = db_manager
+        self.cache = ReportCache(cache_dir) if cache_dir else None
+        self.z_threshold = z_threshold
+        self.min_history = min_history
+        self.min_amount = min_amount
+        self.settle_seconds = settle_seconds
+        self.meta = {'last_id': 0, 'rows': 0}
+        self.tables = empty_tables()
+        if self.cache is not None:
+            meta, tables = self.cache.load()
+            if meta is not None and meta.get('params') == self._params():
+                self.meta, self.tables = meta, tables
+
+    @classmethod
+    def from_config(cls, db_manager, config):
+        """
+        Build a LedgerReport from a REPORT_CONFIG-style dict.
+
+        Args:
+            db_manager (DatabaseManager): Database access layer
+            config (dict): Cache directory and anomaly settings
+
+        Returns:
+            LedgerReport: The report
+        """
+        return cls(db_manager, config.get('cache_dir') or None, config.get('z_threshold', 4.0),
+                   config.get('min_history', 10), config.get('min_amount', 0), config.get('settle_seconds', 60.0))
+
+    def _params(self):
+        # Cached anomalies are only valid for the settings they were computed with
+        return {'z_threshold': self.z_threshold, 'min_history': self.min_history, 'min_amount': self.min_amount}
+
+    def refresh(self, chunk_size=50000, rebuild=False):
+        """
+        Fold ledger rows added since the last refresh into the aggregates.
+
+        Args:
+            chunk_size (int): Ledger rows read per query
+            rebuild (bool): Discard the cached aggregates and scan the whole ledger
+
+        Returns:
+            int: Number of ledger rows processed
+        """
+        if rebuild:
+            self.meta, self.tables = {'last_id': 0, 'rows': 0}, empty_tables()
+        cutoff = pd.Timestamp(datetime.now() - timedelta(seconds=self.settle_seconds))
+        banks = self.db_manager.get_bank_names()
+        summaries = [self.tables['summary']]
+        anomalies = [self.tables['anomalies']]
+        history = self.tables['history']
+        processed = 0
+        start = time.perf_counter()
+        for rows in self.db_manager.iter_ledger(self.meta['last_id'], chunk_size):
+            frame = ledger_frame(rows, banks)
+            unsettled = np.flatnonzero(frame['time'].to_numpy() > cutoff.to_datetime64())
+            if len(unsettled):
+                frame = frame.iloc[:unsettled[0]]
+            if len(frame):
+                summaries.append(summarize(frame))
+                debits = frame[frame['stat'] == 'DEBIT']
+                if len(debits):
+                    flagged, history = flag_withdrawals(debits, history, self.z_threshold, self.min_history,
+                                                        self.min_amount)
+                    anomalies.append(flagged)
+                self.meta['last_id'] = int(frame['id'].iloc[-1])
+                processed += len(frame)
+            if len(unsettled):
+                break
+
+        if processed:
+            summary = pd.concat([s for s in summaries if len(s)], ignore_index=True)
+            summary['stat'] = summary['stat'].astype(str)
+            self.tables = {
+                'summary': summary.groupby(SUMMARY_KEYS, as_index=False)[['count', 'total']].sum(),
+                'history': history,
+                'anomalies': pd.concat([a for a in anomalies if len(a)] or [anomalies[0]], ignore_index=True)
+            }
+        self.meta['rows'] += processed
+        self.meta['refreshed_at'] = datetime.now().isoformat(timespec='seconds')
+        self.meta['refresh_seconds'] = round(time.perf_counter() - start, 3)
+        self.meta['params'] = self._params()
+        if self.cache is not None:
+            self.cache.save(self.meta, self.tables)
+        return processed
+
+    def _window(self, frame, column, start, end):
+        if start is not None:
+            frame = frame[frame[column] >= pd.Timestamp(start)]
+        if end is not None:
+            frame = frame[frame[column] < pd.Timestamp(end)]
+        return frame
+
+    def _pivot(self, summary, index):
+        table = summary.pivot_table(index=index, columns='stat', values=['count', 'total'], aggfunc='sum',
+                                    fill_value=0)
+        table.columns = [f"{stat.lower()}_{value}" for value, stat in table.columns]
+        for column in ('debit_count', 'debit_total', 'credit_count', 'credit_total'):
+            if column not in table.columns:
+                table[column] = 0
+        table = table[['debit_count', 'debit_total', 'credit_count', 'credit_total']].astype(np.int64)
+        table['net'] = table['credit_total'] - table['debit_total']
+        return table
+
+    def daily_totals(self, start=None, end=None):
+        """
+        Debit and credit counts and totals per day.
+
+        Args:
+            start (datetime): First day included
+            end (datetime): Days from this one on are excluded
+
+        Returns:
+            DataFrame: Indexed by day
+        """
+        return self._pivot(self._window(self.tables['summary'], 'day', start, end), 'day')
+
+    def bank_volumes(self, start=None, end=None):
+        """
+        Debit and credit counts and totals per bank.
+
+        Args:
+            start (datetime): First day included
+            end (datetime): Days from this one on are excluded
+
+        Returns:
+            DataFrame: Indexed by bank_name, largest debit volume first
+        """
+        table = self._pivot(self._window(self.tables['summary'], 'day', start, end), 'bank_name')
+        return table.sort_values('debit_total', ascending=False)
+
+    def unusual_withdrawals(self, start=None, end=None):
+        """
+        Withdrawals far above their account's earlier withdrawals.
+
+        Args:
+            start (datetime): Only withdrawals at or after this time
+            end (datetime): Only withdrawals before this time
+
+        Returns:
+            DataFrame: id, acc_no, bank_name, amount, time, mean, zscore; highest zscore first
+        """
+        return self._window(self.tables['anomalies'], 'time', start, end).sort_values('zscore', ascending=False)
@@ -0,0 +1,162 @@
+"""
+Database Schema
+
+DDL for the ATM database, shared by SQL/CreateTable.py and the migration
+scripts so every tool creates exactly the same tables.
+
+Tables:
+    - customers: one row per account holder, including the running balance
+    - transactions: a single ledger for all accounts, keyed by (acc_no, time)
+      and hash-partitioned on acc_no
+    - idempotency_keys: client request keys of applied transactions and their
+      results, so retried withdrawals are not applied twice
+    - otp_codes: pending PIN-change OTPs when OTP_STORE=database (see atm.otp)
+
+The SQLite backend (atm.backends) uses equivalent SQLite DDL; pass
+``dialect='sqlite'`` to create_schema.
+
+Author: ATM Project Team
+Date: 2025
+"""
+
+CREATE_CUSTOMERS = '''create table if not exists customers (
+acc_no varchar(20) primary key,
+cname varchar(255) not null,
+bank_name varchar(255),
+pin varchar(255) not null,
+balance bigint not null default 0
+);'''
+
+# Columns added after the first release, applied to existing databases by upgrade_schema
+UPGRADE_COLUMNS = [
+    ('customers', 'balance', 'alter table customers add column balance bigint not null default 0;')
+]
+
+# InnoDB requires the AUTO_INCREMENT column to lead an index, and every unique
+# key of a partitioned table to contain the partitioning column (acc_no).
+CREATE_TRANSACTIONS = '''create table if not exists transactions (
+id bigint not null auto_increment,
+acc_no varchar(20) not null,
+amount bigint not null,
+stat enum('DEBIT', 'CREDIT') not null,
+time timestamp(6) not null default current_timestamp(6),
+primary key (acc_no, time, id),
+key idx_transactions_id (id),
+key idx_transactions_time (time)
+)
+partition by key (acc_no) partitions 16;'''
+
+# Progress table for SQL/MigrateLedger.py; one row per migrated cus<acc_no> table
+CREATE_LEDGER_MIGRATION = '''create table if not exists ledger_migration (
+table_name varchar(64) primary key,
+row_count bigint not null,
+skipped bigint not null,
+migrated_at timestamp not null default current_timestamp
+);'''
+
+# One row per applied keyed transaction; SQL/Maintenance.py purge-keys drops old rows
+CREATE_IDEMPOTENCY_KEYS = '''create table if not exists idempotency_keys (
+idem_key varchar(64) primary key,
+acc_no varchar(20) not null,
+amount bigint not null,
+stat enum('DEBIT', 'CREDIT') not null,
+balance bigint,
+created_at timestamp not null default current_timestamp,
+key idx_idempotency_created (created_at)
+);'''
+
+CREATE_OTP_CODES = '''create table if not exists otp_codes (
+otp_key varchar(64) primary key,
+acc_no varchar(20) not null,
+digest char(64) not null,
+attempts int not null default 0,
+expires_at double not null,
+key idx_otp_expires (expires_at)
+);'''
+
+SCHEMA = [CREATE_CUSTOMERS, CREATE_TRANSACTIONS, CREATE_IDEMPOTENCY_KEYS, CREATE_OTP_CODES]
+
+# SQLite equivalents: customers is clustered on acc_no (without rowid), and the
+# ledger's rowid is its id, with the (acc_no, time, id) key as a covering index
+SQLITE_CREATE_CUSTOMERS = '''create table if not exists customers (
+acc_no varchar(20) primary key,
+cname varchar(255) not null,
+bank_name varchar(255),
+pin varchar(255) not null,
+balance bigint not null default 0
+) without rowid;'''
+
+SQLITE_CREATE_TRANSACTIONS = '''create table if not exists transactions (
+id integer primary key,
+acc_no varchar(20) not null,
+amount bigint not null,
+stat varchar(6) not null check (stat in ('DEBIT', 'CREDIT')),
+time timestamp not null default (strftime('%Y-%m-%d %H:%M:%f', 'now', 'localtime'))
+);'''
+
+SQLITE_CREATE_IDEMPOTENCY_KEYS = '''create table if not exists idempotency_keys (
+idem_key varchar(64) primary key,
+acc_no varchar(20) not null,
+amount bigint not null,
+stat varchar(6) not null,
+balance bigint,
+created_at timestamp not null default (strftime('%Y-%m-%d %H:%M:%f', 'now', 'localtime'))
+);'''
+
+SQLITE_CREATE_OTP_CODES = '''create table if not exists otp_codes (
+otp_key varchar(64) primary key,
+acc_no varchar(20) not null,
+digest char(64) not null,
+attempts int not null default 0,
+expires_at double not null
+);'''
+
+SQLITE_SCHEMA = [
+    SQLITE_CREATE_CUSTOMERS,
+    SQLITE_CREATE_TRANSACTIONS,
+    'create index if not exists idx_transactions_account on transactions (acc_no, time, id, amount, stat);',
+    'create index if not exists idx_transactions_time on transactions (time);',
+    SQLITE_CREATE_IDEMPOTENCY_KEYS,
+    'create index if not exists idx_idempotency_created on idempotency_keys (created_at);',
+    SQLITE_CREATE_OTP_CODES,
+    'create index if not exists idx_otp_expires on otp_codes (expires_at);'
+]
+
+# Valid values of transactions.stat
+TRANSACTION_TYPES = ('DEBIT', 'CREDIT')
+
+
+def create_schema(cursor, dialect='mysql'):
+    """
+    Create all ATM tables that do not exist yet and add missing columns.
+
+    Args:
+        cursor (Cursor): Cursor on a connection to the ATM database
+        dialect (str): 'mysql' or 'sqlite'
+    """
+    for statement in SQLITE_SCHEMA if dialect == 'sqlite' else SCHEMA:
+        cursor.execute(statement)
+    upgrade_schema(cursor, dialect)
+
+
+def upgrade_schema(cursor, dialect='mysql'):
+    """
+    Add columns introduced after a database was first created.
+
+    Newly added balance columns start at 0; run SQL/ReconcileBalances.py --fix
+    to backfill them from the ledger.
+
+    Args:
+        cursor (Cursor): Cursor on a connection to the ATM database
+        dialect (str): 'mysql' or 'sqlite'
+    """
+    for table, column, statement in UPGRADE_COLUMNS:
+        if dialect == 'sqlite':
+            cursor.execute(f"pragma table_info({table});")
+            exists = any(row[1] == column for row in cursor.fetchall())
+        else:
+            cursor.execute('''select count(*) from information_schema.columns
+where table_schema = database() and table_name = %s and column_name = %s;''', (table, column))
+            exists = cursor.fetchone()[0] > 0
+        if not exists:
+            cursor.execute(statement)
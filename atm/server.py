@@ -0,0 +1,251 @@
+"""
+ATM Network Service
+
+Serves the ATMEngine to thin-client terminals over a JSON-over-TCP protocol,
+so many terminals share one process and one small database connection pool
+instead of each opening its own connections.
+
+Protocol:
+    Each request and response is one JSON object on its own line.
+
+    Request:  {"id": 1, "op": "withdraw", "session_id": "...", "amount": "500", "pin": "1234",
+               "idempotency_key": "..."}
+    Success:  {"id": 1, "ok": true, "result": {"balance": 9500}}
+    Failure:  {"id": 1, "ok": false, "error": "InvalidPinError", "message": "Invalid PIN."}
+
+Operations:
+    open_session(acc_no), close_session(session_id), withdraw(session_id, amount, pin, idempotency_key),
+    request_otp(session_id), verify_otp(session_id, otp), change_pin(session_id, pin),
+    passbook(session_id, limit), stats()
+
+    A withdraw result with a null balance was accepted offline (see atm.journal).
+
+The asyncio loop only parses and routes requests; engine calls run on a
+thread pool sized to the database pool.
+
+Usage:
+    python -m atm.server [--host 127.0.0.1] [--port 8765]
+
+Author: ATM Project Team
+Date: 2025
+"""
+
+import argparse
+import asyncio
+import json
+from concurrent.futures import ThreadPoolExecutor
+from atm.account_index import AccountIndex
+from atm.config import (DB_CONFIG, ACCOUNT_INDEX_PRELOAD, SERVER_CONFIG, PIN_HASH_CONFIG, METRICS_CONFIG, OTP_CONFIG,
+                        JOURNAL_CONFIG)
+from atm.credentials import PinHasher
+from atm.database import DatabaseManager
+from atm.engine import ATMEngine, EngineError
+from atm.journal import Journal, JournalReplayer
+from atm.metrics import METRICS, start_exporters
+from atm.otp import OTPService
+
+
+class ATMServer:
+    """
+    Asyncio JSON-over-TCP front-end for an ATMEngine.
+    """
+
+    def __init__(self, engine, host='127.0.0.1', port=8765, workers=5):
+        """
+        Initialize the server.
+
+        Args:
+            engine (ATMEngine): Engine that executes the operations
+            host (str): Address to bind
+            port (int): Port to bind (0 picks a free port)
+            workers (int): Threads running blocking engine calls
+        """
+        self.engine = engine
+        self.host = host
+        self.port = port
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='atm-server')
+        self._server = None
+        self.handlers = {
+            'open_session': self.op_open_session,
+            'close_session': self.op_close_session,
+            'withdraw': self.op_withdraw,
+            'request_otp': self.op_request_otp,
+            'verify_otp': self.op_verify_otp,
+            'change_pin': self.op_change_pin,
+            'passbook': self.op_passbook,
+            'stats': self.op_stats
+        }
+
+    # -------------------------------------------------------------------------
+    # Operations (run on the worker threads)
+    # -------------------------------------------------------------------------
+
+    def op_open_session(self, request):
+        session = self.engine.open_session(request['acc_no'])
+        customer = session.customer
+        return {
+            'session_id': session.session_id,
+            'acc_no': customer.acc_no,
+            'cname': customer.cname,
+            'bank_name': customer.bank_name
+        }
+
+    def op_close_session(self, request):
+        self.engine.close_session(request['session_id'])
+        return {}
+
+    def op_withdraw(self, request):
+        session = self.engine.get_session(request['session_id'])
+        return {'balance': self.engine.withdraw(session, request['amount'], request['pin'],
+                                                request.get('idempotency_key'))}
+
+    def op_request_otp(self, request):
+        self.engine.request_otp(self.engine.get_session(request['session_id']))
+        return {}
+
+    def op_verify_otp(self, request):
+        self.engine.verify_otp(self.engine.get_session(request['session_id']), request['otp'])
+        return {}
+
+    def op_change_pin(self, request):
+        self.engine.change_pin(self.engine.get_session(request['session_id']), request['pin'])
+        return {}
+
+    def op_passbook(self, request):
+        session = self.engine.get_session(request['session_id'])
+        rows = self.engine.mini_statement(session, int(request.get('limit', 10)))
+        return {'transactions': [
+            {'amount': int(amount), 'stat': stat, 'time': str(stamp)} for amount, stat, stamp in rows
+        ]}
+
+    def op_stats(self, request):
+        db_manager = self.engine.db_manager
+        return {
+            'sessions': self.engine.active_sessions,
+            'pool': db_manager.pool_stats(),
+            'cache': db_manager.cache_stats(),
+            'writes': db_manager.write_stats(),
+            'pin_cache': self.engine.pin_hasher.cache_stats(),
+            'otp': self.engine.otp_service.stats(),
+            'journal': self.engine.journal.stats() if self.engine.journal is not None else {},
+            'metrics': METRICS.snapshot()
+        }
+
+    # -------------------------------------------------------------------------
+    # Networking
+    # -------------------------------------------------------------------------
+
+    async def dispatch(self, request):
+        """
+        Route one decoded request to its handler on the thread pool.
+
+        Args:
+            request (dict): Decoded request
+
+        Returns:
+            dict: Response object
+        """
+        response = {'id': request.get('id')}
+        handler = self.handlers.get(request.get('op'))
+        if handler is None:
+            response.update(ok=False, error='UnknownOperation', message=f"Unknown operation: {request.get('op')}")
+            return response
+        loop = asyncio.get_running_loop()
+        try:
+            result = await loop.run_in_executor(self._executor, handler, request)
+            response.update(ok=True, result=result)
+        except EngineError as e:
+            response.update(ok=False, error=type(e).__name__, message=str(e))
+        except KeyError as e:
+            response.update(ok=False, error='BadRequest', message=f"Missing field: {e}")
+        except Exception as e:
+            print(f"Error handling {request.get('op')}: {e}")
+            response.update(ok=False, error='ServerError', message="Transaction Failed. Please try again.")
+        return response
+
+    async def handle_client(self, reader, writer):
+        """Serve one terminal connection until it disconnects."""
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                try:
+                    request = json.loads(line)
+                    if not isinstance(request, dict):
+                        raise ValueError("request must be a JSON object")
+                except ValueError as e:
+                    response = {'id': None, 'ok': False, 'error': 'BadRequest', 'message': str(e)}
+                else:
+                    response = await self.dispatch(request)
+                writer.write(json.dumps(response).encode('utf-8') + b'\n')
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def start(self):
+        """
+        Start listening.
+
+        Returns:
+            tuple: The (host, port) actually bound
+        """
+        self._server = await asyncio.start_server(self.handle_client, self.host, self.port)
+        return self._server.sockets[0].getsockname()[:2]
+
+    async def serve_forever(self):
+        """Start listening and serve until cancelled."""
+        host, port = await self.start()
+        print(f"ATM server listening on {host}:{port}")
+        async with self._server:
+            await self._server.serve_forever()
+
+    async def stop(self):
+        """Stop listening and shut down the worker threads."""
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+        self._executor.shutdown(wait=False)
+
+
+def main():
+    """Run the ATM server against the database configured in .env."""
+    parser = argparse.ArgumentParser(description="Serve the ATM engine to thin-client terminals")
+    parser.add_argument('--host', default=SERVER_CONFIG['host'])
+    parser.add_argument('--port', type=int, default=SERVER_CONFIG['port'])
+    parser.add_argument('--workers', type=int, default=SERVER_CONFIG['workers'])
+    args = parser.parse_args()
+
+    exporters = start_exporters(METRICS_CONFIG)
+    db_manager = DatabaseManager(DB_CONFIG)
+    account_index = AccountIndex(db_manager, preload=ACCOUNT_INDEX_PRELOAD)
+    if ACCOUNT_INDEX_PRELOAD:
+        account_index.load()
+    pin_hasher = PinHasher.from_config(PIN_HASH_CONFIG)
+    otp_service = OTPService.from_config(OTP_CONFIG, db_manager)
+    journal = replayer = None
+    if JOURNAL_CONFIG['enabled']:
+        journal = Journal.from_config(JOURNAL_CONFIG)
+        replayer = JournalReplayer(journal, db_manager, JOURNAL_CONFIG['replay_interval'])
+        replayer.start()
+    engine = ATMEngine(db_manager, account_index, otp_service, pin_hasher=pin_hasher, journal=journal)
+    server = ATMServer(engine, args.host, args.port, args.workers)
+    try:
+        asyncio.run(server.serve_forever())
+    except KeyboardInterrupt:
+        pass
+    finally:
+        pin_hasher.close()
+        otp_service.close()
+        if replayer is not None:
+            replayer.close()
+            journal.close()
+        db_manager.close()
+        for exporter in exporters:
+            exporter.close()
+
+
+if __name__ == "__main__":
+    main()
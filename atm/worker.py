@@ -0,0 +1,140 @@
+"""
+Background Database Worker
+
+Runs blocking database operations on a thread pool so the Tkinter main loop
+never waits on the database. Results are handed back through a queue that the
+main loop drains with ``root.after``, so callbacks always run on the Tk thread.
+
+Each operation can carry a timeout. When it expires, or when the operation is
+cancelled, its callbacks are dropped. A query that is already running cannot be
+interrupted; it finishes in the background and its result is discarded.
+
+Author: ATM Project Team
+Date: 2025
+"""
+
+import itertools
+import queue
+import time
+from concurrent.futures import ThreadPoolExecutor
+from atm.metrics import METRICS
+
+
+class OperationTimeoutError(Exception):
+    """Raised (passed to on_error) when a background operation exceeds its timeout."""
+
+
+class BackgroundTask:
+    """Handle for one operation submitted to the DBWorker."""
+
+    def __init__(self, task_id, future, deadline, on_success, on_error):
+        self.task_id = task_id
+        self.future = future
+        self.deadline = deadline
+        self.on_success = on_success
+        self.on_error = on_error
+        self.cancelled = False
+        self.submitted_at = time.perf_counter()
+
+    def cancel(self):
+        """Cancel the task; its callbacks will not run."""
+        self.cancelled = True
+        self.future.cancel()
+
+
+class DBWorker:
+    """
+    Thread pool for database operations with Tk-thread result delivery.
+    """
+
+    def __init__(self, root, max_workers=4, default_timeout=15.0, poll_interval=20):
+        """
+        Initialize the worker and start polling for results.
+
+        Args:
+            root (tk.Tk): Tk root whose ``after`` drives result delivery
+            max_workers (int): Number of worker threads
+            default_timeout (float): Seconds before an operation times out (None for no limit)
+            poll_interval (int): Milliseconds between result queue polls
+        """
+        self.root = root
+        self.default_timeout = default_timeout
+        self.poll_interval = poll_interval
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='atm-db')
+        self._results = queue.Queue()
+        self._pending = {}
+        self._ids = itertools.count(1)
+        self._closed = False
+        self.root.after(self.poll_interval, self._poll)
+
+    def submit(self, operation, *args, on_success=None, on_error=None, timeout=None):
+        """
+        Run an operation on a worker thread.
+
+        Args:
+            operation (callable): Blocking function to run
+            *args: Arguments passed to the operation
+            on_success (callable): Called on the Tk thread with the result
+            on_error (callable): Called on the Tk thread with the exception
+            timeout (float): Seconds before giving up; defaults to ``default_timeout``
+
+        Returns:
+            BackgroundTask: Handle that can be used to cancel the operation
+        """
+        timeout = self.default_timeout if timeout is None else timeout
+        deadline = time.monotonic() + timeout if timeout else None
+        future = self._executor.submit(operation, *args)
+        task = BackgroundTask(next(self._ids), future, deadline, on_success, on_error)
+        self._pending[task.task_id] = task
+        future.add_done_callback(lambda _: self._results.put(task))
+        return task
+
+    def cancel_all(self):
+        """Cancel every pending operation; none of their callbacks will run."""
+        for task in self._pending.values():
+            task.cancel()
+        self._pending.clear()
+
+    @property
+    def busy(self):
+        """True while any operation is pending."""
+        return bool(self._pending)
+
+    def shutdown(self):
+        """Cancel pending operations and stop the worker threads."""
+        self._closed = True
+        self.cancel_all()
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def _poll(self):
+        """Deliver finished results and expire timed-out tasks (Tk thread only)."""
+        if self._closed:
+            return
+        while True:
+            try:
+                task = self._results.get_nowait()
+            except queue.Empty:
+                break
+            if task.cancelled or self._pending.pop(task.task_id, None) is None:
+                continue
+            # Submit-to-delivery time (worker + queue + poll delay), then time spent in the Tk callback
+            delivered = time.perf_counter()
+            METRICS.observe('atm_ui_task_seconds', delivered - task.submitted_at)
+            error = task.future.exception()
+            if error is None:
+                if task.on_success:
+                    task.on_success(task.future.result())
+            elif task.on_error:
+                task.on_error(error)
+            METRICS.observe('atm_ui_callback_seconds', time.perf_counter() - delivered)
+
+        now = time.monotonic()
+        for task in [t for t in self._pending.values() if t.deadline and t.deadline <= now]:
+            if self._pending.pop(task.task_id, None) is None:
+                continue
+            task.cancel()
+            METRICS.inc('atm_errors_total', 'ui_timeout')
+            if task.on_error:
+                task.on_error(OperationTimeoutError("The operation timed out"))
+
+        self.root.after(self.poll_interval, self._poll)
@@ -0,0 +1,238 @@
+"""
+Group-Commit Write Pipeline
+
+Queues ledger writes and PIN updates from many threads and commits them in
+groups: a batch is closed when it reaches ``max_batch`` requests or when the
+oldest request has waited ``max_delay`` seconds, whichever comes first. Each
+batch runs in one database transaction with a single bulk ``executemany``
+ledger insert and one COMMIT, so one fsync covers the whole batch.
+
+Callers receive a Future that resolves only after their batch has committed.
+Requests that fail on their own (e.g. insufficient funds) are rejected
+individually without affecting the rest of the batch. Ledger writes with an
+idempotency key that was already applied resolve to the original result
+without being applied again. A database error fails
+every request of the batch, since none of it was committed.
+
+Author: ATM Project Team
+Date: 2025
+"""
+
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+from atm.ledger import (INSERT_TRANSACTION, UPDATE_PIN, IdempotencyConflictError, InsufficientFundsError,
+                        UnknownAccountError, apply_balance_change, apply_idempotent_change)
+from atm.metrics import METRICS
+
+# Request kinds
+LEDGER = 'ledger'
+PIN = 'pin'
+
+
+class WriteRequest:
+    """One queued write and the Future its caller is waiting on."""
+
+    __slots__ = ('kind', 'args', 'key', 'future', 'enqueued_at')
+
+    def __init__(self, kind, args, key=None):
+        self.kind = kind
+        self.args = args
+        self.key = key
+        self.future = Future()
+        self.enqueued_at = time.perf_counter()
+
+
+class GroupCommitWriter:
+    """
+    Background writer that batches writes into group commits.
+    """
+
+    def __init__(self, pool, max_batch=100, max_delay=0.005, integrity_errors=()):
+        """
+        Initialize the writer and start its thread.
+
+        Args:
+            pool (ConnectionPool): Pool the writer checks its connection out of
+            max_batch (int): Maximum requests per commit
+            max_delay (float): Maximum seconds a request waits for its batch to close
+            integrity_errors (tuple): The driver's duplicate-key exception classes
+        """
+        self.pool = pool
+        self.integrity_errors = integrity_errors
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self._queue = queue.Queue()
+        self._closed = False
+        self._submit_lock = threading.Lock()  # Orders submissions against the close sentinel
+        self._stats_lock = threading.Lock()
+        self._commit_latencies = deque(maxlen=1000)
+        self._stats = {
+            'batches': 0,
+            'requests': 0,
+            'rejected': 0,
+            'failed_batches': 0,
+            'replayed': 0,
+            'max_batch_size': 0,
+            'total_commit_time': 0.0,
+            'total_wait_time': 0.0
+        }
+        self._thread = threading.Thread(target=self._run, name='atm-group-commit', daemon=True)
+        self._thread.start()
+
+    def submit_transaction(self, acc_no, amount, transaction_type, idempotency_key=None):
+        """
+        Queue a ledger write.
+
+        Args:
+            acc_no (str): Customer account number
+            amount (int): Transaction amount
+            transaction_type (str): Type of transaction (DEBIT/CREDIT)
+            idempotency_key (str): Client key; a key already applied resolves to its original balance
+
+        Returns:
+            Future: Resolves to the new balance once the batch is durable
+        """
+        return self._submit(LEDGER, (acc_no, int(amount), transaction_type), idempotency_key)
+
+    def submit_pin_update(self, acc_no, new_pin):
+        """
+        Queue a PIN update.
+
+        Args:
+            acc_no (str): Customer account number
+            new_pin (str): New hashed PIN
+
+        Returns:
+            Future: Resolves to True once the batch is durable
+        """
+        return self._submit(PIN, (acc_no, new_pin))
+
+    def _submit(self, kind, args, key=None):
+        request = WriteRequest(kind, args, key)
+        with self._submit_lock:
+            if self._closed:
+                raise RuntimeError("Write pipeline is closed")
+            self._queue.put(request)
+        return request.future
+
+    def _run(self):
+        """Collect batches and commit them until closed."""
+        while True:
+            request = self._queue.get()
+            if request is None:
+                break
+            batch = [request]
+            deadline = request.enqueued_at + self.max_delay
+            stop = False
+            while len(batch) < self.max_batch:
+                remaining = deadline - time.perf_counter()
+                try:
+                    request = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if request is None:
+                    stop = True
+                    break
+                batch.append(request)
+            self._commit(batch)
+            if stop:
+                break
+
+    def _commit(self, batch):
+        """Apply one batch in a single transaction and resolve its futures."""
+        results = []
+        ledger_rows = []
+        replayed = 0
+        start = time.perf_counter()
+        try:
+            with self.pool.connection() as conn:
+                cursor = conn.cursor()
+                try:
+                    for request in batch:
+                        if request.kind == PIN:
+                            cursor.execute(UPDATE_PIN, (request.args[1], request.args[0]))
+                            results.append((request, True, None))
+                            continue
+                        try:
+                            if request.key is not None:
+                                balance, replay = apply_idempotent_change(cursor, request.key, *request.args,
+                                                                          self.integrity_errors)
+                                if replay:
+                                    replayed += 1
+                                    results.append((request, balance, None))
+                                    continue
+                            else:
+                                balance = apply_balance_change(cursor, *request.args)
+                        except (InsufficientFundsError, UnknownAccountError, IdempotencyConflictError) as e:
+                            results.append((request, None, e))
+                            continue
+                        ledger_rows.append(request.args)
+                        results.append((request, balance, None))
+                    if ledger_rows:
+                        cursor.executemany(INSERT_TRANSACTION, ledger_rows)
+                    conn.commit()
+                finally:
+                    cursor.close()
+        except Exception as e:
+            with self._stats_lock:
+                self._stats['failed_batches'] += 1
+            METRICS.inc('atm_errors_total', 'group_commit')
+            for request in batch:
+                request.future.set_exception(e)
+            return
+
+        committed = time.perf_counter()
+        commit_time = committed - start
+        METRICS.observe('atm_db_commit_seconds', commit_time, 'group_commit')
+        with self._stats_lock:
+            self._stats['batches'] += 1
+            self._stats['requests'] += len(batch)
+            self._stats['replayed'] += replayed
+            self._stats['max_batch_size'] = max(self._stats['max_batch_size'], len(batch))
+            self._stats['total_commit_time'] += commit_time
+            self._stats['total_wait_time'] += sum(committed - r.enqueued_at for r in batch)
+            self._commit_latencies.append(commit_time)
+            self._stats['rejected'] += sum(1 for _, _, error in results if error is not None)
+        for request, result, error in results:
+            if error is None:
+                request.future.set_result(result)
+            else:
+                request.future.set_exception(error)
+
+    def stats(self):
+        """
+        Return a snapshot of pipeline metrics.
+
+        Returns:
+            dict: Batch counts and sizes, commit latency and queue depth
+        """
+        with self._stats_lock:
+            stats = dict(self._stats)
+            latencies = sorted(self._commit_latencies)
+        batches = stats['batches']
+        stats['queue_depth'] = self._queue.qsize()
+        stats['avg_batch_size'] = stats['requests'] / batches if batches else 0.0
+        stats['avg_commit_latency'] = stats['total_commit_time'] / batches if batches else 0.0
+        stats['avg_request_latency'] = stats['total_wait_time'] / stats['requests'] if stats['requests'] else 0.0
+        stats['p99_commit_latency'] = latencies[int(0.99 * (len(latencies) - 1))] if latencies else 0.0
+        return stats
+
+    def close(self):
+        """Commit everything still queued and stop the writer thread."""
+        with self._submit_lock:
+            if self._closed:
+                return
+            self._closed = True
+            self._queue.put(None)
+        self._thread.join()
+        # Nothing can follow the sentinel now, but never leave a caller waiting on a future
+        while True:
+            try:
+                request = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if request is not None and not request.future.done():
+                request.future.set_exception(RuntimeError("Write pipeline is closed"))
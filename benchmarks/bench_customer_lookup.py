@@ -0,0 +1,139 @@
+"""
+Customer Lookup Benchmark
+
+Compares the old pandas-based customer lookup (``pd.read_sql`` followed by
+``iloc[0].to_list()``) against the parameterized point query that returns a
+``CustomerRecord``, and reports p50/p99 latency for both.
+
+By default the benchmark runs against a throwaway SQLite database so it needs
+no server. Pass ``--backend mysql`` to run against the database in .env.
+
+Usage:
+    python benchmarks/bench_customer_lookup.py --customers 100000 --lookups 5000
+"""
+
+import argparse
+import os
+import random
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pandas as pd
+from atm.records import CustomerRecord
+
+
+def percentile(samples, pct):
+    """Return the given percentile (0-100) of a list of samples."""
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def time_lookups(lookup, accounts):
+    """Run lookup for each account and return per-call latencies in microseconds."""
+    samples = []
+    for acc_no in accounts:
+        start = time.perf_counter()
+        lookup(acc_no)
+        samples.append((time.perf_counter() - start) * 1e6)
+    return samples
+
+
+def build_sqlite(path, customers):
+    """Create and populate a SQLite stand-in for the customers table."""
+    conn = sqlite3.connect(path)
+    conn.execute('''create table customers (
+acc_no varchar(20) primary key,
+cname varchar(255) not null,
+bank_name varchar(255),
+pin varchar(255) not null,
+balance bigint not null default 0
+);''')
+    rows = ((str(100000 + i), f"Customer {i}", "State Bank Of India", "0" * 64, 100000) for i in range(customers))
+    conn.executemany("INSERT INTO customers VALUES (?, ?, ?, ?, ?)", rows)
+    conn.commit()
+    return conn
+
+
+def sqlite_lookups(conn):
+    """Return (pandas_lookup, record_lookup) callables for SQLite."""
+    def pandas_lookup(acc_no):
+        return pd.read_sql(f"SELECT * FROM customers WHERE acc_no = '{acc_no}';", conn).iloc[0].to_list()
+
+    query = f"SELECT {CustomerRecord.COLUMNS} FROM customers WHERE acc_no = ?"
+
+    def record_lookup(acc_no):
+        row = conn.execute(query, (acc_no,)).fetchone()
+        return CustomerRecord.from_row(row) if row else None
+
+    return pandas_lookup, record_lookup
+
+
+def mysql_lookups():
+    """Return (pandas_lookup, record_lookup, accounts, close) for the configured MySQL database."""
+    from sqlalchemy import create_engine
+    from atm.config import DB_CONFIG
+    from atm.database import DatabaseManager
+
+    engine = create_engine(f'mysql+mysqlconnector://{DB_CONFIG["user"]}:{DB_CONFIG["password"]}@{DB_CONFIG["host"]}/{DB_CONFIG["database"]}')
+    db_manager = DatabaseManager(DB_CONFIG)
+
+    def pandas_lookup(acc_no):
+        return pd.read_sql(f"SELECT * FROM customers WHERE acc_no = '{acc_no}';", engine).iloc[0].to_list()
+
+    def close():
+        db_manager.close()
+        engine.dispose()
+
+    return pandas_lookup, db_manager.get_customer_details, db_manager.get_customer_list(), close
+
+
+def report(name, samples):
+    """Print a one-line latency summary."""
+    print(f"{name:<20} p50={percentile(samples, 50):9.1f}us  p99={percentile(samples, 99):9.1f}us  "
+          f"mean={statistics.fmean(samples):9.1f}us  n={len(samples)}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark customer lookups: pandas vs. point query")
+    parser.add_argument('--backend', choices=['sqlite', 'mysql'], default='sqlite')
+    parser.add_argument('--customers', type=int, default=100000, help="Synthetic customers (sqlite only)")
+    parser.add_argument('--lookups', type=int, default=5000, help="Lookups per variant")
+    args = parser.parse_args()
+
+    if args.backend == 'sqlite':
+        tmpdir = tempfile.TemporaryDirectory()
+        conn = build_sqlite(os.path.join(tmpdir.name, 'bench.db'), args.customers)
+        pandas_lookup, record_lookup = sqlite_lookups(conn)
+        accounts = [str(100000 + i) for i in range(args.customers)]
+
+        def close():
+            conn.close()
+            tmpdir.cleanup()
+    else:
+        pandas_lookup, record_lookup, accounts, close = mysql_lookups()
+
+    try:
+        sample = [random.choice(accounts) for _ in range(args.lookups)]
+        # Warm up both paths so imports and statement caches are not measured
+        time_lookups(pandas_lookup, sample[:50])
+        time_lookups(record_lookup, sample[:50])
+
+        pandas_samples = time_lookups(pandas_lookup, sample)
+        record_samples = time_lookups(record_lookup, sample)
+    finally:
+        close()
+
+    report("pandas read_sql", pandas_samples)
+    report("point query", record_samples)
+    print(f"p50 speedup: {percentile(pandas_samples, 50) / percentile(record_samples, 50):.1f}x  "
+          f"p99 speedup: {percentile(pandas_samples, 99) / percentile(record_samples, 99):.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+"""
+PIN Hashing Benchmark
+
+Measures the cost of verifying a PIN with each hashing scheme and parameter
+set, so the PIN_HASH_* settings can be chosen to fit the per-request latency
+budget. For every candidate it reports:
+    - p50/p99 latency of one verification in the calling thread
+    - verifications per second through a PinHasher process pool under
+      concurrent load, and the p99 latency callers see while queued
+    - the latency of a cached verification
+
+The strongest candidate whose pooled p99 fits within --budget-ms is
+recommended at the end.
+
+Usage:
+    python benchmarks/bench_pin_hashing.py --budget-ms 100 --workers 4 --concurrency 16
+"""
+
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from atm.credentials import PinHasher, Pbkdf2Hasher, ScryptHasher, Sha256Hasher
+
+CANDIDATES = [
+    ('sha256 (legacy)', Sha256Hasher(), "PIN_HASH_SCHEME=sha256"),
+    ('pbkdf2 i=100000', Pbkdf2Hasher(100000), "PIN_HASH_SCHEME=pbkdf2 PIN_HASH_PBKDF2_ITERATIONS=100000"),
+    ('pbkdf2 i=600000', Pbkdf2Hasher(600000), "PIN_HASH_SCHEME=pbkdf2 PIN_HASH_PBKDF2_ITERATIONS=600000"),
+    ('scrypt n=4096', ScryptHasher(4096), "PIN_HASH_SCHEME=scrypt PIN_HASH_SCRYPT_N=4096"),
+    ('scrypt n=16384', ScryptHasher(16384), "PIN_HASH_SCHEME=scrypt PIN_HASH_SCRYPT_N=16384"),
+    ('scrypt n=32768', ScryptHasher(32768), "PIN_HASH_SCHEME=scrypt PIN_HASH_SCRYPT_N=32768"),
+    ('scrypt n=65536', ScryptHasher(65536), "PIN_HASH_SCHEME=scrypt PIN_HASH_SCRYPT_N=65536"),
+]
+
+
+def percentile(samples, pct):
+    """Return the given percentile (0-100) of a list of samples."""
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def timed(function, *args):
+    """Call function and return its latency in milliseconds."""
+    start = time.perf_counter()
+    function(*args)
+    return (time.perf_counter() - start) * 1000
+
+
+def bench_candidate(hasher, samples, workers, concurrency):
+    """
+    Benchmark one hasher.
+
+    Returns:
+        dict: Inline, pooled and cached latency figures
+    """
+    encoded = hasher.hash("1234")
+
+    inline = PinHasher(hasher, workers=0, cache_size=0)
+    inline_ms = [timed(inline.verify, "1234", encoded) for _ in range(samples)]
+
+    pooled = PinHasher(hasher, workers=workers, cache_size=0)
+    pooled.verify("1234", encoded)  # start the worker processes outside the timing
+    requests = samples * 4
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as callers:
+        pooled_ms = list(callers.map(lambda _: timed(pooled.verify, "1234", encoded), range(requests)))
+    elapsed = time.perf_counter() - start
+    pooled.close()
+
+    cached = PinHasher(hasher, workers=0)
+    cached.verify("1234", encoded)
+    cached_ms = [timed(cached.verify, "1234", encoded) for _ in range(samples)]
+
+    return {
+        'inline_p50': percentile(inline_ms, 50),
+        'inline_p99': percentile(inline_ms, 99),
+        'pooled_rate': requests / elapsed,
+        'pooled_p99': percentile(pooled_ms, 99),
+        'cached_p50': percentile(cached_ms, 50)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark PIN hashing schemes and parameters")
+    parser.add_argument('--samples', type=int, default=20, help="Verifications timed per candidate")
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 2, help="PinHasher worker processes")
+    parser.add_argument('--concurrency', type=int, default=8, help="Concurrent callers in the pooled test")
+    parser.add_argument('--budget-ms', type=float, default=100.0, help="Per-request latency budget for PIN checks")
+    args = parser.parse_args()
+
+    print(f"{'scheme':<18}{'inline p50':>12}{'inline p99':>12}{'pooled/s':>10}{'pooled p99':>12}{'cached':>10}")
+    recommended = None
+    for name, hasher, settings in CANDIDATES:
+        result = bench_candidate(hasher, args.samples, args.workers, args.concurrency)
+        print(f"{name:<18}{result['inline_p50']:>10.2f}ms{result['inline_p99']:>10.2f}ms"
+              f"{result['pooled_rate']:>10.0f}{result['pooled_p99']:>10.2f}ms{result['cached_p50']:>8.3f}ms")
+        if not isinstance(hasher, Sha256Hasher) and result['pooled_p99'] <= args.budget_ms:
+            recommended = (name, settings)
+
+    print()
+    if recommended:
+        print(f"Strongest setting within {args.budget_ms:.0f}ms p99 at concurrency {args.concurrency}: {recommended[0]}")
+        print(f"  {recommended[1]} PIN_HASH_WORKERS={args.workers}")
+    else:
+        print(f"No salted scheme fits {args.budget_ms:.0f}ms p99 at concurrency {args.concurrency}; "
+              "add workers or lower the concurrency")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,302 @@
+"""
+ATM Load Test
+
+Drives concurrent customer sessions through the ATMEngine against a synthetic
+customer base and reports throughput and p50/p95/p99 latency per operation:
+
+    - validate:   open a session (account validation and customer lookup)
+    - withdraw:   PIN check and debit
+    - pin_change: request OTP, verify it, set the PIN
+    - passbook:   write the account's passbook to a CSV file
+
+By default the customers live in a throwaway embedded SQLite database, so no
+server is needed. ``--backend mysql`` loads them into the database in .env
+(account numbers prefixed "LT") and removes them again afterwards.
+
+Results are written as JSON. Pass ``--compare`` with an earlier result file to
+print the change per operation; the exit status is 1 if any p99 or throughput
+regressed by more than ``--threshold`` percent.
+
+Usage:
+    python benchmarks/load_test.py --customers 10000 --sessions 16 --duration 30 --output results.json
+    python benchmarks/load_test.py --output new.json --compare results.json
+"""
+
+import argparse
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from atm.account_index import AccountIndex
+from atm.backends import SQLiteBackend, make_backend
+from atm.config import DB_CONFIG, PIN_HASH_CONFIG, POOL_CONFIG, WRITE_CONFIG
+from atm.credentials import PinHasher, make_hasher
+from atm.database import DatabaseManager
+from atm.engine import ATMEngine
+from atm.otp import OTPService, TokenBucketLimiter
+from atm.passbook import generate_passbook
+
+OPERATIONS = ('validate', 'withdraw', 'pin_change', 'passbook')
+PIN = "1234"
+
+
+def percentile(samples, pct):
+    """Return the given percentile (0-100) of a list of samples."""
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def seed_customers(backend, count, history, prefix, distinct_hashes):
+    """
+    Create synthetic customers with an opening balance and some ledger history.
+
+    Hashing is the expensive part of onboarding, so a small pool of PIN hashes
+    (all for the same PIN, each with its own salt) is shared between customers.
+
+    Returns:
+        list: The account numbers created
+    """
+    hasher = make_hasher(PIN_HASH_CONFIG)
+    hashes = [hasher.hash(PIN) for _ in range(distinct_hashes)]
+    accounts = [f"{prefix}{i:08d}" for i in range(count)]
+    connection = backend.connect()
+    cursor = connection.cursor()
+    backend.create_schema(cursor)
+    for start in range(0, count, 5000):
+        batch = accounts[start:start + 5000]
+        cursor.executemany("insert into customers(acc_no, cname, bank_name, pin, balance) values(%s, %s, %s, %s, %s)",
+                           [(acc_no, f"Customer {acc_no}", "State Bank Of India", hashes[i % distinct_hashes], 10 ** 12)
+                            for i, acc_no in enumerate(batch)])
+        cursor.executemany("insert into transactions(acc_no, amount, stat) values(%s, %s, %s)",
+                           [(acc_no, random.randint(1, 5000), random.choice(('DEBIT', 'CREDIT')))
+                            for acc_no in batch for _ in range(history)])
+        connection.commit()
+    cursor.close()
+    connection.close()
+    return accounts
+
+
+def remove_customers(backend, prefix):
+    """Delete the synthetic customers and their ledger rows."""
+    connection = backend.connect()
+    cursor = connection.cursor()
+    cursor.execute("delete from transactions where acc_no like %s", (prefix + '%',))
+    cursor.execute("delete from customers where acc_no like %s", (prefix + '%',))
+    connection.commit()
+    cursor.close()
+    connection.close()
+
+
+class LoadTest:
+    """Runs customer sessions on several threads and collects per-operation latencies."""
+
+    def __init__(self, engine, db_manager, accounts, weights, passbook_dir):
+        self.engine = engine
+        self.db_manager = db_manager
+        self.accounts = accounts
+        self.weights = weights
+        self.passbook_dir = passbook_dir
+        self.otps = {}
+        self.samples = {name: [] for name in OPERATIONS}
+        self.errors = {name: 0 for name in OPERATIONS}
+        self.lock = threading.Lock()
+        # Capture OTPs instead of printing them; the limiter is kept in the path
+        # but sized so repeat visits to an account are never refused
+        engine.otp_service = OTPService(delivery=self.otps.__setitem__, limiter=TokenBucketLimiter(1000.0, 1000))
+
+    def timed(self, name, operation, *args):
+        """Run one operation and record its latency (ms) or failure."""
+        start = time.perf_counter()
+        try:
+            result = operation(*args)
+        except Exception:
+            with self.lock:
+                self.errors[name] += 1
+            return None
+        elapsed = (time.perf_counter() - start) * 1000
+        with self.lock:
+            self.samples[name].append(elapsed)
+        return result
+
+    def change_pin(self, session):
+        self.engine.request_otp(session)
+        self.engine.verify_otp(session, self.otps.pop(session.acc_no))
+        self.engine.change_pin(session, PIN)
+
+    def passbook(self, session):
+        return generate_passbook(self.db_manager, session.acc_no, self.passbook_dir, 'csv')
+
+    def run_session(self, rng):
+        """One customer visit: validate the account, then one weighted operation."""
+        session = self.timed('validate', self.engine.open_session, rng.choice(self.accounts))
+        if session is None:
+            return
+        operation = rng.choices(OPERATIONS[1:], self.weights)[0]
+        if operation == 'withdraw':
+            self.timed('withdraw', self.engine.withdraw, session, rng.randint(1, 100), PIN)
+        elif operation == 'pin_change':
+            self.timed('pin_change', self.change_pin, session)
+        else:
+            self.timed('passbook', self.passbook, session)
+        self.engine.close_session(session.session_id)
+
+    def run(self, sessions, duration, seed):
+        """Run ``sessions`` concurrent terminals for ``duration`` seconds."""
+        deadline = time.monotonic() + duration
+
+        def terminal(index):
+            rng = random.Random(seed + index)
+            while time.monotonic() < deadline:
+                self.run_session(rng)
+
+        threads = [threading.Thread(target=terminal, args=(i,)) for i in range(sessions)]
+        start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return time.perf_counter() - start
+
+    def results(self, elapsed):
+        """Summarise the collected samples per operation."""
+        summary = {}
+        for name in OPERATIONS:
+            samples = self.samples[name]
+            if not samples:
+                summary[name] = {'count': 0, 'errors': self.errors[name]}
+                continue
+            summary[name] = {
+                'count': len(samples),
+                'errors': self.errors[name],
+                'throughput': len(samples) / elapsed,
+                'p50_ms': percentile(samples, 50),
+                'p95_ms': percentile(samples, 95),
+                'p99_ms': percentile(samples, 99),
+                'mean_ms': sum(samples) / len(samples),
+                'max_ms': max(samples)
+            }
+        return summary
+
+
+def git_commit():
+    """Return the current git commit, or None outside a checkout."""
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)), check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results, baseline_path, threshold):
+    """
+    Print the change of every operation against a baseline result file.
+
+    Returns:
+        bool: True if any operation regressed by more than ``threshold`` percent
+    """
+    with open(baseline_path, encoding='utf-8') as baseline_file:
+        baseline = json.load(baseline_file)
+    print(f"\nCompared with {baseline_path} (commit {baseline['meta'].get('commit')}):")
+    regressed = False
+    for name in OPERATIONS:
+        new, old = results['operations'].get(name, {}), baseline['operations'].get(name, {})
+        if not new.get('count') or not old.get('count'):
+            continue
+        p99 = (new['p99_ms'] / old['p99_ms'] - 1) * 100
+        rate = (new['throughput'] / old['throughput'] - 1) * 100
+        flag = ''
+        if p99 > threshold or rate < -threshold:
+            flag = '  REGRESSION'
+            regressed = True
+        print(f"  {name:<12} p99 {old['p99_ms']:8.2f} -> {new['p99_ms']:8.2f}ms ({p99:+6.1f}%)  "
+              f"throughput {old['throughput']:8.1f} -> {new['throughput']:8.1f}/s ({rate:+6.1f}%){flag}")
+    return regressed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load-test the ATM transaction paths")
+    parser.add_argument('--backend', choices=['sqlite', 'mysql'], default='sqlite')
+    parser.add_argument('--customers', type=int, default=10000, help="Synthetic customers")
+    parser.add_argument('--history', type=int, default=20, help="Ledger rows per synthetic customer")
+    parser.add_argument('--sessions', type=int, default=8, help="Concurrent terminals")
+    parser.add_argument('--duration', type=float, default=20.0, help="Seconds to run")
+    parser.add_argument('--mix', default='70,10,20', help="Weights of withdraw,pin_change,passbook")
+    parser.add_argument('--pin-hashes', type=int, default=64, help="Distinct PIN hashes shared by the customers")
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--output', help="Write the results to this JSON file")
+    parser.add_argument('--compare', help="Earlier result file to compare against")
+    parser.add_argument('--threshold', type=float, default=10.0, help="Regression threshold in percent")
+    args = parser.parse_args()
+
+    weights = [float(weight) for weight in args.mix.split(',')]
+    random.seed(args.seed)
+    tmpdir = tempfile.TemporaryDirectory()
+    prefix = 'LT'
+    if args.backend == 'sqlite':
+        backend = SQLiteBackend(os.path.join(tmpdir.name, 'load.db'))
+    else:
+        backend = make_backend({'backend': 'mysql'}, DB_CONFIG)
+
+    print(f"Seeding {args.customers} customers ({args.backend})...")
+    accounts = seed_customers(backend, args.customers, args.history, prefix, args.pin_hashes)
+    write_config = dict(WRITE_CONFIG, enabled=WRITE_CONFIG['enabled'] or args.backend == 'sqlite')
+    pool_config = dict(POOL_CONFIG, size=max(POOL_CONFIG['size'], args.sessions))
+    db_manager = DatabaseManager(DB_CONFIG, pool_config, write_config=write_config, backend=backend)
+    account_index = AccountIndex(db_manager)
+    account_index.load()
+    pin_hasher = PinHasher.from_config(PIN_HASH_CONFIG)
+    engine = ATMEngine(db_manager, account_index, pin_hasher=pin_hasher)
+
+    load_test = LoadTest(engine, db_manager, accounts, weights, os.path.join(tmpdir.name, 'passbooks'))
+    print(f"Running {args.sessions} sessions for {args.duration:.0f}s...")
+    try:
+        elapsed = load_test.run(args.sessions, args.duration, args.seed)
+    finally:
+        pin_hasher.close()
+        db_manager.close()
+        if args.backend == 'mysql':
+            remove_customers(backend, prefix)
+        tmpdir.cleanup()
+
+    results = {
+        'meta': {
+            'commit': git_commit(),
+            'timestamp': datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'elapsed_s': elapsed,
+            'args': vars(args),
+            'pin_hash': {key: PIN_HASH_CONFIG[key] for key in ('scheme', 'scrypt_n', 'pbkdf2_iterations', 'workers')},
+            'group_commit': write_config['enabled']
+        },
+        'operations': load_test.results(elapsed)
+    }
+
+    print(f"\n{'operation':<12}{'count':>8}{'errors':>8}{'ops/s':>10}{'p50':>10}{'p95':>10}{'p99':>10}")
+    for name, stats in results['operations'].items():
+        if stats['count']:
+            print(f"{name:<12}{stats['count']:>8}{stats['errors']:>8}{stats['throughput']:>10.1f}"
+                  f"{stats['p50_ms']:>8.2f}ms{stats['p95_ms']:>8.2f}ms{stats['p99_ms']:>8.2f}ms")
+        else:
+            print(f"{name:<12}{0:>8}{stats['errors']:>8}")
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as output:
+            json.dump(results, output, indent=2, default=str)
+        print(f"\nResults written to {args.output}")
+
+    if args.compare and compare(results, args.compare, args.threshold):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,265 @@
+"""
+Withdrawal Stress Test
+
+Hammers a few accounts with concurrent debits through DatabaseManager and
+checks that no money is lost or created. Every withdrawal carries an
+idempotency key, and a share of them is deliberately sent again: straight
+after the first attempt, and from other threads while the first attempt may
+still be in flight, the way a terminal retries after a timeout.
+
+After the run the ledger is checked per account:
+    - the balance never went negative (sampled during the run and at the end)
+    - final balance == opening balance - sum of the applied debits
+    - one ledger row per applied idempotency key, so no retry debited twice
+    - every attempt with the same key saw the same result
+
+By default the accounts live in a throwaway embedded SQLite database.
+``--backend mysql`` uses the database in .env (account numbers prefixed "ST")
+and removes the accounts again afterwards. The exit status is 1 if any check
+fails.
+
+Usage:
+    python benchmarks/stress_withdrawals.py --accounts 10 --threads 16 --requests 500
+    python benchmarks/stress_withdrawals.py --backend mysql --duplicate-rate 0.3 --no-group-commit
+"""
+
+import argparse
+import collections
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+import uuid
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from atm.backends import SQLiteBackend, make_backend
+from atm.config import DB_CONFIG, POOL_CONFIG, WRITE_CONFIG
+from atm.credentials import hash_string
+from atm.database import DatabaseManager
+from atm.ledger import DatabaseUnavailableError, InsufficientFundsError
+
+PREFIX = 'ST'
+REJECTED = 'rejected'
+
+
+def seed_accounts(backend, count, balance):
+    """Create the test accounts with an opening balance and no history."""
+    accounts = [f"{PREFIX}{i:06d}" for i in range(count)]
+    connection = backend.connect()
+    cursor = connection.cursor()
+    backend.create_schema(cursor)
+    cursor.executemany("insert into customers(acc_no, cname, bank_name, pin, balance) values(%s, %s, %s, %s, %s)",
+                       [(acc_no, f"Stress {acc_no}", "State Bank Of India", hash_string("1234"), balance)
+                        for acc_no in accounts])
+    connection.commit()
+    cursor.close()
+    connection.close()
+    return accounts
+
+
+def remove_accounts(backend):
+    """Delete the test accounts, their ledger rows and their idempotency keys."""
+    connection = backend.connect()
+    cursor = connection.cursor()
+    for table in ('idempotency_keys', 'transactions', 'customers'):
+        cursor.execute(f"delete from {table} where acc_no like %s", (PREFIX + '%',))
+    connection.commit()
+    cursor.close()
+    connection.close()
+
+
+class StressTest:
+    """Concurrent keyed withdrawals with duplicate submissions."""
+
+    def __init__(self, db_manager, accounts, max_amount, duplicate_rate, attempts):
+        self.db_manager = db_manager
+        self.accounts = accounts
+        self.max_amount = max_amount
+        self.duplicate_rate = duplicate_rate
+        self.attempts = attempts
+        self.outcomes = collections.defaultdict(list)  # key -> results seen by every attempt
+        self.requests = {}  # key -> (acc_no, amount)
+        self.recent = collections.deque(maxlen=256)
+        self.lock = threading.Lock()
+        self.unresolved = 0
+
+    def withdraw(self, key, acc_no, amount):
+        """Send one keyed debit, retrying with the same key when the outcome is unknown."""
+        for _ in range(self.attempts):
+            try:
+                balance = self.db_manager.record_transaction(acc_no, amount, "DEBIT", key)
+            except InsufficientFundsError:
+                balance = REJECTED
+            except DatabaseUnavailableError:
+                continue
+            if balance is not None:
+                with self.lock:
+                    self.outcomes[key].append(balance)
+                return
+        with self.lock:
+            self.unresolved += 1
+
+    def terminal(self, seed, count):
+        rng = random.Random(seed)
+        for _ in range(count):
+            with self.lock:
+                duplicate = self.recent and rng.random() < self.duplicate_rate
+                if duplicate:
+                    key = rng.choice(self.recent)
+                else:
+                    key = uuid.uuid4().hex
+                    self.requests[key] = (rng.choice(self.accounts), rng.randint(1, self.max_amount))
+                    self.recent.append(key)
+                acc_no, amount = self.requests[key]
+            self.withdraw(key, acc_no, amount)
+            if not duplicate and rng.random() < self.duplicate_rate:
+                self.withdraw(key, acc_no, amount)  # immediate resend, as after a timeout
+
+    def run(self, threads, requests):
+        workers = [threading.Thread(target=self.terminal, args=(i, requests)) for i in range(threads)]
+        start = time.perf_counter()
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        return time.perf_counter() - start
+
+
+class BalanceMonitor(threading.Thread):
+    """Samples the lowest test balance while the stress test runs."""
+
+    def __init__(self, backend, interval):
+        super().__init__(daemon=True)
+        self.backend = backend
+        self.interval = interval
+        self.lowest = None
+        self.stopped = threading.Event()
+
+    def run(self):
+        connection = self.backend.connect()
+        cursor = connection.cursor()
+        while not self.stopped.wait(self.interval):
+            cursor.execute("select min(balance) from customers where acc_no like %s", (PREFIX + '%',))
+            (lowest,) = cursor.fetchone()
+            connection.commit()
+            if lowest is not None and (self.lowest is None or lowest < self.lowest):
+                self.lowest = lowest
+        cursor.close()
+        connection.close()
+
+
+def verify(backend, stress, opening_balance, lowest_seen):
+    """
+    Check the ledger against what the terminals were told.
+
+    Returns:
+        list: Descriptions of every failed check (empty if all passed)
+    """
+    failures = []
+    for key, results in stress.outcomes.items():
+        if len(set(results)) > 1:
+            failures.append(f"key {key} returned different results: {results}")
+
+    connection = backend.connect()
+    cursor = connection.cursor()
+    cursor.execute("select acc_no, balance from customers where acc_no like %s", (PREFIX + '%',))
+    balances = dict(cursor.fetchall())
+    cursor.execute("select acc_no, count(*), coalesce(sum(amount), 0) from transactions "
+                   "where acc_no like %s and stat = 'DEBIT' group by acc_no", (PREFIX + '%',))
+    ledger = {acc_no: (int(rows), int(total)) for acc_no, rows, total in cursor.fetchall()}
+    cursor.execute("select idem_key, acc_no, amount from idempotency_keys where acc_no like %s", (PREFIX + '%',))
+    stored_keys = {key: (acc_no, int(amount)) for key, acc_no, amount in cursor.fetchall()}
+    connection.commit()
+    cursor.close()
+    connection.close()
+
+    applied = collections.defaultdict(lambda: [0, 0])
+    for key, (acc_no, amount) in stored_keys.items():
+        applied[acc_no][0] += 1
+        applied[acc_no][1] += amount
+    for key, results in stress.outcomes.items():
+        if any(result != REJECTED for result in results) and key not in stored_keys:
+            failures.append(f"key {key} was reported as debited but is not recorded")
+        if all(result == REJECTED for result in results) and key in stored_keys:
+            failures.append(f"key {key} was reported as rejected but was debited")
+
+    for acc_no, balance in balances.items():
+        rows, total = ledger.get(acc_no, (0, 0))
+        keys, key_total = applied.get(acc_no, (0, 0))
+        if balance < 0:
+            failures.append(f"{acc_no}: negative balance {balance}")
+        if balance != opening_balance - total:
+            failures.append(f"{acc_no}: balance {balance} != {opening_balance} - ledger debits {total}")
+        if rows != keys or total != key_total:
+            failures.append(f"{acc_no}: {rows} ledger rows totalling {total} for {keys} keys totalling {key_total}")
+    if lowest_seen is not None and lowest_seen < 0:
+        failures.append(f"a balance of {lowest_seen} was observed during the run")
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Stress-test concurrent, retried withdrawals")
+    parser.add_argument('--backend', choices=['sqlite', 'mysql'], default='sqlite')
+    parser.add_argument('--accounts', type=int, default=10, help="Accounts shared by all threads")
+    parser.add_argument('--balance', type=int, default=50000, help="Opening balance per account")
+    parser.add_argument('--max-amount', type=int, default=500, help="Largest withdrawal")
+    parser.add_argument('--threads', type=int, default=16, help="Concurrent terminals")
+    parser.add_argument('--requests', type=int, default=300, help="New withdrawals per terminal")
+    parser.add_argument('--duplicate-rate', type=float, default=0.2,
+                        help="Share of requests sent again with the same key")
+    parser.add_argument('--attempts', type=int, default=3, help="Tries per request when the outcome is unknown")
+    parser.add_argument('--group-commit', action=argparse.BooleanOptionalAction, default=None,
+                        help="Batch ledger writes (default: DB_GROUP_COMMIT)")
+    args = parser.parse_args()
+
+    tmpdir = tempfile.TemporaryDirectory()
+    if args.backend == 'sqlite':
+        backend = SQLiteBackend(os.path.join(tmpdir.name, 'stress.db'))
+    else:
+        backend = make_backend({'backend': 'mysql'}, DB_CONFIG)
+        remove_accounts(backend)
+
+    accounts = seed_accounts(backend, args.accounts, args.balance)
+    group_commit = WRITE_CONFIG['enabled'] if args.group_commit is None else args.group_commit
+    write_config = dict(WRITE_CONFIG, enabled=group_commit)
+    pool_config = dict(POOL_CONFIG, size=max(POOL_CONFIG['size'], args.threads))
+    db_manager = DatabaseManager(DB_CONFIG, pool_config, write_config=write_config, backend=backend)
+    stress = StressTest(db_manager, accounts, args.max_amount, args.duplicate_rate, args.attempts)
+    monitor = BalanceMonitor(backend, 0.05)
+
+    print(f"{args.threads} threads x {args.requests} withdrawals on {args.accounts} accounts "
+          f"({args.backend}, group commit {'on' if group_commit else 'off'})...")
+    monitor.start()
+    try:
+        elapsed = stress.run(args.threads, args.requests)
+    finally:
+        monitor.stopped.set()
+        monitor.join()
+        db_manager.close()
+
+    try:
+        failures = verify(backend, stress, args.balance, monitor.lowest)
+    finally:
+        if args.backend == 'mysql':
+            remove_accounts(backend)
+        tmpdir.cleanup()
+
+    attempts = sum(len(results) for results in stress.outcomes.values())
+    debited = sum(1 for results in stress.outcomes.values() if results[0] != REJECTED)
+    rejected = len(stress.outcomes) - debited
+    print(f"{attempts} attempts for {len(stress.outcomes)} keys in {elapsed:.1f}s "
+          f"({attempts / elapsed:.0f}/s): {debited} debited, {rejected} rejected for insufficient funds, "
+          f"{attempts - len(stress.outcomes)} duplicates, {stress.unresolved} unresolved")
+    if failures:
+        print(f"\nFAILED ({len(failures)} problems):")
+        for failure in failures[:50]:
+            print(f"  {failure}")
+        sys.exit(1)
+    print("All balances and ledger rows are consistent.")
+
+
+if __name__ == "__main__":
+    main()
@@ -7,54 +7,59 @@ such as withdrawing money and setting up new PINs with OTP verification.
 
 Features:
     - Account number validation against a MySQL database
-    - Secure PIN handling with SHA-256 hashing
-    - Money withdrawal with balance tracking
+    - Salted, slow PIN hashing (scrypt or PBKDF2, see atm.credentials), with legacy
+      SHA-256 hashes upgraded at the customer's next login
+    - Money withdrawal with a maintained running balance and sufficient-funds check
     - PIN setup/change functionality with OTP verification
     - Dark theme GUI with modern interface design
-    - Real-time transaction logging to customer-specific tables
+    - Database calls run on background worker threads so the window never freezes
+    - Optional thin-client mode against the ATM network service (atm/server.py)
+    - Fast startup: the window appears at once; the database driver is imported
+      and the account index loaded in the background
+    - Real-time transaction logging to the shared transactions ledger
 
 Dependencies:
     - tkinter: GUI framework
-    - mysql.connector: MySQL database connectivity
-    - sqlalchemy: SQL toolkit and ORM
-    - pandas: Data manipulation and analysis
-    - hashlib: Secure hash and message digest algorithms
-    - random: Generate random numbers for OTP
+    - mysql.connector: MySQL database connectivity (pooled, see atm.database)
+    - python-dotenv: Configuration from the .env file
+    - atm.engine: Headless transaction engine holding all business logic
+
+Startup Timing:
+    Run with --startup-timing (or ATM_STARTUP_TIMING=1) to print how long the
+    imports, window construction, first paint, backend initialisation and
+    account index warm-up take; the application exits once warm-up is done.
+    ``python -X importtime window.py`` breaks the import phase down further.
 
 Database Requirements:
     - MySQL server running on localhost
     - Database named 'atm'
-    - Tables: 'customers' and individual customer transaction tables (cus{account_number})
+    - Tables: 'customers' and the shared 'transactions' ledger (see atm/schema.py)
 
 Author: ATM Project Team
 Date: 2025
 """
 
+import time
+_IMPORT_START = time.perf_counter()
+
+import os
+import sys
+import threading
 import tkinter as tk
+import uuid
 from tkinter import font, messagebox
-import random
-import mysql.connector as mycon
-from sqlalchemy import create_engine
-import pandas as pd
-import hashlib
-import os
-from dotenv import load_dotenv
+from atm.config import (DB_CONFIG, ACCOUNT_INDEX_PRELOAD, WORKER_CONFIG, SERVER_CONFIG, PIN_HASH_CONFIG, METRICS_CONFIG,
+                        OTP_CONFIG, JOURNAL_CONFIG)
+from atm.engine import EngineError
+from atm.metrics import start_exporters
+from atm.worker import DBWorker, OperationTimeoutError
 
-# Load environment variables from .env file
-load_dotenv()
+_IMPORT_END = time.perf_counter()
 
 # =============================================================================
 # CONSTANTS AND CONFIGURATION
 # =============================================================================
 
-# Database Configuration from environment variables
-DB_CONFIG = {
-    'host': os.getenv('DB_HOST', 'localhost'),
-    'user': os.getenv('DB_USER', 'root'),
-    'password': os.getenv('DB_PASSWORD', 'admin'),
-    'database': os.getenv('DB_NAME', 'atm')
-}
-
 # UI Color Theme (Dark Mode)
 UI_COLORS = {
     'bg_color': "#2c2c2c",          # Background color
@@ -67,156 +72,104 @@ UI_COLORS = {
     'button_fg_color': "#ffffff"    # Button foreground color (text)
 }
 
-# Application State Variables
-NEWPIN = 0
-OTP = ''
-cust_list = []
-acc_no = 0
-amount = 0
-
 # =============================================================================
-# UTILITY FUNCTIONS
+# DATABASE INITIALIZATION
 # =============================================================================
 
-def hash_string(input_string):
+# The transaction engine is created on first use, not at import time, so this
+# module imports without mysql.connector loaded or a reachable database:
+# a thin client of the ATM server when ATM_SERVER is set, otherwise a local
+# engine with its own database pool
+db_manager = None
+account_index = None
+engine = None
+journal_replayer = None
+_backend_lock = threading.Lock()
+
+def get_engine():
+    """Return the transaction engine, importing and creating the backend on first use."""
+    global db_manager, account_index, engine, journal_replayer
+    with _backend_lock:
+        if engine is None:
+            if SERVER_CONFIG['remote']:
+                from atm.client import RemoteEngine
+                engine = RemoteEngine.from_address(SERVER_CONFIG['remote'], SERVER_CONFIG['timeout'])
+            else:
+                from atm.account_index import AccountIndex
+                from atm.credentials import PinHasher
+                from atm.database import DatabaseManager
+                from atm.engine import ATMEngine
+                from atm.otp import OTPService
+                db_manager = DatabaseManager(DB_CONFIG)
+                account_index = AccountIndex(db_manager, preload=ACCOUNT_INDEX_PRELOAD)
+                journal = None
+                if JOURNAL_CONFIG['enabled']:
+                    from atm.journal import Journal, JournalReplayer
+                    journal = Journal.from_config(JOURNAL_CONFIG)
+                    journal_replayer = JournalReplayer(journal, db_manager, JOURNAL_CONFIG['replay_interval'])
+                    journal_replayer.start()
+                engine = ATMEngine(db_manager, account_index, OTPService.from_config(OTP_CONFIG, db_manager),
+                                   pin_hasher=PinHasher.from_config(PIN_HASH_CONFIG), journal=journal)
+        return engine
+
+def call_engine(method, *args):
+    """Call an engine method, creating the backend first if needed (worker threads only)."""
+    return getattr(get_engine(), method)(*args)
+
+def warm_up(timer=None):
     """
-    Hash a password string using SHA-256 algorithm.
-    
+    Create the backend and preload the account index (runs on a worker thread).
+
     Args:
-        input_string (str): The input string to be hashed
-        
-    Returns:
-        str: The first 128 characters of the hexadecimal hash digest
-        
-    Note:
-        Uses SHA-256 hashing algorithm for secure password storage.
-        Only returns first 128 characters to match database field size.
+        timer (StartupTimer): Records the phases when startup timing is enabled
     """
-    hasher = hashlib.sha256()
-    hasher.update(input_string.encode('utf-8'))
-    hashed_string = hasher.hexdigest()[:128]    
-    return hashed_string
+    get_engine()
+    if timer:
+        timer.mark('backend init')
+    if account_index is not None and ACCOUNT_INDEX_PRELOAD:
+        account_index.load()
+        if timer:
+            timer.mark('account index')
+
+def close_backend():
+    """Close the database pool, or the server connection in thin-client mode."""
+    if engine is None:
+        return
+    if db_manager is not None:
+        engine.pin_hasher.close()
+        engine.otp_service.close()
+        if journal_replayer is not None:
+            journal_replayer.close()
+            engine.journal.close()
+        db_manager.close()
+    else:
+        engine.close()
 
 # =============================================================================
-# DATABASE CONNECTION CLASS
+# STARTUP TIMING
 # =============================================================================
 
-class DatabaseManager:
-    """
-    Manages database connections and operations for the ATM system.
-    
-    This class encapsulates all database-related functionality including
-    connection management, customer data retrieval, and transaction logging.
-    """
-    
-    def __init__(self, config):
-        """
-        Initialize database connection with provided configuration.
-        
-        Args:
-            config (dict): Database configuration containing host, user, password, database
-        """
-        self.config = config
-        self.connection = None
-        self.cursor = None
-        self.engine = None
-        self.connect()
-    
-    def connect(self):
-        """
-        Establish connections to MySQL database.
-        
-        Creates both mysql.connector connection for direct SQL operations
-        and SQLAlchemy engine for pandas operations.
-        """
-        try:
-            self.connection = mycon.connect(**self.config)
-            self.cursor = self.connection.cursor()
-            conn_str = f'mysql+mysqlconnector://{self.config["user"]}:{self.config["password"]}@{self.config["host"]}/{self.config["database"]}'
-            self.engine = create_engine(conn_str)
-        except Exception as e:
-            print(f"Database connection error: {e}")
-            raise
+class StartupTimer:
+    """Records how long each startup phase takes, measured from the first import."""
     
-    def get_customer_list(self):
-        """
-        Retrieve list of all customer account numbers.
-        
-        Returns:
-            list: List of customer account numbers
-        """
-        try:
-            query = "SELECT * FROM customers;"
-            df_customers = pd.read_sql(query, self.engine)
-            return df_customers['acc_no'].to_list()
-        except Exception as e:
-            print(f"Error loading customer list: {e}")
-            return []
-    
-    def get_customer_details(self, acc_no):
-        """
-        Retrieve customer details by account number.
-        
-        Args:
-            acc_no (str): Customer account number
+    def __init__(self):
+        self.phases = [('imports', _IMPORT_END - _IMPORT_START)]
+        self.last = _IMPORT_END
+        self.lock = threading.Lock()
+        
+    def mark(self, phase):
+        """Record the time since the previous mark as the given phase."""
+        with self.lock:
+            now = time.perf_counter()
+            self.phases.append((phase, now - self.last))
+            self.last = now
             
-        Returns:
-            list: Customer details as a list [acc_no, name, bank, pin, ...]
-        """
-        try:
-            query = f"SELECT * FROM customers WHERE acc_no = '{acc_no}';"
-            df_details = pd.read_sql(query, self.engine)
-            return df_details.iloc[0].to_list()
-        except Exception as e:
-            print(f"Error getting customer details: {e}")
-            return []
-    
-    def record_transaction(self, acc_no, amount, transaction_type):
-        """
-        Record a transaction in the customer's transaction table.
-        
-        Args:
-            acc_no (str): Customer account number
-            amount (str): Transaction amount
-            transaction_type (str): Type of transaction (DEBIT/CREDIT)
-        """
-        try:
-            table_name = f'cus{acc_no}'
-            query = f"INSERT INTO {table_name}(amount, stat) VALUES('{amount}', '{transaction_type}');"
-            self.cursor.execute(query)
-            self.connection.commit()
-        except Exception as e:
-            print(f"Error recording transaction: {e}")
-    
-    def update_customer_pin(self, acc_no, new_pin):
-        """
-        Update customer PIN in the database.
-        
-        Args:
-            acc_no (str): Customer account number
-            new_pin (str): New hashed PIN
-        """
-        try:
-            query = f"UPDATE customers SET pin = '{new_pin}' WHERE acc_no = '{acc_no}';"
-            self.cursor.execute(query)
-            self.connection.commit()
-        except Exception as e:
-            print(f"Error updating PIN: {e}")
-    
-    def close(self):
-        """Close database connections."""
-        if self.connection:
-            self.connection.close()
-        if self.cursor:
-            self.cursor.close()
-
-# =============================================================================
-# DATABASE INITIALIZATION
-# =============================================================================
-
-# Initialize database manager and customer list
-db_manager = DatabaseManager(DB_CONFIG)
-cust_list = db_manager.get_customer_list()
+    def report(self):
+        """Print every phase and the total time to ready."""
+        print("Startup timing:")
+        for phase, seconds in self.phases:
+            print(f"  {phase:<16}{seconds * 1000:>9.1f} ms")
+        print(f"  {'ready':<16}{(self.last - _IMPORT_START) * 1000:>9.1f} ms")
 
 # =============================================================================
 # ATM GUI APPLICATION CLASS
@@ -226,16 +179,48 @@ class ATMApplication:
     """
     Main ATM GUI Application class.
     
-    This class encapsulates the entire ATM user interface and handles
-    all user interactions, form validation, and database operations.
+    This class encapsulates the entire ATM user interface. All business
+    logic is delegated to the headless ATMEngine; the GUI only keeps the
+    current Session and turns engine results into messages.
     """
     
-    def __init__(self):
-        """Initialize the ATM application with GUI components and state variables."""
+    def __init__(self, timer=None):
+        """
+        Initialize the ATM application with GUI components and state variables.
+        
+        Args:
+            timer (StartupTimer): Records startup phases when timing is enabled
+        """
+        self.timer = timer
         self.setup_window()
+        self.worker = DBWorker(self.root, max_workers=WORKER_CONFIG['threads'], default_timeout=WORKER_CONFIG['timeout'])
         self.setup_variables()
         self.setup_widgets()
         self.display_welcome_message()
+        if self.timer:
+            self.timer.mark('window')
+        self.root.after(0, self.start_warm_up)
+        
+    def start_warm_up(self):
+        """Connect to the backend in the background once the window is on screen."""
+        if self.timer:
+            self.root.update_idletasks()
+            self.timer.mark('first paint')
+        self.worker.submit(warm_up, self.timer, on_success=self.on_warm_up_done,
+                           on_error=self.on_warm_up_error, timeout=0)
+        
+    def on_warm_up_done(self, _):
+        """Finish a startup timing run once the backend is ready."""
+        if self.timer:
+            self.timer.report()
+            self.root.destroy()
+            
+    def on_warm_up_error(self, error):
+        """Report a failed warm-up; the backend is retried on the first request."""
+        print(f"Error warming up the backend: {error}")
+        if self.timer:
+            self.timer.report()
+            self.root.destroy()
         
     def setup_window(self):
         """Create and configure the main application window."""
@@ -253,6 +238,8 @@ class ATMApplication:
         self.amount_var = tk.StringVar()
         self.pin_var = tk.StringVar()
         self.otp_var = tk.StringVar()
+        self.session = None  # Engine session for the validated account
+        self.withdrawal_key = None  # Idempotency key of the withdrawal being entered
         
     def setup_widgets(self):
         """Create and configure all GUI widgets."""
@@ -317,6 +304,40 @@ class ATMApplication:
         self.display_text.insert(tk.END, message)
         self.display_text.config(state=tk.DISABLED)
         
+    def display_processing(self):
+        """Show the processing state while a database operation is running."""
+        self.display_message("Processing\u2026")
+        self.withdraw_button.config(state=tk.DISABLED)
+        self.set_up_button.config(state=tk.DISABLED)
+        
+    def run_in_background(self, operation, *args, on_success, on_error=None):
+        """
+        Run a blocking database operation off the Tk thread.
+        
+        Args:
+            operation (callable): Function performing the database work
+            *args: Arguments passed to the operation
+            on_success (callable): Called on the Tk thread with the result
+            on_error (callable): Called on the Tk thread with the exception
+        """
+        self.display_processing()
+        self.worker.submit(operation, *args, on_success=on_success, on_error=on_error or self.on_db_error)
+        
+    def close_session(self, session):
+        """End a session on a worker thread; in thin-client mode this is a server round trip."""
+        self.worker.submit(call_engine, 'close_session', session.session_id,
+                           on_error=lambda error: print(f"Error closing session: {error}"))
+        
+    def on_db_error(self, error):
+        """Report a failed or timed-out background operation."""
+        self.update_button_states()
+        if isinstance(error, OperationTimeoutError):
+            self.display_message("The bank is not responding.\nPlease try again later.")
+        elif isinstance(error, EngineError):
+            self.display_message(str(error))
+        else:
+            self.display_message(f"Error: {error}")
+        
     def display_welcome_message(self):
         """Display the initial welcome message."""
         self.display_message("\tDatabase Management Systems\nPROJECT\n\nWelcome to ATM")
@@ -324,7 +345,7 @@ class ATMApplication:
     def update_button_states(self):
         """Enable or disable action buttons based on account number validity."""
         acc_no = self.acc_no_var.get()
-        if acc_no in cust_list:
+        if self.session is not None and acc_no == self.session.acc_no:
             self.withdraw_button.config(state=tk.NORMAL)
             self.set_up_button.config(state=tk.NORMAL)
             self.cancel_button.config(state=tk.NORMAL)
@@ -344,16 +365,21 @@ class ATMApplication:
     def validate_acc_no(self):
         """Validate account number and display customer details."""
         acc_no = self.acc_no_var.get()
-        if acc_no in cust_list:
-            try:
-                cust_details = db_manager.get_customer_details(acc_no)
-                self.display_message(f"Bank Name: {cust_details[2]}\nAccount Number: {cust_details[0]}\nAccount Holder Name: {cust_details[1]}")
-                self.acc_no_entry.config(state=tk.DISABLED)
-                self.update_button_states()
-            except Exception as e:
-                self.display_message(f"Error retrieving customer details: {e}")
-        else:
+        if not acc_no:
             self.display_message("Invalid Account Number.")
+            return
+        self.run_in_background(call_engine, 'open_session', acc_no, on_success=self.on_session_opened)
+        
+    def on_session_opened(self, session):
+        """Display the validated customer's details."""
+        if session.acc_no != self.acc_no_var.get():
+            self.close_session(session)
+            return
+        self.session = session
+        customer = session.customer
+        self.display_message(f"Bank Name: {customer.bank_name}\nAccount Number: {customer.acc_no}\nAccount Holder Name: {customer.cname}")
+        self.acc_no_entry.config(state=tk.DISABLED)
+        self.update_button_states()
             
     def validate_amount(self):
         """Validate entered amount for withdrawal."""
@@ -361,53 +387,67 @@ class ATMApplication:
         if amount.isdigit() and int(amount) > 0:
             self.display_message(f"Amount entered: {amount}\nEnter PIN")
             self.amount_entry.config(state=tk.DISABLED)
+            self.withdrawal_key = uuid.uuid4().hex
         else:
             self.display_message("Invalid Amount. Please enter a positive number.")
             
     def validate_pin(self):
         """Validate PIN and process transaction or PIN setup."""
-        global NEWPIN
-        
+        if self.session is None:
+            self.display_message("Invalid Account Number.")
+            return
         pin = self.pin_var.get()
         if not pin:
             self.display_message("Please enter a PIN.")
             return
             
-        acc_no = self.acc_no_var.get()
-        amount = self.amount_var.get()
-        hashed_pin = hash_string(pin)
-        
-        try:
-            cust_details = db_manager.get_customer_details(acc_no)
+        if not self.session.pin_change_allowed:  # Regular withdrawal transaction
+            # The key is kept until the debit succeeds, so resubmitting after a timeout cannot debit twice
+            if self.withdrawal_key is None:
+                self.withdrawal_key = uuid.uuid4().hex
+            self.run_in_background(call_engine, 'withdraw', self.session, self.amount_var.get(), pin,
+                                   self.withdrawal_key,
+                                   on_success=self.on_withdrawal_done, on_error=self.on_withdrawal_error)
+        else:  # PIN setup/change
+            self.run_in_background(call_engine, 'change_pin', self.session, pin, on_success=self.on_pin_changed)
+            
+    def on_withdrawal_done(self, balance):
+        """Display the outcome of a withdrawal."""
+        self.withdrawal_key = None
+        self.update_button_states()
+        if balance is None:  # Accepted offline; the bank applies it once it is reachable
+            self.display_message("Money Debited Successfully\nYour balance will be updated shortly.")
+        else:
+            self.display_message(f"Money Debited Successfully\nAvailable Balance: {balance}")
+        self.pin_entry.config(state=tk.DISABLED)
             
-            if NEWPIN == 0:  # Regular withdrawal transaction
-                if hashed_pin == cust_details[3]:
-                    db_manager.record_transaction(acc_no, amount, "DEBIT")
-                    print(f"Amount {amount} debited from account number {acc_no}")
-                    self.display_message("Money Debited Successfully")
-                    self.pin_entry.config(state=tk.DISABLED)
-                else:
-                    self.display_message("Invalid PIN.")
-            else:  # PIN setup/change
-                db_manager.update_customer_pin(acc_no, hashed_pin)
-                messagebox.showinfo("Success", "New PIN Successfully Set Up")
-                self.display_welcome_message()
-                self.reset_form()
-        except Exception as e:
-            self.display_message(f"Error processing PIN: {e}")
+    def on_withdrawal_error(self, error):
+        """Report a failed withdrawal; a timed-out debit may still have gone through."""
+        if isinstance(error, OperationTimeoutError):
+            self.update_button_states()
+            self.display_message("The transaction timed out.\nPress Submit to retry; you will not be debited twice.")
+        else:
+            self.on_db_error(error)
+        
+    def on_pin_changed(self, _):
+        """Confirm the PIN change and reset the form."""
+        messagebox.showinfo("Success", "New PIN Successfully Set Up")
+        self.display_welcome_message()
+        self.reset_form()
             
     def validate_otp(self):
         """Validate OTP for PIN setup process."""
-        global NEWPIN, OTP
-        
-        otp = str(self.otp_var.get())
-        if otp == OTP:
-            NEWPIN = 1
-            self.otp_entry.config(state=tk.DISABLED)
-            self.display_message("OTP Verified. Enter New PIN")
-            self.pin_entry.config(state=tk.NORMAL)
-        else:
-            self.display_message("Invalid OTP. Please try again.")
+        if self.session is None:
+            self.display_message("Invalid Account Number.")
+            return
+        self.run_in_background(call_engine, 'verify_otp', self.session, self.otp_var.get(), on_success=self.on_otp_verified)
+        
+    def on_otp_verified(self, _):
+        """Unlock the PIN entry once the OTP has been verified."""
+        self.update_button_states()
+        self.otp_entry.config(state=tk.DISABLED)
+        self.display_message("OTP Verified. Enter New PIN")
+        self.pin_entry.config(state=tk.NORMAL)
             
     def withdraw(self):
         """Handle withdraw button action."""
@@ -419,28 +459,32 @@ class ATMApplication:
         
     def set_up(self):
         """Handle setup button action for PIN change."""
-        global OTP
-        OTP = ''.join([str(random.randint(0, 9)) for _ in range(6)])
+        self.run_in_background(call_engine, 'request_otp', self.session, on_success=self.on_otp_sent)
         
+    def on_otp_sent(self, _):
+        """Ask for the OTP once it has been delivered."""
+        self.update_button_states()
         self.otp_entry.config(state=tk.NORMAL)
         self.acc_no_entry.config(state=tk.DISABLED)
         self.amount_entry.config(state=tk.DISABLED)
         self.pin_entry.config(state=tk.DISABLED)
         
-        print(f"Your OTP is: {OTP}")  # In production, send via SMS/email
         self.display_message("OTP sent. Enter OTP to set up new PIN")
         
     def cancel_transaction(self):
         """Handle cancel button action."""
         response = messagebox.askyesno("Cancel Transaction", "Do you want to cancel the transaction?")
         if response:
+            self.worker.cancel_all()
             self.display_welcome_message()
             self.reset_form()
             
     def reset_form(self):
-        """Reset all form fields and enable all inputs."""
-        global NEWPIN
-        NEWPIN = 0  # Reset PIN setup flag
+        """Reset all form fields, end the session and enable all inputs."""
+        if self.session is not None:
+            self.close_session(self.session)
+            self.session = None
+        self.withdrawal_key = None
         self.acc_no_var.set('')
         self.amount_var.set('')
         self.pin_var.set('')
@@ -453,7 +497,8 @@ class ATMApplication:
         
     def cleanup(self):
         """Clean up resources before closing."""
-        db_manager.close()
+        self.worker.shutdown()
+        close_backend()
 
 # =============================================================================
 # MAIN FUNCTION AND ENTRY POINT
@@ -466,16 +511,26 @@ def main():
     Creates and runs the ATM GUI application, handling any initialization
     errors and ensuring proper cleanup on exit.
     """
+    timer = None
+    if '--startup-timing' in sys.argv[1:] or os.getenv('ATM_STARTUP_TIMING') == '1':
+        timer = StartupTimer()
+    exporters = start_exporters(METRICS_CONFIG)
+    app = None
     try:
-        app = ATMApplication()
+        app = ATMApplication(timer)
         app.run()
     except Exception as e:
         print(f"Application error: {e}")
         messagebox.showerror("Error", f"Failed to start ATM application: {e}")
     finally:
-        # Ensure database connections are closed
+        # Ensure worker threads are stopped and database connections are closed
         try:
-            db_manager.close()
+            if app:
+                app.cleanup()
+            else:
+                close_backend()
+            for exporter in exporters:
+                exporter.close()
         except:
             pass
 